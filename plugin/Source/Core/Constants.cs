@@ -4,7 +4,7 @@ public static class Constants
 {
     public const int FramesPerStep = 2;
 
-    public const int RayCount = 32;
+    public const int RayCount = SharedMemoryLayout.RayCount;
     public const float MaxRayDistance = 25.0f;
 
     public const int TerrainLayer = 8;
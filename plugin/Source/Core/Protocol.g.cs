@@ -0,0 +1,106 @@
+// <auto-generated>
+// Generated by `python -m scripts.generate_protocol` from silksong/protocol.py and the
+// SilkSongSharedMemory layout. Do not edit; change the schema and regenerate.
+// </auto-generated>
+using System.Runtime.InteropServices;
+
+namespace SilksongAgent;
+
+public enum StateType
+{
+    None = 0,
+    Ready = 1,
+    Step = 2,
+    Reset = 3,
+}
+
+public enum CommandType
+{
+    None = 0,
+    Step = 1,
+    Reset = 2,
+    StepChunk = 3,
+}
+
+[StructLayout(LayoutKind.Explicit, Size = 26)]
+public struct CommandData
+{
+    [FieldOffset(0)] public int commandType;
+    [FieldOffset(4)] public byte left;
+    [FieldOffset(5)] public byte right;
+    [FieldOffset(6)] public byte up;
+    [FieldOffset(7)] public byte down;
+    [FieldOffset(8)] public byte jump;
+    [FieldOffset(9)] public byte attack;
+    [FieldOffset(10)] public byte dash;
+    [FieldOffset(11)] public byte clawline;
+    [FieldOffset(12)] public byte skill;
+    [FieldOffset(13)] public byte heal;
+    [FieldOffset(14)] public int commandReady;
+    [FieldOffset(18)] public int framesPerStep;
+    [FieldOffset(22)] public float timeScale;
+}
+
+[StructLayout(LayoutKind.Explicit, Size = 348)]
+public unsafe struct GameState
+{
+    [FieldOffset(0)] public float playerPosX;
+    [FieldOffset(4)] public float playerPosY;
+    [FieldOffset(8)] public float playerVelX;
+    [FieldOffset(12)] public float playerVelY;
+    [FieldOffset(16)] public int playerHealth;
+    [FieldOffset(20)] public int playerMaxHealth;
+    [FieldOffset(24)] public int playerSilk;
+    [FieldOffset(28)] public int playerAnimationState;
+    [FieldOffset(32)] public float playerAnimationProgress;
+    [FieldOffset(36)] public byte playerGrounded;
+    [FieldOffset(37)] public byte playerCanDash;
+    [FieldOffset(38)] public byte playerFacingRight;
+    [FieldOffset(39)] public byte playerInvincible;
+    [FieldOffset(40)] public byte playerCanAttack;
+    [FieldOffset(44)] public float bossPosX;
+    [FieldOffset(48)] public float bossPosY;
+    [FieldOffset(52)] public float bossVelX;
+    [FieldOffset(56)] public float bossVelY;
+    [FieldOffset(60)] public int bossHealth;
+    [FieldOffset(64)] public int bossMaxHealth;
+    [FieldOffset(68)] public int bossPhase;
+    [FieldOffset(72)] public int bossAnimationState;
+    [FieldOffset(76)] public float bossAnimationProgress;
+    [FieldOffset(80)] public byte bossFacingRight;
+    [FieldOffset(84)] public float episodeTime;
+    [FieldOffset(88)] public byte terminated;
+    [FieldOffset(89)] public byte truncated;
+    [FieldOffset(92)] public fixed float raycastDistances[32];
+    [FieldOffset(220)] public fixed int raycastHitTypes[32];
+}
+
+public static class SharedMemoryLayout
+{
+    public const int MemorySize = 16384;
+    public const int StateOffset = 0;
+    public const int GameStateOffset = 4;
+    public const int GameStateSize = 348;
+    public const int CommandOffset = 1024;
+    public const int CommandReadyOffset = 1038;
+    public const int EventOffset = 2048;
+    public const int FutexSupportOffset = 2052;
+    public const int HeartbeatOffset = 2056;
+    public const int ProtocolVersion = 3;
+    public const int DoubleBufferedVersion = 2;
+    public const int EpisodeTimingVersion = 3;
+    public const int PluginVersionOffset = 2060;
+    public const int ClientVersionOffset = 2064;
+    public const int StateSequenceOffset = 2068;
+    public const int AckSequenceOffset = 2072;
+    public const int SlotSequenceOffset = 2076;
+    public const int SlotStateOffset = 2084;
+    public static readonly int[] GameStateSlotOffsets = { 4, 3072 };
+    public const int MaxChunkSteps = 32;
+    public const int ChunkLengthOffset = 4096;
+    public const int ChunkExecutedOffset = 4100;
+    public const int ChunkActionsOffset = 4104;
+    public const int ChunkActionSize = 10;
+    public const int ChunkStatesOffset = 4608;
+    public const int RayCount = 32;
+}
@@ -4,25 +4,10 @@ using System.IO.MemoryMappedFiles;
 using System.Runtime.InteropServices;
 using System.Threading;
 using UnityEngine;
+using static SilksongAgent.SharedMemoryLayout;
 
 namespace SilksongAgent;
 
-public enum StateType
-{
-    None = 0,
-    Ready = 1,
-    Step = 2,
-    Reset = 3
-}
-
-public enum CommandType
-{
-    None = 0,
-    Step = 1,
-    Reset = 2
-}
-
-
 public enum PlayerAnimationState
 {
     Idle = 0,
@@ -110,72 +95,20 @@ public enum PlayerAnimationState
     Unknown = 82
 }
 
-[StructLayout(LayoutKind.Sequential, Pack = 1)]
-public struct CommandData
-{
-    public int commandType;
-    public byte left;
-    public byte right;
-    public byte up;
-    public byte down;
-    public byte jump;
-    public byte attack;
-    public byte dash;
-    public byte clawline;
-    public byte skill;
-    public byte heal;
-    public int commandReady;
-}
-
-
-[StructLayout(LayoutKind.Sequential, Pack = 4)]
-public unsafe struct GameState
-{
-    public float playerPosX;
-    public float playerPosY;
-    public float playerVelX;
-    public float playerVelY;
-    public int playerHealth;
-    public int playerMaxHealth;
-    public int playerSilk;
-    public int playerAnimationState;
-    public float playerAnimationProgress;
-    public byte playerGrounded;
-    public byte playerCanDash;
-    public byte playerFacingRight;
-    public byte playerInvincible;
-    public byte playerCanAttack;
-
-    public float bossPosX;
-    public float bossPosY;
-    public float bossVelX;
-    public float bossVelY;
-    public int bossHealth;
-    public int bossMaxHealth;
-    public int bossPhase;
-    public int bossAnimationState;
-    public float bossAnimationProgress;
-    public byte bossFacingRight;
-
-    public float episodeTime;
-    public byte terminated;
-    public byte truncated;
-
-    public fixed float raycastDistances[32];
-    public fixed int raycastHitTypes[32];
-}
-
 public class SharedMemoryManager : MonoBehaviour
 {
     public static SharedMemoryManager Instance;
 
     private const string MemoryNameBase = "silksong_shared_memory";
     private const string EventNameBase = "silksong_state_event";
-    private const int MemorySize = 4096;
-    private const int StateOffset = 0;
-    private const int GameStateOffset = 4;
-    private const int CommandOffset = 1024;
-    private const int EventOffset = 2048;
+
+    // Offsets, sizes and ProtocolVersion come from SharedMemoryLayout (Protocol.g.cs). Protocol 2,
+    // used when the client announces it too: GameStates go to two alternating slots, each tagged
+    // with its sequence number, and the sequence number is published last. StateOffset keeps
+    // mirroring the last state type for clients of protocol 1. Protocol 3 adds the episode
+    // timing (frames per step, time scale) that follows commandReady in a RESET command.
+
+    private const int FutexWake = 1;
 
     private static readonly bool IsWindows = Application.platform == RuntimePlatform.WindowsPlayer ||
                                               Application.platform == RuntimePlatform.WindowsEditor;
@@ -185,8 +118,18 @@ public class SharedMemoryManager : MonoBehaviour
     private MemoryMappedFile memoryMappedFile;
     private MemoryMappedViewAccessor accessor;
     private CommandData commandData;
+    private int heartbeat;
+    private int sequence;
+    private bool overwriteLogged;
+    private readonly byte[] chunkActions = new byte[MaxChunkSteps * ChunkActionSize];
 
     private EventWaitHandle stateEventWindows;
+    private IntPtr eventFutexAddress = IntPtr.Zero;
+
+    [DllImport("libc", EntryPoint = "syscall", SetLastError = true)]
+    private static extern long Syscall(long number, IntPtr address, int op, int value, IntPtr timeout, IntPtr address2, int value3);
+
+    private static long SysFutex => RuntimeInformation.ProcessArchitecture == Architecture.Arm64 ? 98 : 202;
 
     private string GetMemoryName()
     {
@@ -227,7 +170,8 @@ public class SharedMemoryManager : MonoBehaviour
             try
             {
                 var fileStream = new FileStream(shmPath, FileMode.OpenOrCreate, FileAccess.ReadWrite, FileShare.ReadWrite);
-                fileStream.SetLength(MemorySize);
+                if (fileStream.Length < MemorySize)
+                    fileStream.SetLength(MemorySize);
                 memoryMappedFile = MemoryMappedFile.CreateFromFile(fileStream, null, MemorySize, MemoryMappedFileAccess.ReadWrite, HandleInheritability.None, false);
                 Plugin.Logger.LogInfo($"Opened shared memory (Linux): {shmPath}");
             }
@@ -243,6 +187,7 @@ public class SharedMemoryManager : MonoBehaviour
         }
 
         accessor = memoryMappedFile.CreateViewAccessor();
+        accessor.Write(PluginVersionOffset, ProtocolVersion);
 
         var eventName = GetEventName();
 
@@ -253,7 +198,41 @@ public class SharedMemoryManager : MonoBehaviour
         }
         else if (IsLinux)
         {
-            Plugin.Logger.LogInfo($"Using shared memory event (Linux)");
+            InitializeFutex();
+            Plugin.Logger.LogInfo($"Using shared memory event (Linux), futex: {eventFutexAddress != IntPtr.Zero}");
+        }
+    }
+
+    private unsafe void InitializeFutex()
+    {
+        try
+        {
+            byte* basePointer = null;
+            accessor.SafeMemoryMappedViewHandle.AcquirePointer(ref basePointer);
+            eventFutexAddress = new IntPtr(basePointer + accessor.PointerOffset + EventOffset);
+            accessor.Write(FutexSupportOffset, 1);
+        }
+        catch (Exception e)
+        {
+            eventFutexAddress = IntPtr.Zero;
+            Plugin.Logger.LogWarning($"Futex wake-ups unavailable, Python will spin: {e.Message}");
+        }
+    }
+
+    private void WakeFutex()
+    {
+        if (eventFutexAddress == IntPtr.Zero)
+            return;
+
+        try
+        {
+            Syscall(SysFutex, eventFutexAddress, FutexWake, int.MaxValue, IntPtr.Zero, IntPtr.Zero, 0);
+        }
+        catch (Exception e)
+        {
+            eventFutexAddress = IntPtr.Zero;
+            accessor.Write(FutexSupportOffset, 0);
+            Plugin.Logger.LogError($"Failed to wake futex, falling back to polling: {e.Message}");
         }
     }
 
@@ -268,6 +247,7 @@ public class SharedMemoryManager : MonoBehaviour
             try
             {
                 accessor.Write(EventOffset, 1);
+                WakeFutex();
             }
             catch (Exception e)
             {
@@ -276,11 +256,46 @@ public class SharedMemoryManager : MonoBehaviour
         }
     }
 
+    private bool IsDoubleBuffered()
+    {
+        return accessor.ReadInt32(ClientVersionOffset) >= DoubleBufferedVersion;
+    }
+
+    private bool HasEpisodeTiming()
+    {
+        return accessor.ReadInt32(ClientVersionOffset) >= EpisodeTimingVersion;
+    }
+
+    private int NextSequence()
+    {
+        return (sequence + 1) & int.MaxValue;
+    }
+
     public void WriteState(StateType state)
     {
         try
         {
-            accessor.Write(StateOffset, (int)state);
+            if (IsDoubleBuffered())
+            {
+                var next = NextSequence();
+                var slot = next & 1;
+                // The slot about to be published held state next - 2; the client should have taken it by now.
+                if (!overwriteLogged && ((next - accessor.ReadInt32(AckSequenceOffset)) & int.MaxValue) > 2)
+                {
+                    overwriteLogged = true;
+                    Plugin.Logger.LogWarning($"Publishing state {next} over a state the client has not acknowledged");
+                }
+                accessor.Write(SlotStateOffset + 4 * slot, (int)state);
+                accessor.Write(SlotSequenceOffset + 4 * slot, next);
+                accessor.Write(StateOffset, (int)state);
+                Thread.MemoryBarrier();
+                accessor.Write(StateSequenceOffset, next);
+                sequence = next;
+            }
+            else
+            {
+                accessor.Write(StateOffset, (int)state);
+            }
             SetEvent();
         }
         catch (Exception e)
@@ -297,7 +312,16 @@ public class SharedMemoryManager : MonoBehaviour
 
             GameState gameState = GameStateCollector.CollectGameState();
 
-            accessor.Write(GameStateOffset, ref gameState);
+            var offset = GameStateOffset;
+            if (IsDoubleBuffered())
+            {
+                // Tagged -1 while written; WriteState tags it with its sequence number when it is published.
+                var slot = NextSequence() & 1;
+                accessor.Write(SlotSequenceOffset + 4 * slot, -1);
+                Thread.MemoryBarrier();
+                offset = GameStateSlotOffsets[slot];
+            }
+            accessor.Write(offset, ref gameState);
         }
         catch (Exception e)
         {
@@ -305,6 +329,66 @@ public class SharedMemoryManager : MonoBehaviour
         }
     }
 
+    public int ReadChunkLength()
+    {
+        try
+        {
+            var length = Math.Max(0, Math.Min(accessor.ReadInt32(ChunkLengthOffset), MaxChunkSteps));
+            accessor.ReadArray(ChunkActionsOffset, chunkActions, 0, length * ChunkActionSize);
+            return length;
+        }
+        catch (Exception e)
+        {
+            Plugin.Logger.LogError($"Error reading action chunk: {e.Message}");
+            return 0;
+        }
+    }
+
+    public void ApplyChunkAction(int index)
+    {
+        var offset = index * ChunkActionSize;
+        ActionManager.IsLeftPressed = chunkActions[offset + 0] != 0;
+        ActionManager.IsRightPressed = chunkActions[offset + 1] != 0;
+        ActionManager.IsUpPressed = chunkActions[offset + 2] != 0;
+        ActionManager.IsDownPressed = chunkActions[offset + 3] != 0;
+        ActionManager.IsJumpPressed = chunkActions[offset + 4] != 0;
+        ActionManager.IsAttackPressed = chunkActions[offset + 5] != 0;
+        ActionManager.IsDashPressed = chunkActions[offset + 6] != 0;
+        ActionManager.IsClawlinePressed = chunkActions[offset + 7] != 0;
+        ActionManager.IsSkillPressed = chunkActions[offset + 8] != 0;
+        ActionManager.IsHealPressed = chunkActions[offset + 9] != 0;
+    }
+
+    public GameState WriteChunkState(int index)
+    {
+        GameState gameState = default;
+        try
+        {
+            BossProjectileManager.Instance?.RefreshProjectileCache();
+
+            gameState = GameStateCollector.CollectGameState();
+
+            accessor.Write(ChunkStatesOffset + index * GameStateSize, ref gameState);
+        }
+        catch (Exception e)
+        {
+            Plugin.Logger.LogError($"Error writing chunk state: {e.Message}");
+        }
+        return gameState;
+    }
+
+    public void WriteChunkExecuted(int count)
+    {
+        try
+        {
+            accessor.Write(ChunkExecutedOffset, count);
+        }
+        catch (Exception e)
+        {
+            Plugin.Logger.LogError($"Error writing chunk count: {e.Message}");
+        }
+    }
+
     private void ReadCommand()
     {
         try
@@ -346,7 +430,18 @@ public class SharedMemoryManager : MonoBehaviour
             case CommandType.Step:
                 GameManager.instance.StartCoroutine(StepModeManager.Instance.Step());
                 break;
+            case CommandType.StepChunk:
+                GameManager.instance.StartCoroutine(StepModeManager.Instance.StepChunk(ReadChunkLength()));
+                break;
             case CommandType.Reset:
+                if (HasEpisodeTiming())
+                {
+                    StepModeManager.Instance.SetEpisodeTiming(commandData.framesPerStep, commandData.timeScale);
+                }
+                else
+                {
+                    StepModeManager.Instance.SetEpisodeTiming(0, 0f);
+                }
                 StepModeManager.Instance.DisableStepMode();
                 if (EpisodeResetter.IsInitialStateCaptured)
                 {
@@ -364,7 +459,7 @@ public class SharedMemoryManager : MonoBehaviour
 
         try
         {
-            accessor.Write(CommandOffset + Marshal.OffsetOf<CommandData>("commandReady").ToInt32(), 0);
+            accessor.Write(CommandReadyOffset, 0);
         }
         catch (Exception e)
         {
@@ -372,8 +467,23 @@ public class SharedMemoryManager : MonoBehaviour
         }
     }
 
+    private void WriteHeartbeat()
+    {
+        try
+        {
+            heartbeat = (heartbeat + 1) & int.MaxValue;
+            accessor.Write(HeartbeatOffset, heartbeat);
+        }
+        catch (Exception e)
+        {
+            Plugin.Logger.LogError($"Error writing heartbeat: {e.Message}");
+        }
+    }
+
     private void Update()
     {
+        WriteHeartbeat();
+
         if (CommandLineArgs.Manual)
             return;
 
@@ -383,6 +493,11 @@ public class SharedMemoryManager : MonoBehaviour
 
     private void OnDestroy()
     {
+        if (eventFutexAddress != IntPtr.Zero)
+        {
+            accessor.SafeMemoryMappedViewHandle.ReleasePointer();
+            eventFutexAddress = IntPtr.Zero;
+        }
         stateEventWindows?.Dispose();
         accessor?.Dispose();
         memoryMappedFile?.Dispose();
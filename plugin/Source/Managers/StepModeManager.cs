@@ -11,14 +11,26 @@ public class StepModeManager : MonoBehaviour
     private bool isEnabled = false;
     private bool isSteppingFrame = false;
 
+    // Episode timing from the last RESET (protocol 3); 0 keeps the defaults.
+    private int framesPerStep = 0;
+    private float timeScale = 0f;
+
     public bool IsEnabled => isEnabled;
     public bool IsSteppingFrame => isSteppingFrame;
+    public int FramesPerStep => framesPerStep > 0 ? framesPerStep : Constants.FramesPerStep;
+    public float TimeScale => timeScale > 0f ? timeScale : CommandLineArgs.TimeScale;
 
     private void Awake()
     {
         Instance = this;
     }
     
+    public void SetEpisodeTiming(int framesPerStep, float timeScale)
+    {
+        this.framesPerStep = framesPerStep;
+        this.timeScale = timeScale;
+    }
+
     public void EnableStepMode()
     {
         if (CommandLineArgs.Manual)
@@ -31,15 +43,15 @@ public class StepModeManager : MonoBehaviour
     public void DisableStepMode()
     {
         isEnabled = false;
-        Time.timeScale = CommandLineArgs.TimeScale;
+        Time.timeScale = TimeScale;
     }
 
     public IEnumerator Step()
     {
         isSteppingFrame = true;
-        Time.timeScale = CommandLineArgs.TimeScale;
+        Time.timeScale = TimeScale;
 
-        for (int i = 0; i < Constants.FramesPerStep; i++)
+        for (int i = 0; i < FramesPerStep; i++)
         {
             yield return new WaitForFixedUpdate();
         }
@@ -50,4 +62,34 @@ public class StepModeManager : MonoBehaviour
         DebugOverlayManager.Instance?.RecordStep();
         isSteppingFrame = false;
     }
+
+    public IEnumerator StepChunk(int count)
+    {
+        isSteppingFrame = true;
+        var executed = 0;
+
+        while (executed < count)
+        {
+            SharedMemoryManager.Instance.ApplyChunkAction(executed);
+            Time.timeScale = TimeScale;
+
+            for (int i = 0; i < FramesPerStep; i++)
+            {
+                yield return new WaitForFixedUpdate();
+            }
+
+            Time.timeScale = 0f;
+            var state = SharedMemoryManager.Instance.WriteChunkState(executed);
+            DebugOverlayManager.Instance?.RecordStep();
+            executed++;
+
+            if (state.playerHealth <= 0 || state.bossHealth <= 0)
+                break;
+        }
+
+        SharedMemoryManager.Instance.WriteChunkExecuted(executed);
+        SharedMemoryManager.Instance.WriteGameState();
+        SharedMemoryManager.Instance.WriteState(StateType.Step);
+        isSteppingFrame = false;
+    }
 }
\ No newline at end of file
@@ -93,7 +93,7 @@ public class Plugin : BaseUnityPlugin
          }
          else
          {
-             Time.timeScale = IsReady ? CommandLineArgs.TimeScale : 10.0f;
+             Time.timeScale = IsReady ? StepModeManager.Instance?.TimeScale ?? CommandLineArgs.TimeScale : 10.0f;
          }
     }
 }
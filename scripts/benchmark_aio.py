@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+from silksong.aio import as_completed, get_waker
+from silksong.env import SilksongBossEnv
+from silksong.vec_env import SilksongVecEnv
+
+
+def sequential(envs: list[SilksongBossEnv], n_steps: int) -> int:
+    """`step` on one env after the other: every step waits for the one before."""
+    for env in envs:
+        env.reset()
+    for _ in range(n_steps):
+        for env in envs:
+            env.step(env.action_space.sample())
+    return n_steps * len(envs)
+
+
+def lockstep(env_ids: list[int], n_steps: int, simulator_args: list[str]) -> tuple[int, float, float]:
+    """SilksongVecEnv: every command is sent, then every state waited on, once per batch."""
+    vec_env = SilksongVecEnv(env_ids, simulator=True, simulator_args=simulator_args)
+    try:
+        vec_env.reset()
+        actions = np.zeros((len(env_ids), 8), dtype=np.int64)
+        start, cpu = time.perf_counter(), time.process_time()
+        for _ in range(n_steps):
+            vec_env.step(actions)
+        return n_steps * len(env_ids), time.perf_counter() - start, time.process_time() - cpu
+    finally:
+        vec_env.close()
+
+
+async def free_running(envs: list[SilksongBossEnv], n_steps: int) -> int:
+    """`astep` per env in its own coroutine: no env waits for another."""
+    await asyncio.gather(*(env.areset() for env in envs))
+
+    async def run(env: SilksongBossEnv):
+        for _ in range(n_steps):
+            _, _, terminated, truncated, _ = await env.astep(env.action_space.sample())
+            if terminated or truncated:
+                await env.areset()
+
+    await asyncio.gather(*(run(env) for env in envs))
+    return n_steps * len(envs)
+
+
+async def first_completed(envs: list[SilksongBossEnv], n_steps: int) -> int:
+    """`as_completed` over one `astep` per env, stepping each env again as soon as it answers."""
+    await asyncio.gather(*(env.areset() for env in envs))
+    steps = 0
+    while steps < n_steps * len(envs):
+        async for _ in as_completed(env.astep(env.action_space.sample()) for env in envs):
+            steps += 1
+    return steps
+
+
+def timed(fn, *args) -> tuple[int, float, float]:
+    start, cpu = time.perf_counter(), time.process_time()
+    steps = fn(*args)
+    return steps, time.perf_counter() - start, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulator instances from one thread: blocking steps, "
+                                                 "a lockstep vec env and asyncio coroutines")
+    parser.add_argument("--n_envs", type=int, default=8)
+    parser.add_argument("--n_steps", type=int, default=200, help="Steps per env and mode")
+    parser.add_argument("--step_latency_ms", type=float, default=5.0)
+    parser.add_argument("--step_jitter_ms", type=float, default=5.0)
+    parser.add_argument("--first_id", type=int, default=800)
+    args = parser.parse_args()
+
+    simulator_args = ["--step_latency_ms", str(args.step_latency_ms), "--step_jitter_ms", str(args.step_jitter_ms)]
+    env_ids = list(range(args.first_id, args.first_id + args.n_envs))
+    results = {"SilksongVecEnv lockstep": lockstep(env_ids, args.n_steps, simulator_args)}
+    envs = [SilksongBossEnv(env_id, simulator=True, simulator_args=simulator_args) for env_id in env_ids]
+    try:
+        results["step, one env after another"] = timed(sequential, envs, args.n_steps)
+        results["astep, one coroutine per env"] = timed(lambda: asyncio.run(free_running(envs, args.n_steps)))
+        results["astep + as_completed"] = timed(lambda: asyncio.run(first_completed(envs, args.n_steps)))
+    finally:
+        for env in envs:
+            env.close()
+
+    print(f"\n{args.n_envs} envs, {args.step_latency_ms:g} ms steps + up to {args.step_jitter_ms:g} ms jitter "
+          f"(futex_waitv waker: {'yes' if get_waker() is not None else 'no, polling'}, "
+          f"{threading.active_count()} threads)")
+    print(f"{'Mode':<34}{'steps/s':>10}{'CPU us/step':>13}")
+    for name, (steps, seconds, cpu) in results.items():
+        print(f"{name:<34}{steps / seconds:>10.1f}{cpu / steps * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import time
+
+import numpy as np
+
+from silksong.shared_memory import SilkSongSharedMemory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-step round trips vs. action chunks against the stand-in game")
+    parser.add_argument("--steps", type=int, default=2048)
+    parser.add_argument("--chunk_sizes", type=int, nargs="*", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--step_latency_ms", type=float, default=0.5, help="Simulated game time per step")
+    parser.add_argument("--poll_interval_ms", type=float, default=0.2, help="Stand-in command poll interval")
+    parser.add_argument("--env_id", type=int, default=95)
+
+    args = parser.parse_args()
+
+    shm = SilkSongSharedMemory(
+        args.env_id,
+        simulator=True,
+        simulator_args=["--step_latency_ms", str(args.step_latency_ms), "--poll_interval_ms", str(args.poll_interval_ms)],
+    )
+    results = []
+    try:
+        shm.reset()
+
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            shm.step(np.zeros(10, dtype=np.int8))
+        results.append(("step()", args.steps / (time.perf_counter() - start)))
+
+        for chunk_size in args.chunk_sizes:
+            actions = np.zeros((chunk_size, 10), dtype=np.int8)
+            n_chunks = max(1, args.steps // chunk_size)
+            start = time.perf_counter()
+            for _ in range(n_chunks):
+                shm.step_chunk(actions)
+            results.append((f"step_chunk(K={chunk_size})", n_chunks * chunk_size / (time.perf_counter() - start)))
+    finally:
+        shm.close()
+
+    print(f"\n{'Mode':<22}{'steps/s':>10}")
+    for name, steps_per_sec in results:
+        print(f"{name:<22}{steps_per_sec:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
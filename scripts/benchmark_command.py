@@ -0,0 +1,125 @@
+import argparse
+import os
+import struct
+import tempfile
+import timeit
+
+import numpy as np
+
+from silksong.command import ACTION_NVEC, COMMAND_PAYLOAD_SIZE, NUM_ACTIONS, CommandEncoder
+from silksong.env import convert_to_binary
+from silksong.shared_memory import GAME_STATE_DTYPE, CommandType, SilkSongSharedMemory
+from silksong.trace import ReplaySharedMemory, TraceWriter
+
+COMMAND_BLOCK = slice(SilkSongSharedMemory.COMMAND_OFFSET, SilkSongSharedMemory.COMMAND_READY_OFFSET + 4)
+
+
+def legacy_send_command(buf, command_type: int, binary: np.ndarray):
+    """The eleven per-field writes `send_command` used to do, kept as the reference."""
+    offset = SilkSongSharedMemory.COMMAND_OFFSET
+    struct.pack_into('i', buf, offset + 0, int(command_type))
+    for i in range(10):
+        struct.pack_into('B', buf, offset + 4 + i, 1 if binary[i] else 0)
+    struct.pack_into('i', buf, offset + 14, 1)
+
+
+def command_buffer() -> ReplaySharedMemory:
+    """A game-free instance (a one-record replay) whose command block can be written and inspected."""
+    path = os.path.join(tempfile.mkdtemp(prefix="silksong_command_"), "reset.sstrace")
+    writer = TraceWriter(path)
+    writer.append(CommandType.RESET, np.zeros((1, 10), dtype=np.uint8), np.zeros(1, dtype=GAME_STATE_DTYPE), 0.0, 0.0)
+    writer.close()
+    return ReplaySharedMemory(1, replay=path)
+
+
+def check_equivalence(shm: ReplaySharedMemory, n_sequences: int = 200, length: int = 64, n_envs: int = 4, seed: int = 0):
+    """Assert encoded commands are byte-identical to convert_to_binary + the legacy writes, debounce included."""
+    actions = np.stack(np.unravel_index(np.arange(NUM_ACTIONS), ACTION_NVEC), axis=1)
+    rng = np.random.default_rng(seed)
+    sequences = [np.concatenate([actions, actions[::-1]])]
+    sequences += [actions[rng.integers(0, NUM_ACTIONS, length)] for _ in range(n_sequences)]
+    expected = bytearray(SilkSongSharedMemory.MEMORY_SIZE)
+
+    for sequence in sequences:
+        batch_encoder = CommandEncoder(n_envs)
+        single_encoder = CommandEncoder()
+        prev_attack = np.zeros(n_envs, dtype=np.int8)
+
+        for t in range(len(sequence)):
+            # Each env of the batch walks the sequence from a different starting point.
+            batch = sequence[(t + np.arange(n_envs)) % len(sequence)]
+            payloads = batch_encoder.encode_batch(batch)
+            single = single_encoder.encode(batch[0])
+
+            for k in range(n_envs):
+                binary = convert_to_binary(batch[k], prev_attack[k])
+                prev_attack[k] = binary[5]
+                legacy_send_command(expected, CommandType.STEP, binary)
+
+                shm.write_command(payloads[k])
+                assert shm.buf[COMMAND_BLOCK] == expected[COMMAND_BLOCK], f"batch encoding differs for {batch[k]}"
+                if k == 0:
+                    shm.write_command(single)
+                    assert shm.buf[COMMAND_BLOCK] == expected[COMMAND_BLOCK], f"single encoding differs for {batch[0]}"
+
+                shm.send_command(CommandType.STEP, *binary.astype(bool))
+                assert shm.buf[COMMAND_BLOCK] == expected[COMMAND_BLOCK], "send_command layout differs"
+
+        chunk_encoder = CommandEncoder()
+        buttons = chunk_encoder.chunk_buttons(sequence[:SilkSongSharedMemory.MAX_CHUNK_STEPS])
+        prev = 0
+        for action, row in zip(sequence, buttons):
+            binary = convert_to_binary(action, prev)
+            prev = binary[5]
+            assert np.array_equal(row, binary), "chunk buttons differ"
+
+    print(f"CommandEncoder matches convert_to_binary + send_command on {len(sequences)} action sequences")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command encoder equivalence check and benchmark")
+    parser.add_argument("--number", type=int, default=50_000)
+    parser.add_argument("--n_envs", type=int, default=16)
+    args = parser.parse_args()
+
+    shm = command_buffer()
+    try:
+        check_equivalence(shm)
+
+        rng = np.random.default_rng(1)
+        action = np.stack(np.unravel_index(rng.integers(0, NUM_ACTIONS), ACTION_NVEC))
+        batch = np.stack(np.unravel_index(rng.integers(0, NUM_ACTIONS, args.n_envs), ACTION_NVEC), axis=1)
+        encoder = CommandEncoder(args.n_envs)
+
+        def legacy_step():
+            legacy_send_command(shm.buf, CommandType.STEP, convert_to_binary(action, 0))
+
+        def legacy_batch():
+            for k in range(args.n_envs):
+                legacy_send_command(shm.buf, CommandType.STEP, convert_to_binary(batch[k], 0))
+
+        def encoded_batch():
+            payloads = encoder.encode_batch(batch)
+            for k in range(args.n_envs):
+                shm.write_command(payloads[k])
+
+        cases = {
+            "convert_to_binary + send_command (before)": (legacy_step, 1),
+            "convert_to_binary + send_command (one write)": (
+                lambda: shm.send_command(CommandType.STEP, *convert_to_binary(action, 0).astype(bool)), 1
+            ),
+            "CommandEncoder.encode + write_command": (lambda: shm.write_command(encoder.encode(action)), 1),
+            f"before x {args.n_envs} envs": (legacy_batch, args.n_envs),
+            f"encode_batch({args.n_envs}) + write_command": (encoded_batch, args.n_envs),
+        }
+
+        print(f"\n{'Command write':<44}{'us/env':>10}")
+        for name, (fn, per_call) in cases.items():
+            seconds = min(timeit.repeat(fn, number=args.number // per_call, repeat=3))
+            print(f"{name:<44}{seconds / (args.number // per_call) / per_call * 1e6:>10.2f}")
+    finally:
+        shm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import struct
+import timeit
+
+import numpy as np
+
+from silksong.shared_memory import GameState, SilkSongSharedMemory, game_state_view
+
+Layout = SilkSongSharedMemory
+
+
+def _fill_buffer(buf: bytearray, rng: np.random.Generator):
+    values = [
+        *rng.uniform(30, 80, 4), 7, 9, 5, 12, 0.5, 1, 0, 1, 0, 1,
+        *rng.uniform(30, 80, 4), 640, 800, 1, 16, 0.25, 1,
+        42.0, 0, 0,
+        *rng.uniform(0, 1, 32), *rng.integers(0, 6, 32),
+    ]
+    struct.pack_into(Layout.GAME_STATE_FORMAT, buf, Layout.GAME_STATE_OFFSET, *values)
+
+
+def decode_struct(buf) -> GameState:
+    """The previous `read_game_state`: full unpack plus two fresh raycast arrays."""
+    data = struct.unpack_from(Layout.GAME_STATE_FORMAT, buf, offset=Layout.GAME_STATE_OFFSET)
+    return GameState(
+        *data[:9], *map(bool, data[9:14]), *data[14:23], bool(data[23]), data[24], bool(data[25]), bool(data[26]),
+        raycast_distances=np.array(data[27:59], dtype=np.float32),
+        raycast_hit_types=np.array(data[59:91], dtype=np.float32),
+    )
+
+
+def read_view_fields(view: np.ndarray):
+    """What a step needs from the view: the reward scalars plus the raycast arrays, no copies."""
+    return (
+        view["boss_health"], view["player_health"], view["player_silk"],
+        view["raycast_distances"], view["raycast_hit_types"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-step GameState decode cost")
+    parser.add_argument("--number", type=int, default=100_000)
+    args = parser.parse_args()
+
+    buf = bytearray(Layout.MEMORY_SIZE)
+    _fill_buffer(buf, np.random.default_rng(0))
+    view = game_state_view(buf, Layout.GAME_STATE_OFFSET)
+
+    legacy = decode_struct(buf)
+    converted = GameState.from_record(view)
+    for name in GameState.__dataclass_fields__:
+        assert np.array_equal(getattr(legacy, name), getattr(converted, name)), name
+
+    cases = {
+        "struct.unpack_from + GameState (before)": lambda: decode_struct(buf),
+        "GameState.from_record(view)": lambda: GameState.from_record(view),
+        "structured view field reads": lambda: read_view_fields(view),
+    }
+
+    print(f"\n{'Decode path':<42}{'us/step':>10}")
+    for name, fn in cases.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:<42}{seconds / args.number * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+import numpy as np
+
+# Spawned workers re-import this module, so it imports no more than the env workers may.
+from silksong.shared_memory import GAME_STATE_DTYPE, CommandType
+from silksong.trace import TraceWriter
+
+IMPORT_PROBE = """
+import importlib, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(elapsed, peak, "torch" in sys.modules, "stable_baselines3" in sys.modules)
+"""
+
+
+def import_cost(module: str, repeat: int) -> tuple[float, float, bool, bool]:
+    """Best-of-`repeat` seconds and peak MiB to import `module` in a fresh interpreter."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", IMPORT_PROBE, module], capture_output=True, text=True,
+                                check=True, cwd=os.getcwd()).stdout.split()
+        runs.append((float(output[0]), float(output[1]), output[2] == "True", output[3] == "True"))
+    return min(runs)
+
+
+def replay_trace() -> str:
+    """A one-record trace, so workers can build a real SilksongBossEnv without a game."""
+    path = os.path.join(tempfile.mkdtemp(prefix="silksong_imports_"), "reset.sstrace")
+    writer = TraceWriter(path)
+    writer.append(CommandType.RESET, np.zeros((1, 10), dtype=np.uint8), np.zeros(1, dtype=GAME_STATE_DTYPE), 0.0, 0.0)
+    writer.close()
+    return path
+
+
+def worker_rss(pid: int) -> float:
+    """Resident MiB of a process (Linux only; NaN elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _maps_library(pid: int, package: str) -> bool:
+    """Whether a process has mapped a shared library of `package` (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/maps") as f:
+            return any(f"/{package}/" in line for line in f)
+    except OSError:
+        return False
+
+
+def worker_cost(light: bool, n_workers: int, trace: str) -> tuple[float, float, bool]:
+    """Seconds until `n_workers` spawned env workers answer, their mean RSS, and whether they loaded torch."""
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+
+    from silksong.vec_env import SilksongSubprocVecEnv
+    from train import _make_env
+
+    # train.py's subprocess env factory, served by the replay instead of a game.
+    factory = partial(_make_env, env_id=1, shm_kwargs=dict(replay=trace))
+    start = time.perf_counter()
+    if light:
+        vec_env = SilksongSubprocVecEnv([factory] * n_workers)
+    else:
+        vec_env = SubprocVecEnv([partial(factory, monitor_class=Monitor)] * n_workers, start_method="spawn")
+    elapsed = time.perf_counter() - start
+    try:
+        rss = float(np.mean([worker_rss(process.pid) for process in vec_env.processes]))
+        torch_loaded = _maps_library(vec_env.processes[0].pid, "torch")
+    finally:
+        vec_env.close()
+    return elapsed, rss, torch_loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and memory of the package, the entry points "
+                                                 "and spawned env workers")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--n_workers", type=int, default=4)
+    args = parser.parse_args()
+
+    modules = ("silksong", "silksong.env", "silksong.simulator", "train", "tune", "silksong.networks")
+    print(f"{'Fresh import':<28}{'s':>8}{'peak MiB':>10}{'torch':>7}{'sb3':>6}")
+    for module in modules:
+        seconds, peak, torch_loaded, sb3_loaded = import_cost(module, args.repeat)
+        print(f"{module:<28}{seconds:>8.2f}{peak:>10.0f}{'yes' if torch_loaded else 'no':>7}"
+              f"{'yes' if sb3_loaded else 'no':>6}")
+
+    trace = replay_trace()
+    print(f"\n{f'{args.n_workers} spawned env workers':<28}{'s':>8}{'MiB/proc':>10}{'torch':>7}")
+    for name, light in (("SubprocVecEnv (before)", False), ("SilksongSubprocVecEnv", True)):
+        seconds, rss, torch_loaded = min(worker_cost(light, args.n_workers, trace) for _ in range(args.repeat))
+        print(f"{name:<28}{seconds:>8.2f}{rss:>10.0f}{'yes' if torch_loaded else 'no':>7}")
+
+
+if __name__ == "__main__":
+    main()
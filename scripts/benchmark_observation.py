@@ -0,0 +1,108 @@
+import argparse
+import timeit
+
+import numpy as np
+import torch
+from gymnasium import spaces
+
+from silksong.constants import COMPACT_OBSERVATION_DIM, NUM_RAYS, OBSERVATION_DIM
+from silksong.networks import MultiHeadFeatureExtractor
+from silksong.observation import ObservationEncoder
+from silksong.shared_memory import GAME_STATE_DTYPE, GameState
+
+
+def random_records(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Random records, deliberately including out-of-range values to exercise clipping."""
+    records = np.zeros(n, dtype=GAME_STATE_DTYPE)
+    for field in ("player_pos_x", "boss_pos_x"):
+        records[field] = rng.uniform(20, 90, n)
+    for field in ("player_pos_y", "boss_pos_y"):
+        records[field] = rng.uniform(85, 135, n)
+    for field in ("player_vel_x", "player_vel_y", "boss_vel_x", "boss_vel_y"):
+        records[field] = rng.uniform(-90, 90, n)
+    for field in ("player_animation_progress", "boss_animation_progress"):
+        records[field] = rng.uniform(-0.2, 1.2, n)
+    for field in ("player_grounded", "player_can_dash", "player_facing_right",
+                  "player_invincible", "player_can_attack", "boss_facing_right"):
+        records[field] = rng.integers(0, 2, n)
+    records["player_health"] = rng.integers(0, 10, n)
+    records["player_silk"] = rng.integers(0, 13, n)
+    records["boss_health"] = rng.integers(-20, 801, n)
+    records["boss_phase"] = rng.integers(0, 3, n)
+    records["player_animation_state"] = rng.integers(-2, 90, n)
+    records["boss_animation_state"] = rng.integers(-2, 80, n)
+    records["raycast_distances"] = rng.uniform(0, 1, (n, NUM_RAYS))
+    records["raycast_hit_types"] = rng.integers(-1, 8, (n, NUM_RAYS))
+    return records
+
+
+def _extractor(dim: int) -> MultiHeadFeatureExtractor:
+    return MultiHeadFeatureExtractor(spaces.Box(low=-np.inf, high=np.inf, shape=(dim,), dtype=np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Observation encoder benchmark (tests/test_observation.py checks its output)")
+    parser.add_argument("--number", type=int, default=20_000)
+    parser.add_argument("--n_envs", type=int, default=16)
+    parser.add_argument("--n_steps", type=int, default=2048, help="Rollout length for the buffer size estimate")
+    parser.add_argument("--batch_size", type=int, default=512, help="Minibatch for the extractor timing")
+    parser.add_argument("--history_length", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    record = random_records(1, rng)[0]
+    state = GameState.from_record(record)
+    batch = random_records(args.n_envs, rng)
+    encoder = ObservationEncoder(n_envs=args.n_envs)
+    compact_encoder = ObservationEncoder(n_envs=args.n_envs, compact=True)
+
+    cases = {
+        "GameState.to_observation (before)": (lambda: state.to_observation(), 1),
+        "ObservationEncoder.encode": (lambda: encoder.encode(record), 1),
+        f"to_observation x {args.n_envs}": (lambda: [state.to_observation() for _ in range(args.n_envs)], args.n_envs),
+        f"ObservationEncoder.encode_batch({args.n_envs})": (lambda: encoder.encode_batch(batch), args.n_envs),
+        f"compact encode_batch({args.n_envs})": (lambda: compact_encoder.encode_batch(batch), args.n_envs),
+    }
+
+    # What a generic frame stacker (SB3 VecFrameStack) does per step: roll the whole stack, write the new frame.
+    frames = encoder.encode_batch(batch).copy()
+    stacked = np.zeros((args.n_envs, args.history_length * OBSERVATION_DIM), dtype=np.float32)
+
+    def roll_stack():
+        stacked[:] = np.roll(stacked, shift=-OBSERVATION_DIM, axis=-1)
+        stacked[:, -OBSERVATION_DIM:] = frames
+        return stacked.copy()
+
+    history = encoder.history(args.history_length)
+    delta_history = encoder.history(args.history_length, deltas=True)
+    history.reset(frames)
+    delta_history.reset(frames)
+    cases[f"frame stack ({args.history_length}) push + copy (before)"] = (roll_stack, args.n_envs)
+    cases[f"ObservationHistory({args.history_length}) push + copy"] = (lambda: history.push(frames).copy(), args.n_envs)
+    cases["  with deltas"] = (lambda: delta_history.push(frames).copy(), args.n_envs)
+
+    print(f"\n{'Encoder':<42}{'us/obs':>10}")
+    for name, (fn, per_call) in cases.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:<42}{seconds / args.number / per_call * 1e6:>10.2f}")
+
+    print(f"\n{'Rollout buffer observations':<42}{'MiB':>10}")
+    for name, dim in (("full", OBSERVATION_DIM), ("compact", COMPACT_OBSERVATION_DIM)):
+        print(f"{name:<42}{args.n_steps * args.n_envs * dim * 4 / 2 ** 20:>10.1f}")
+
+    minibatch = random_records(args.batch_size, rng)
+    full_obs = torch.as_tensor(ObservationEncoder(args.batch_size).encode_batch(minibatch).copy())
+    compact_obs = torch.as_tensor(ObservationEncoder(args.batch_size, compact=True).encode_batch(minibatch).copy())
+    full_extractor, compact_extractor = _extractor(OBSERVATION_DIM), _extractor(COMPACT_OBSERVATION_DIM)
+    history_extractor = _extractor(args.history_length * OBSERVATION_DIM)
+    history_obs = full_obs.repeat(1, args.history_length)
+    print(f"\n{'Extractor forward, batch ' + str(args.batch_size):<42}{'ms':>10}")
+    with torch.no_grad():
+        for name, extractor, obs in (("full", full_extractor, full_obs), ("compact", compact_extractor, compact_obs),
+                                     (f"history ({args.history_length})", history_extractor, history_obs)):
+            seconds = min(timeit.repeat(lambda: extractor(obs), number=50, repeat=3))
+            print(f"{name:<42}{seconds / 50 * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from silksong.env import SilksongBossEnv
+from silksong.shared_memory import CommandType
+from silksong.trace import ReplaySharedMemory, read_trace
+from silksong.vec_env import SilksongVecEnv
+
+
+def record_trace(path: str, env_id: int, n_steps: int, action_repeat: int, seed: int) -> float:
+    """Play random actions against the stand-in game with recording on. Returns steps/s."""
+    env = SilksongBossEnv(
+        env_id, action_repeat=action_repeat, simulator=True, simulator_args=["--seed", str(seed)], record_path=path,
+    )
+    env.action_space.seed(seed)
+    try:
+        env.reset()
+        start = time.perf_counter()
+        for _ in range(n_steps // action_repeat):
+            _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+            if terminated or truncated:
+                env.reset()
+        return n_steps / (time.perf_counter() - start)
+    finally:
+        env.close()
+
+
+def check_replay(path: str):
+    """Assert a replay serves back exactly the recorded states and reports no button mismatches."""
+    records = read_trace(path)
+    replay = ReplaySharedMemory(1, replay=path, loop=False)
+    try:
+        for record in records:
+            if record["command"] == CommandType.RESET:
+                replay.reset()
+            else:
+                replay.step(record["buttons"])
+            assert replay.state_view.tobytes() == record["state"].tobytes(), "replayed state differs from the recording"
+        assert replay.mismatched_steps == 0, f"{replay.mismatched_steps} mismatched steps"
+    finally:
+        replay.close()
+    print(f"Replay matches the recording on {len(records)} records")
+
+
+def benchmark_env(path: str, n_steps: int, action_repeat: int, timing: str) -> float:
+    env = SilksongBossEnv(1, action_repeat=action_repeat, replay=path, replay_timing=timing)
+    env.action_space.seed(0)
+    try:
+        env.reset()
+        start = time.perf_counter()
+        for _ in range(n_steps // action_repeat):
+            _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+            if terminated or truncated:
+                env.reset()
+        return n_steps / (time.perf_counter() - start)
+    finally:
+        env.close()
+
+
+def benchmark_vec_env(path: str, n_steps: int, n_envs: int, timing: str) -> float:
+    vec_env = SilksongVecEnv(range(1, n_envs + 1), replay=path, replay_timing=timing)
+    try:
+        vec_env.reset()
+        actions = np.stack([vec_env.action_space.sample() for _ in range(n_envs)])
+        start = time.perf_counter()
+        for _ in range(n_steps // n_envs):
+            vec_env.step(actions)
+        return n_steps / (time.perf_counter() - start)
+    finally:
+        vec_env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record a trace with the stand-in game and benchmark its replay")
+    parser.add_argument("--trace", type=str, default=None, help="Replay this trace instead of recording a new one")
+    parser.add_argument("--record_steps", type=int, default=3000)
+    parser.add_argument("--steps", type=int, default=20_000)
+    parser.add_argument("--action_repeat", type=int, default=1)
+    parser.add_argument("--n_envs", type=int, default=8)
+    parser.add_argument("--timing", type=str, default="fast", choices=ReplaySharedMemory.REPLAY_TIMINGS)
+    parser.add_argument("--env_id", type=int, default=94)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    trace = args.trace
+    if trace is None:
+        trace = os.path.join(tempfile.mkdtemp(prefix="silksong_trace_"), "simulator.sstrace")
+        rate = record_trace(trace, args.env_id, args.record_steps, args.action_repeat, args.seed)
+        size = os.path.getsize(trace)
+        print(f"Recorded {args.record_steps} steps at {rate:.0f} steps/s to {trace} ({size / 1024:.0f} KiB)")
+
+    check_replay(trace)
+
+    env_rate = benchmark_env(trace, args.steps, args.action_repeat, args.timing)
+    vec_rate = benchmark_vec_env(trace, args.steps, args.n_envs, args.timing)
+
+    print(f"\n{'Backend':<28}{'steps/s':>10}")
+    print(f"{'SilksongBossEnv':<28}{env_rate:>10.0f}")
+    print(f"{f'SilksongVecEnv ({args.n_envs} envs)':<28}{vec_rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import time
+
+import numpy as np
+
+from silksong.pool import InstancePool
+from silksong.reward import RewardConfig
+from silksong.vec_env import SilksongVecEnv
+
+MODES = ("reset after the batch (before)", "overlapped reset", "swap for spares")
+
+
+def benchmark_mode(mode: str, first_id: int, n_envs: int, n_spares: int, n_steps: int, episode_steps: int,
+                   simulator_args: list[str]) -> dict:
+    swap = mode == "swap for spares"
+    pool = None
+    if swap:
+        pool = InstancePool(range(first_id + n_envs, first_id + n_envs + n_spares), simulator=True,
+                            simulator_args=simulator_args)
+    env = SilksongVecEnv(range(first_id, first_id + n_envs), pool=pool, swap_resets=swap, profile_every=1,
+                         reward_config=RewardConfig(max_episode_steps=episode_steps), simulator=True,
+                         simulator_args=simulator_args)
+    if mode == "reset after the batch (before)":
+        # Never predict the episode end, so every RESET is sent after the batch is scored.
+        env.rewards.ends_episode = lambda i, record: False
+
+    try:
+        env.reset()
+        if pool is not None:
+            while pool.ready_count < n_spares:
+                time.sleep(0.01)
+        for profiler in env.profilers:
+            profiler.report()
+
+        # The whole batch waits in _finish_resets; per-env reset_wait overlaps across envs.
+        stalls = []
+        finish_resets = env._finish_resets
+
+        def timed_finish(indices):
+            finish_start = time.perf_counter()
+            finish_resets(indices)
+            stalls.append(time.perf_counter() - finish_start)
+
+        env._finish_resets = timed_finish
+        actions = np.zeros((n_envs, 8), dtype=np.int64)
+        episodes = 0
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            env.step_async(actions)
+            _, _, dones, _ = env.step_wait()
+            episodes += int(dones.sum())
+        elapsed = time.perf_counter() - start
+
+        histograms = {}
+        for profiler in env.profilers:
+            for phase, histogram in profiler.report().items():
+                if phase in histograms:
+                    histograms[phase].merge(histogram)
+                else:
+                    histograms[phase] = histogram
+    finally:
+        env.close()
+
+    reset_wait = histograms.get("reset_wait")
+    return {
+        "mode": mode,
+        "steps_per_sec": n_steps * n_envs / elapsed,
+        "episodes": episodes,
+        "reset_wait_mean_ms": reset_wait.mean * 1000 if reset_wait else 0.0,
+        "reset_wait_p95_ms": reset_wait.percentile(95) * 1000 if reset_wait else 0.0,
+        "stalled_fraction": sum(stalls) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch throughput around auto-resets against the simulator: "
+                                                 "resets sent after the batch, overlapped, and swapped for spares")
+    parser.add_argument("--n_envs", type=int, default=4)
+    parser.add_argument("--n_spares", type=int, default=4)
+    parser.add_argument("--n_steps", type=int, default=500, help="Batch steps per mode")
+    parser.add_argument("--episode_steps", type=int, default=50, help="Truncate episodes after this many steps")
+    parser.add_argument("--step_latency_ms", type=float, default=5.0)
+    parser.add_argument("--reset_latency_ms", type=float, default=50.0)
+    parser.add_argument("--first_id", type=int, default=700)
+    args = parser.parse_args()
+
+    simulator_args = ["--step_latency_ms", str(args.step_latency_ms), "--reset_latency_ms", str(args.reset_latency_ms)]
+    print(f"{args.n_envs} envs, {args.episode_steps}-step episodes, "
+          f"{args.step_latency_ms:g} ms steps, {args.reset_latency_ms:g} ms resets\n")
+    print(f"{'Mode':<34}{'steps/s':>10}{'episodes':>10}{'wait mean':>11}{'wait p95':>10}{'stalled':>9}")
+    for mode in MODES:
+        result = benchmark_mode(mode, args.first_id, args.n_envs, args.n_spares, args.n_steps,
+                                args.episode_steps, simulator_args)
+        print(f"{mode:<34}{result['steps_per_sec']:>10.1f}{result['episodes']:>10}"
+              f"{result['reset_wait_mean_ms']:>9.1f}ms{result['reset_wait_p95_ms']:>8.1f}ms"
+              f"{result['stalled_fraction']:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import timeit
+
+import numpy as np
+
+from scripts.benchmark_observation import random_records
+from silksong.reward import DEFAULT_REWARD_CONFIG, RewardConfig, RewardKernel, calculate_reward
+from silksong.shared_memory import GameState
+
+
+def random_episodes(steps: int, n_envs: int, rng: np.random.Generator) -> np.ndarray:
+    """`(steps + 1, n_envs)` records whose health, silk and time move like a fight, with wins, losses and stuns."""
+    records = random_records((steps + 1) * n_envs, rng).reshape(steps + 1, n_envs)
+    records["player_health"] = np.clip(10 - np.cumsum(rng.choice([0, 0, 0, 1, -1], (steps + 1, n_envs)), axis=0), -1, 10)
+    records["player_silk"] = np.clip(np.cumsum(rng.choice([0, 1, -3], (steps + 1, n_envs)), axis=0), 0, 12)
+    records["boss_health"] = 800 - np.cumsum(rng.choice([0, 0, 13, 40], (steps + 1, n_envs)), axis=0)
+    records["boss_animation_state"] = np.where(rng.random((steps + 1, n_envs)) < 0.2, 16, records["boss_animation_state"])
+    records["episode_time"] = rng.uniform(0.0, 200.0, (steps + 1, n_envs))
+    records["truncated"] = rng.random((steps + 1, n_envs)) < 0.01
+    # Half the steps within a few units of the boss, so both distance penalties trigger.
+    near = rng.random((steps + 1, n_envs)) < 0.5
+    records["boss_pos_x"] = np.where(near, records["player_pos_x"] + rng.uniform(-2, 2, (steps + 1, n_envs)),
+                                     records["boss_pos_x"])
+    return records
+
+
+def check_equivalence(config: RewardConfig, steps: int = 2000, n_envs: int = 16, seed: int = 0):
+    """Assert RewardKernel matches calculate_reward plus the per-env counters, timeouts included."""
+    rng = np.random.default_rng(seed)
+    episodes = random_episodes(steps, n_envs, rng)
+    timeouts = rng.random((steps, n_envs)) < 0.01
+
+    kernel = RewardKernel(n_envs, config)
+    kernel.reset(episodes[0])
+    prev = [GameState.from_record(r) for r in episodes[0]]
+    counters = [dict(attack=0, hurt=0, heal=0, reward=0.0, lowest=s.boss_health, steps=0) for s in prev]
+
+    for t in range(steps):
+        records = episodes[t + 1]
+        rewards, terminated, truncated = kernel.step(records, timeouts[t])
+
+        for i, record in enumerate(records):
+            state = GameState.from_record(record)
+            c = counters[i]
+            c["steps"] += 1
+            if timeouts[t, i]:
+                reward, done, cut = 0.0, False, True
+            else:
+                reward, hit, hurt, healed = calculate_reward(
+                    state, prev[i].boss_health, prev[i].player_health, prev[i].player_silk, config
+                )
+                c["attack"] += hit
+                c["hurt"] += hurt
+                c["heal"] += healed
+                c["reward"] += reward
+                c["lowest"] = min(c["lowest"], state.boss_health)
+                done = state.boss_health <= 0 or state.player_health <= 0
+                cut = c["steps"] >= config.max_episode_steps or state.truncated
+            prev[i] = state
+
+            assert rewards[i] == reward, f"reward differs at step {t}, env {i}: {rewards[i]!r} != {reward!r}"
+            assert terminated[i] == done and truncated[i] == cut, f"done flags differ at step {t}, env {i}"
+            assert (kernel.attack_count[i], kernel.hurt_count[i], kernel.heal_count[i], kernel.lowest_boss_hp[i]) == \
+                   (c["attack"], c["hurt"], c["heal"], c["lowest"]), f"counters differ at step {t}, env {i}"
+            assert kernel.episode_reward[i] == c["reward"], f"episode reward differs at step {t}, env {i}"
+
+            # Start a new episode where the old one ended, like the envs do.
+            if done or cut:
+                kernel.reset(record, [i])
+                counters[i] = dict(attack=0, hurt=0, heal=0, reward=0.0, lowest=state.boss_health, steps=0)
+
+    print(f"RewardKernel matches calculate_reward on {steps} steps x {n_envs} envs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reward kernel equivalence check and benchmark")
+    parser.add_argument("--number", type=int, default=5_000)
+    parser.add_argument("--n_envs", type=int, default=16)
+    args = parser.parse_args()
+
+    check_equivalence(DEFAULT_REWARD_CONFIG)
+    check_equivalence(RewardConfig(hit=0.5, stunned_hurt=3.0, silk_cost=0.1, idle=0.0, far_distance=10.0,
+                                   time_bonus_seconds=60.0, loss_penalty=2.0, max_episode_steps=50), seed=1)
+
+    rng = np.random.default_rng(2)
+    records = random_episodes(1, args.n_envs, rng)
+    prev, batch = records[0], records[1]
+    states = [GameState.from_record(r) for r in batch]
+    kernel = RewardKernel(args.n_envs)
+    kernel.reset(prev)
+    timed_out = np.zeros(args.n_envs, dtype=bool)
+
+    # What SilksongVecEnv did per env before the kernel: the scalar reward plus NumPy counter updates.
+    counters = {name: np.zeros(args.n_envs, dtype=np.int64) for name in
+                ("prev_boss", "prev_player", "prev_silk", "steps", "attack", "hurt", "heal", "lowest")}
+    episode_reward = np.zeros(args.n_envs)
+    rewards = np.zeros(args.n_envs, dtype=np.float32)
+    dones = np.zeros(args.n_envs, dtype=bool)
+
+    def scalar_batch():
+        c = counters
+        for i, state in enumerate(states):
+            reward, hit, hurt, healed = calculate_reward(state, c["prev_boss"][i], c["prev_player"][i], c["prev_silk"][i])
+            c["attack"][i] += hit
+            c["hurt"][i] += hurt
+            c["heal"][i] += healed
+            rewards[i] = reward
+            episode_reward[i] += reward
+            c["lowest"][i] = min(c["lowest"][i], state.boss_health)
+            terminated = state.boss_health <= 0 or state.player_health <= 0
+            truncated = c["steps"][i] >= DEFAULT_REWARD_CONFIG.max_episode_steps or state.truncated
+            c["prev_boss"][i] = state.boss_health
+            c["prev_player"][i] = state.player_health
+            c["prev_silk"][i] = state.player_silk
+            dones[i] = terminated or truncated
+
+    def kernel_batch():
+        kernel.step(batch, timed_out)
+        kernel.total_steps[:] = 0
+
+    cases = {
+        f"calculate_reward loop x {args.n_envs} (before)": (scalar_batch, args.n_envs),
+        f"RewardKernel.step({args.n_envs})": (kernel_batch, args.n_envs),
+    }
+
+    print(f"\n{'Reward':<42}{'us/env':>10}")
+    for name, (fn, per_call) in cases.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:<42}{seconds / args.number / per_call * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import torch.nn as nn
+from stable_baselines3 import PPO
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+
+from silksong.env import SilksongBossEnv, convert_to_binary
+from silksong.networks import MultiHeadFeatureExtractor
+from silksong.observation import ObservationEncoder
+from silksong.shared_memory import CommandType
+from silksong.vec_env import SilksongSubprocVecEnv, SilksongVecEnv
+from silksong.worker import EpisodeMonitor
+
+DEFAULT_BASELINE = Path("benchmarks") / "baseline.json"
+MACRO_BACKENDS = ("dummy", "subproc", "shm")
+
+
+def _make_env(env_id: int, simulator_args: list[str], monitor_class: type = EpisodeMonitor):
+    return monitor_class(SilksongBossEnv(env_id, simulator=True, simulator_args=simulator_args))
+
+
+def _timed(fn, number: int, repeat: int = 5) -> float:
+    """Best-of-`repeat` microseconds per call."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def micro_benchmarks(env_id: int, number: int, simulator_args: list[str]) -> dict:
+    env = SilksongBossEnv(env_id, simulator=True, simulator_args=simulator_args)
+    try:
+        env.reset()
+        shm = env.shm
+        state = shm.read_game_state()
+        record = shm.state_view
+        encoder = ObservationEncoder()
+        action = env.action_space.sample()
+        none_payload = shm.COMMAND_PAYLOAD.pack(CommandType.NONE, True, False, True, False, True, *[False] * 5)
+
+        # CommandType.NONE is consumed by the game without stepping, so only the write is timed.
+        cases = {
+            "read_game_state": lambda: shm.read_game_state(),
+            "to_observation": lambda: state.to_observation(),
+            "ObservationEncoder.encode": lambda: encoder.encode(record),
+            "send_command": lambda: shm.send_command(CommandType.NONE, True, False, True, False, True),
+            "write_command": lambda: shm.write_command(none_payload),
+            "convert_to_binary": lambda: convert_to_binary(action, 0),
+            "CommandEncoder.encode": lambda: env.commands.encode(action),
+            "_calculate_reward": lambda: env._calculate_reward(state),
+        }
+        return {f"micro/{name}": {"value": _timed(fn, number), "unit": "us/call"} for name, fn in cases.items()}
+    finally:
+        env.close()
+
+
+def _create_vec_env(backend: str, env_ids: list[int], simulator_args: list[str]):
+    if backend == "shm":
+        return SilksongVecEnv(env_ids, simulator=True, simulator_args=simulator_args)
+    if backend == "subproc":
+        return SilksongSubprocVecEnv([partial(_make_env, env_id, simulator_args) for env_id in env_ids])
+    return DummyVecEnv([partial(_make_env, env_id, simulator_args, Monitor) for env_id in env_ids])
+
+
+def macro_env_step(backend: str, env_ids: list[int], steps: int, simulator_args: list[str]) -> float:
+    """Env steps per second for random actions, auto-resets included."""
+    vec_env = _create_vec_env(backend, env_ids, simulator_args)
+    try:
+        vec_env.action_space.seed(0)
+        vec_env.reset()
+        actions = np.stack([vec_env.action_space.sample() for _ in env_ids])
+        iterations = max(1, steps // len(env_ids))
+        start = time.perf_counter()
+        for _ in range(iterations):
+            vec_env.step(actions)
+        return iterations * len(env_ids) / (time.perf_counter() - start)
+    finally:
+        vec_env.close()
+
+
+def macro_ppo_rollout(env_ids: list[int], n_steps: int, simulator_args: list[str]) -> float:
+    """Env steps per second of `PPO.collect_rollouts` (policy forward passes included, training excluded)."""
+    env = VecNormalize(SilksongVecEnv(env_ids, simulator=True, simulator_args=simulator_args), norm_obs=False)
+    try:
+        model = PPO(
+            "MlpPolicy", env, n_steps=n_steps, batch_size=n_steps, device="cpu", verbose=0,
+            policy_kwargs=dict(
+                features_extractor_class=MultiHeadFeatureExtractor,
+                features_extractor_kwargs=dict(features_dim=256),
+                net_arch=dict(pi=[128], vf=[128]),
+                activation_fn=nn.ReLU,
+            ),
+        )
+        _, callback = model._setup_learn(n_steps * len(env_ids) * 2)
+        callback.on_training_start(locals(), globals())
+        # The first rollout warms up torch; the second is timed.
+        model.collect_rollouts(model.env, callback, model.rollout_buffer, n_rollout_steps=n_steps)
+        start = time.perf_counter()
+        model.collect_rollouts(model.env, callback, model.rollout_buffer, n_rollout_steps=n_steps)
+        return n_steps * len(env_ids) / (time.perf_counter() - start)
+    finally:
+        env.close()
+
+
+def higher_is_better(unit: str) -> bool:
+    return unit == "steps/s"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Print results next to the baseline. Returns the names that regressed by more than `tolerance`."""
+    regressions = []
+    print(f"\n{'Benchmark':<40}{'unit':>9}{'result':>12}{'baseline':>12}{'change':>9}")
+    for name, result in results.items():
+        value, unit = result["value"], result["unit"]
+        previous = baseline.get(name, {}).get("value")
+        if previous is None:
+            print(f"{name:<40}{unit:>9}{value:>12.2f}{'-':>12}{'':>9}")
+            continue
+
+        change = (value - previous) / previous
+        worse = -change if higher_is_better(unit) else change
+        flag = ""
+        if worse > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<40}{unit:>9}{value:>12.2f}{previous:>12.2f}{change:>+8.1%}{flag}")
+    return regressions
+
+
+def _metadata(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Env stack throughput benchmarks against the stand-in game. Exits with 1 when a result is "
+                    "worse than the stored baseline by more than --tolerance."
+    )
+    parser.add_argument("--n_envs", type=int, nargs="*", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--backends", type=str, nargs="*", default=list(MACRO_BACKENDS), choices=MACRO_BACKENDS)
+    parser.add_argument("--macro_steps", type=int, default=4096, help="Env steps per macro-benchmark configuration")
+    parser.add_argument("--micro_number", type=int, default=20_000, help="Calls per micro-benchmark repeat")
+    parser.add_argument("--ppo_n_envs", type=int, default=4)
+    parser.add_argument("--ppo_n_steps", type=int, default=256)
+    parser.add_argument("--simulator_args", type=str, default="",
+                        help="Stand-in game options, e.g. \"--step_latency_ms 1\"")
+    parser.add_argument("--quick", action="store_true", help="n_envs 1 and 4, fewer steps")
+    parser.add_argument("--skip_macro", action="store_true")
+    parser.add_argument("--skip_ppo", action="store_true")
+    parser.add_argument("--first_id", type=int, default=100)
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=str, default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update_baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed fractional slowdown vs. the baseline")
+
+    args = parser.parse_args()
+    simulator_args = shlex.split(args.simulator_args)
+    if args.quick:
+        args.n_envs = [1, 4]
+        args.macro_steps = 1024
+        args.micro_number = 5000
+        args.ppo_n_steps = 128
+
+    next_id = args.first_id
+
+    def take_ids(n: int) -> list[int]:
+        nonlocal next_id
+        next_id += n
+        return list(range(next_id - n, next_id))
+
+    results = micro_benchmarks(take_ids(1)[0], args.micro_number, simulator_args)
+
+    if not args.skip_macro:
+        for backend in args.backends:
+            for n_envs in args.n_envs:
+                steps_per_sec = macro_env_step(backend, take_ids(n_envs), args.macro_steps, simulator_args)
+                results[f"env_step/{backend}/n_envs={n_envs}"] = {"value": steps_per_sec, "unit": "steps/s"}
+                print(f"[Benchmark] {backend} n_envs={n_envs}: {steps_per_sec:.0f} steps/s")
+
+    if not args.skip_ppo:
+        steps_per_sec = macro_ppo_rollout(take_ids(args.ppo_n_envs), args.ppo_n_steps, simulator_args)
+        results[f"ppo_rollout/shm/n_envs={args.ppo_n_envs}"] = {"value": steps_per_sec, "unit": "steps/s"}
+
+    report = {"metadata": _metadata(args), "results": results}
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())["results"]
+        print(f"\nComparing against {baseline_path}")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nResults written to {args.output}")
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2))
+        print(f"Baseline updated: {baseline_path}")
+
+    if regressions and not args.update_baseline:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
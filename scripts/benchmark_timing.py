@@ -0,0 +1,95 @@
+import argparse
+import time
+
+import numpy as np
+
+from silksong.env import SilksongBossEnv
+from silksong.shared_memory import EpisodeTiming, GameState
+
+# Boss wind-ups (silksong/arena.py BOSS_MOVES): antic, charge_antic, jump_antic, bomb_slash_antic.
+BOSS_ANTICS = (2, 4, 21, 37)
+DODGE_DISTANCE = 4.0
+ATTACK_DISTANCE = 2.0
+
+
+def scripted_action(state: GameState) -> np.ndarray:
+    """Close in and slash; dash away when the boss winds up nearby. Its hits taken measure reaction time."""
+    action = np.zeros(8, dtype=np.int64)
+    dx = state.boss_pos_x - state.player_pos_x
+    toward, away = (2, 1) if dx > 0 else (1, 2)
+    if state.boss_animation_state in BOSS_ANTICS and abs(dx) < DODGE_DISTANCE:
+        action[0] = away
+        action[4] = 1
+    elif abs(dx) > ATTACK_DISTANCE:
+        action[0] = toward
+    else:
+        if state.player_facing_right != (dx > 0):
+            action[0] = toward
+        action[3] = 1
+    return action
+
+
+def benchmark_timing(env: SilksongBossEnv, timing: EpisodeTiming, seconds: float) -> dict:
+    """Play the scripted policy for `seconds` of wall time with `timing`."""
+    env.set_episode_timing(timing)
+    env.reset()
+    state = env.shm.read_game_state()
+    steps = episodes = damage = hits = 0
+    game_time = 0.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        _, _, terminated, truncated, _ = env.step(scripted_action(state))
+        next_state = env.shm.read_game_state()
+        steps += 1
+        game_time += next_state.episode_time - state.episode_time
+        damage += max(0, state.boss_health - next_state.boss_health)
+        hits += state.player_health > next_state.player_health
+        state = next_state
+        if terminated or truncated:
+            episodes += 1
+            env.reset()
+            state = env.shm.read_game_state()
+    elapsed = time.perf_counter() - start
+    minutes = max(game_time, 1e-9) / 60.0
+    return {
+        "steps_per_sec": steps / elapsed,
+        "game_speed": game_time / elapsed,
+        "episodes": episodes,
+        "damage_per_minute": damage / minutes,
+        "hits_per_minute": hits / minutes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and fidelity of episode timings against the simulator: "
+                                                 "a scripted dodge-and-slash policy per frames-per-step and time scale")
+    parser.add_argument("--frames_per_step", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--time_scales", type=float, nargs="+", default=None,
+                        help="Episode time scales to try (default: the launch time scale only)")
+    parser.add_argument("--launch_time_scale", type=float, default=4.0)
+    parser.add_argument("--step_latency_ms", type=float, default=10.0,
+                        help="Wall time of a default 2-frame step at the launch time scale")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Wall time per timing")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--env_id", type=int, default=900)
+    args = parser.parse_args()
+
+    simulator_args = ["--step_latency_ms", str(args.step_latency_ms), "--seed", str(args.seed)]
+    env = SilksongBossEnv(args.env_id, time_scale=args.launch_time_scale, simulator=True,
+                          simulator_args=simulator_args)
+    try:
+        print(f"Launch time scale {args.launch_time_scale:g}, {args.step_latency_ms:g} ms per default step, "
+              f"{args.seconds:g} s per timing\n")
+        print(f"{'Timing':<34}{'steps/s':>9}{'game s/s':>10}{'episodes':>10}{'dmg/min':>9}{'hits/min':>10}")
+        for time_scale in args.time_scales or [None]:
+            for frames_per_step in args.frames_per_step:
+                timing = EpisodeTiming(frames_per_step, time_scale)
+                result = benchmark_timing(env, timing, args.seconds)
+                print(f"{str(timing):<34}{result['steps_per_sec']:>9.1f}{result['game_speed']:>10.2f}"
+                      f"{result['episodes']:>10}{result['damage_per_minute']:>9.1f}{result['hits_per_minute']:>10.2f}")
+    finally:
+        env.close()
+
+
+if __name__ == "__main__":
+    main()
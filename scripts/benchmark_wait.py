@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import numpy as np
+
+from silksong.shared_memory import SilkSongSharedMemory
+
+MODES = {
+    "spin": dict(wait_mode="spin", simulator_args=[]),
+    "futex": dict(wait_mode="futex", simulator_args=[]),
+    "auto (legacy plugin)": dict(wait_mode="auto", simulator_args=["--no_futex"]),
+}
+
+
+def benchmark_mode(name: str, env_id: int, n_steps: int, step_latency_ms: float) -> dict:
+    config = MODES[name]
+    shm = SilkSongSharedMemory(
+        env_id,
+        wait_mode=config["wait_mode"],
+        simulator=True,
+        simulator_args=["--step_latency_ms", str(step_latency_ms)] + config["simulator_args"],
+    )
+    action = np.zeros(10, dtype=np.int8)
+    latencies = np.empty(n_steps, dtype=np.float64)
+
+    try:
+        shm.reset()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for i in range(n_steps):
+            step_start = time.perf_counter()
+            shm.step(action)
+            latencies[i] = time.perf_counter() - step_start
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    finally:
+        shm.close()
+
+    return {
+        "mode": name,
+        "steps_per_sec": n_steps / wall,
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "p99_ms": np.percentile(latencies, 99) * 1000,
+        "cpu_percent": cpu / wall * 100,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare shared-memory wait modes against the stand-in game")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--step_latency_ms", type=float, default=2.0, help="Simulated game time per step")
+    parser.add_argument("--modes", type=str, nargs="*", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--env_id", type=int, default=90)
+
+    args = parser.parse_args()
+
+    results = [
+        benchmark_mode(mode, args.env_id + i, args.steps, args.step_latency_ms)
+        for i, mode in enumerate(args.modes)
+    ]
+
+    print(f"\n{'Mode':<22}{'steps/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'CPU %':>10}")
+    for r in results:
+        print(f"{r['mode']:<22}{r['steps_per_sec']:>10.1f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}{r['cpu_percent']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
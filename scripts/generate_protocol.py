@@ -0,0 +1,142 @@
+import argparse
+import sys
+from enum import IntEnum
+from pathlib import Path
+
+from silksong.arena import ArenaModel
+from silksong.constants import NUM_RAYS
+from silksong.protocol import COMMAND, GAME_STATE, Struct
+from silksong.shared_memory import CommandType, GameState, SilkSongSharedMemory, StateType
+
+Layout = SilkSongSharedMemory
+
+OUTPUT = Path(__file__).resolve().parent.parent / "plugin" / "Source" / "Core" / "Protocol.g.cs"
+
+# SilkSongSharedMemory attributes emitted as SharedMemoryLayout constants.
+LAYOUT_CONSTANTS = (
+    "MEMORY_SIZE", "STATE_OFFSET", "GAME_STATE_OFFSET", "GAME_STATE_SIZE", "COMMAND_OFFSET",
+    "COMMAND_READY_OFFSET", "EVENT_OFFSET", "FUTEX_SUPPORT_OFFSET", "HEARTBEAT_OFFSET", "PROTOCOL_VERSION",
+    "DOUBLE_BUFFERED_VERSION", "EPISODE_TIMING_VERSION",
+    "PLUGIN_VERSION_OFFSET", "CLIENT_VERSION_OFFSET", "STATE_SEQUENCE_OFFSET", "ACK_SEQUENCE_OFFSET",
+    "SLOT_SEQUENCE_OFFSET", "SLOT_STATE_OFFSET", "GAME_STATE_SLOT_OFFSETS", "MAX_CHUNK_STEPS",
+    "CHUNK_LENGTH_OFFSET", "CHUNK_EXECUTED_OFFSET", "CHUNK_ACTIONS_OFFSET", "CHUNK_ACTION_SIZE",
+    "CHUNK_STATES_OFFSET",
+)
+
+
+def pascal_case(name: str) -> str:
+    return "".join(part.capitalize() for part in name.split("_"))
+
+
+def csharp_enum(enum: type[IntEnum]) -> list[str]:
+    return [f"public enum {enum.__name__}", "{"] + [
+        f"    {pascal_case(member.name)} = {member.value}," for member in enum
+    ] + ["}"]
+
+
+def csharp_layout() -> list[str]:
+    lines = ["public static class SharedMemoryLayout", "{"]
+    # The GameState raycast arrays hold one entry per ray; Constants.RayCount refers to this.
+    constants = {name: getattr(Layout, name) for name in LAYOUT_CONSTANTS} | {"RAY_COUNT": NUM_RAYS}
+    for name, value in constants.items():
+        if isinstance(value, tuple):
+            lines.append(f"    public static readonly int[] {pascal_case(name)} = {{ {', '.join(map(str, value))} }};")
+        else:
+            lines.append(f"    public const int {pascal_case(name)} = {value};")
+    return lines + ["}"]
+
+
+def render() -> str:
+    sections = [
+        csharp_enum(StateType),
+        csharp_enum(CommandType),
+        COMMAND.csharp(),
+        GAME_STATE.csharp(),
+        csharp_layout(),
+    ]
+    header = [
+        "// <auto-generated>",
+        "// Generated by `python -m scripts.generate_protocol` from silksong/protocol.py and the",
+        "// SilkSongSharedMemory layout. Do not edit; change the schema and regenerate.",
+        "// </auto-generated>",
+        "using System.Runtime.InteropServices;",
+        "",
+        "namespace SilksongAgent;",
+    ]
+    return "\n".join(header + [line for section in sections for line in [""] + section]) + "\n"
+
+
+def _regions() -> list[tuple[str, int, int]]:
+    """(name, offset, size) of everything in the segment."""
+    words = [name for name in LAYOUT_CONSTANTS if name.endswith("_OFFSET") and name not in (
+        "GAME_STATE_OFFSET", "COMMAND_OFFSET", "COMMAND_READY_OFFSET", "CHUNK_ACTIONS_OFFSET", "CHUNK_STATES_OFFSET",
+        "SLOT_SEQUENCE_OFFSET", "SLOT_STATE_OFFSET",
+    )]
+    slots = len(Layout.GAME_STATE_SLOT_OFFSETS)
+    regions = [(name, getattr(Layout, name), 4) for name in words]
+    regions += [
+        ("SLOT_SEQUENCE_OFFSET", Layout.SLOT_SEQUENCE_OFFSET, 4 * slots),
+        ("SLOT_STATE_OFFSET", Layout.SLOT_STATE_OFFSET, 4 * slots),
+        ("COMMAND_OFFSET", Layout.COMMAND_OFFSET, COMMAND.size),
+        ("CHUNK_ACTIONS_OFFSET", Layout.CHUNK_ACTIONS_OFFSET, Layout.MAX_CHUNK_STEPS * Layout.CHUNK_ACTION_SIZE),
+        ("CHUNK_STATES_OFFSET", Layout.CHUNK_STATES_OFFSET, Layout.MAX_CHUNK_STEPS * GAME_STATE.size),
+    ]
+    regions += [(f"GAME_STATE_SLOT_OFFSETS[{slot}]", offset, GAME_STATE.size)
+                for slot, offset in enumerate(Layout.GAME_STATE_SLOT_OFFSETS)]
+    return regions
+
+
+def validate() -> list[str]:
+    """Layout errors: overlapping or misaligned blocks, and Python code out of step with the schema."""
+    errors = []
+    regions = sorted(_regions(), key=lambda region: region[1])
+    for name, offset, size in regions:
+        if offset % 4:
+            errors.append(f"{name} ({offset}) is not 4-byte aligned")
+        if offset + size > Layout.MEMORY_SIZE:
+            errors.append(f"{name} ends at {offset + size}, past MEMORY_SIZE ({Layout.MEMORY_SIZE})")
+    for (name, offset, size), (next_name, next_offset, _) in zip(regions, regions[1:]):
+        if offset + size > next_offset:
+            errors.append(f"{name} ({offset}..{offset + size}) overlaps {next_name} ({next_offset})")
+
+    if Layout.GAME_STATE_OFFSET != Layout.GAME_STATE_SLOT_OFFSETS[0]:
+        errors.append("GAME_STATE_OFFSET must be slot 0, where protocol 1 clients read")
+    if Layout.CHUNK_ACTION_SIZE != Layout.COMMAND_READY_OFFSET - Layout.COMMAND_BUTTONS_OFFSET:
+        errors.append("CHUNK_ACTION_SIZE differs from the CommandData buttons")
+    if tuple(GameState.__dataclass_fields__) != GAME_STATE.names:
+        errors.append("GameState attributes differ from protocol.GAME_STATE")
+    values = len(ArenaModel(seed=0).values())
+    if values != _item_count(GAME_STATE):
+        errors.append(f"ArenaModel.values() has {values} values, GAME_STATE_FORMAT takes {_item_count(GAME_STATE)}")
+    return errors
+
+
+def _item_count(schema: Struct) -> int:
+    return sum(field.count for field in schema.fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the C# protocol structs from silksong/protocol.py, "
+                                                 "or check that they and the shared-memory layout agree")
+    parser.add_argument("--check", action="store_true", help="Fail instead of writing when the C# file is stale")
+    args = parser.parse_args()
+
+    errors = validate()
+    source = render()
+    current = OUTPUT.read_text() if OUTPUT.exists() else None
+    if args.check and current != source:
+        errors.append(f"{OUTPUT.name} is out of date; run `python -m scripts.generate_protocol`")
+    if errors:
+        for error in errors:
+            print(f"error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.check and current != source:
+        OUTPUT.write_text(source)
+        print(f"Wrote {OUTPUT}")
+    print(f"GameState: {GAME_STATE.size} bytes, {len(GAME_STATE.fields)} fields; "
+          f"CommandData: {COMMAND.size} bytes; layout OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import glob
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from silksong.reward import DEFAULT_REWARD_CONFIG, RewardConfig, RewardKernel
+from silksong.trajectory import read_columns
+
+# The GameState fields RewardKernel reads.
+REWARD_FIELDS = (
+    "boss_health", "player_health", "player_silk", "boss_animation_state",
+    "boss_pos_x", "boss_pos_y", "player_pos_x", "player_pos_y", "episode_time", "truncated",
+)
+CHUNK_ROWS = 1 << 20
+# Cells of the padded (episodes x steps) matrix the discounted returns are computed in at once.
+RETURN_BLOCK_CELLS = 1 << 24
+
+
+def load_config(spec: str) -> tuple[str, RewardConfig]:
+    """`default`, a JSON object of overrides, or a path to one. Returns (label, config)."""
+    if spec == "default":
+        return "default", DEFAULT_REWARD_CONFIG
+    if spec.lstrip().startswith("{"):
+        return spec, RewardConfig.from_dict(json.loads(spec))
+    return Path(spec).stem, RewardConfig.from_dict(json.loads(Path(spec).read_text()))
+
+
+def relabel(columns: dict, transitions: np.ndarray, config: RewardConfig) -> tuple[np.ndarray, np.ndarray]:
+    """Rewards of the transition rows under `config`, and the total of each reward term.
+
+    The previous row of a transition is the state it was taken from, so one
+    RewardKernel pass per chunk scores every transition at once.
+    """
+    rewards = np.empty(len(transitions), dtype=np.float64)
+    term_totals = np.zeros(len(RewardKernel.TERM_NAMES), dtype=np.float64)
+    kernel = None
+    for start in range(0, len(transitions), CHUNK_ROWS):
+        rows = transitions[start:start + CHUNK_ROWS]
+        if kernel is None or kernel.n_envs != len(rows):
+            kernel = RewardKernel(len(rows), config)
+        kernel.reset({field: columns[field][rows - 1] for field in REWARD_FIELDS})
+        chunk_rewards, _, _ = kernel.step({field: columns[field][rows] for field in REWARD_FIELDS})
+        rewards[start:start + len(rows)] = chunk_rewards
+        term_totals += kernel.terms.sum(axis=1)
+    return rewards, term_totals
+
+
+def discounted_returns(episodes: np.ndarray, positions: np.ndarray, lengths: np.ndarray, rewards: np.ndarray,
+                       gamma: float) -> np.ndarray:
+    """Discounted return from every transition to the end of its episode.
+
+    Episodes are laid out as rows of a zero-padded matrix (in blocks, to bound memory)
+    and swept backwards one column at a time, so the loop runs once per step index,
+    not once per transition.
+    """
+    returns = np.empty_like(rewards)
+    n_episodes = len(lengths)
+    first = 0
+    while first < n_episodes:
+        last = first + 1
+        width = int(lengths[first])
+        while last < n_episodes and (last + 1 - first) * max(width, int(lengths[last])) <= RETURN_BLOCK_CELLS:
+            width = max(width, int(lengths[last]))
+            last += 1
+
+        lo, hi = np.searchsorted(episodes, [first, last])
+        rows, cols = episodes[lo:hi] - first, positions[lo:hi]
+        matrix = np.zeros((last - first, max(width, 1)), dtype=np.float64)
+        matrix[rows, cols] = rewards[lo:hi]
+        running = np.zeros(last - first, dtype=np.float64)
+        for t in range(matrix.shape[1] - 1, -1, -1):
+            running *= gamma
+            running += matrix[:, t]
+            matrix[:, t] = running
+        returns[lo:hi] = matrix[rows, cols]
+        first = last
+    return returns
+
+
+def rank_correlation(a: np.ndarray, b: np.ndarray) -> float:
+    if len(a) < 2:
+        return float("nan")
+    ranks_a = np.argsort(np.argsort(a))
+    ranks_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recompute rewards, returns and advantage statistics of recorded trajectories "
+                    "(train.py --trajectories) for other reward configurations, without a game."
+    )
+    parser.add_argument("stores", nargs="+", help="Trajectory store directories (globs are expanded)")
+    parser.add_argument("--configs", nargs="*", default=[],
+                        help="RewardConfig overrides to compare: JSON files or inline JSON objects")
+    parser.add_argument("--reference", type=str, default="default",
+                        help="The config the trajectories were recorded with (default: the built-in defaults)")
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--check", action="store_true",
+                        help="Assert the reference config reproduces the recorded rewards exactly")
+    parser.add_argument("--output", type=str, default=None, help="Write the statistics as JSON")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.stores for path in (glob.glob(pattern) or [pattern])})
+    start = time.perf_counter()
+    columns = read_columns(paths, REWARD_FIELDS + ("reward",))
+    load_time = time.perf_counter() - start
+
+    episode_start = columns["episode_start"]
+    transitions = np.flatnonzero(~episode_start)
+    starts = np.flatnonzero(episode_start)
+    episodes = np.cumsum(episode_start)[transitions] - 1
+    positions = transitions - starts[episodes] - 1
+    lengths = np.bincount(episodes, minlength=len(starts))
+    ends = np.append(starts[1:], len(episode_start)) - 1
+    played = lengths > 0
+    won = played & (columns["boss_health"][ends] <= 0)
+    lost = played & ~won & (columns["player_health"][ends] <= 0)
+    print(f"Loaded {len(paths)} store(s): {len(transitions):,} transitions in {played.sum():,} episodes "
+          f"({won.sum()} won, {lost.sum()} lost) in {load_time:.2f}s")
+    if len(transitions) == 0:
+        return
+
+    configs = [load_config(args.reference)] + [load_config(spec) for spec in args.configs]
+    results = {}
+    reference = None
+    for label, config in configs:
+        start = time.perf_counter()
+        rewards, term_totals = relabel(columns, transitions, config)
+        returns = discounted_returns(episodes, positions, lengths, rewards, args.gamma)
+        # Monte Carlo baseline: the mean return at the same step index of an episode.
+        baseline = np.bincount(positions, weights=returns) / np.bincount(positions)
+        advantages = returns - baseline[positions]
+        totals = np.bincount(episodes, weights=rewards, minlength=len(starts))
+        episode_returns = totals[played]
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = (advantages, episode_returns)
+            if args.check:
+                recorded = columns["reward"][transitions]
+                mismatched = int(np.count_nonzero(rewards.astype(np.float32) != recorded))
+                assert mismatched == 0, f"{mismatched} relabeled rewards differ from the recorded ones"
+                print(f"Relabeled rewards match the recorded ones on {len(transitions):,} transitions")
+
+        results[label] = {
+            "episode_return_mean": float(episode_returns.mean()),
+            "episode_return_std": float(episode_returns.std()),
+            "won_return_mean": float(totals[won].mean()) if won.any() else None,
+            "lost_return_mean": float(totals[lost].mean()) if lost.any() else None,
+            "discounted_return_mean": float(returns.mean()),
+            "discounted_return_std": float(returns.std()),
+            "advantage_std": float(advantages.std()),
+            "advantage_sign_agreement": float(np.mean(np.sign(advantages) == np.sign(reference[0]))),
+            "episode_return_rank_correlation": rank_correlation(episode_returns, reference[1]),
+            "term_per_episode": {
+                name: float(total / played.sum()) for name, total in zip(RewardKernel.TERM_NAMES, term_totals)
+            },
+            "seconds": elapsed,
+        }
+
+    names = list(results)
+    print(f"\n{'':<34}" + "".join(f"{name[:14]:>16}" for name in names))
+    rows = [key for key in results[names[0]] if key != "term_per_episode"]
+    for key in rows:
+        cells = "".join("{:>16}".format("-" if results[name][key] is None else f"{results[name][key]:.4f}")
+                        for name in names)
+        print(f"{key:<34}{cells}")
+    for term in RewardKernel.TERM_NAMES:
+        print(f"{'term/' + term + ' per episode':<34}" +
+              "".join(f"{results[name]['term_per_episode'][term]:>16.4f}" for name in names))
+    print(f"\n{len(transitions) * len(configs) / sum(r['seconds'] for r in results.values()):,.0f} "
+          f"transitions relabeled per second")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            "stores": paths, "gamma": args.gamma,
+            "configs": {label: config.to_dict() for label, config in configs}, "results": results,
+        }, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
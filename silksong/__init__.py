@@ -1,13 +1,37 @@
-from silksong.env import SilksongBossEnv
-from silksong.shared_memory import SilkSongSharedMemory, GameState
-from silksong.networks import MultiHeadFeatureExtractor, TensorboardCallback
-from silksong import constants
-
-__all__ = [
-    "SilksongBossEnv",
-    "SilkSongSharedMemory",
-    "GameState",
-    "MultiHeadFeatureExtractor",
-    "TensorboardCallback",
-    "constants",
-]
+"""Silksong boss-fight environments, the game bridge and the training helpers.
+
+The public names are imported on first access (PEP 562), so `import silksong` and
+the env and shared-memory layers stay free of torch and Stable-Baselines3. Env
+workers and game-side processes never pay for the training stack.
+"""
+import importlib
+
+_EXPORTS = {
+    "SilksongBossEnv": "silksong.env",
+    "SilkSongSharedMemory": "silksong.shared_memory",
+    "GameState": "silksong.shared_memory",
+    "EpisodeTiming": "silksong.shared_memory",
+    "TimingSchedule": "silksong.schedule",
+    "MultiHeadFeatureExtractor": "silksong.networks",
+    "TensorboardCallback": "silksong.networks",
+    "LatencyCallback": "silksong.networks",
+    "EpisodeTimingCallback": "silksong.networks",
+    "TrialEvalCallback": "silksong.networks",
+}
+
+__all__ = [*_EXPORTS, "constants"]
+
+
+def __getattr__(name: str):
+    if name == "constants":
+        return importlib.import_module("silksong.constants")
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'silksong' has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,177 @@
+"""asyncio support: await game states from one event loop without blocking it.
+
+The plugin publishes a state by setting the event word of its segment and waking the
+futex waiters on it. A futex cannot be watched by epoll, and the game cannot write to an
+eventfd of ours, so `StateWaker` runs one helper thread per process that sleeps in
+`futex_waitv` on the event words of every instance being awaited. When some fire, it
+resolves their futures with one `call_soon_threadsafe` per event loop, which wakes the
+loop through its self-pipe. Awaiting a state therefore costs no thread per game and no
+polling. Where `futex_waitv` cannot be used (Windows, Linux before 5.16, `wait_mode="spin"`,
+or a plugin without futex wake-ups), `wait_for_event` checks the event every
+`POLL_INTERVAL_MS` with `asyncio.sleep` instead.
+
+`SilkSongSharedMemory.await_state`, `areset`, `astep` and `astep_chunk`, and
+`SilksongBossEnv.areset` and `astep`, build on it. `as_completed` yields results in the
+order envs finish.
+"""
+import asyncio
+import ctypes
+import errno
+import threading
+import time
+from typing import Any, AsyncIterator, Iterable
+
+from silksong.shared_memory import IS_LINUX, SYS_FUTEX_WAITV, SilkSongSharedMemory
+
+if IS_LINUX and SYS_FUTEX_WAITV is not None:
+    from silksong.shared_memory import FUTEX_WAITV_MAX, futex_waitv, futex_wake
+
+POLL_INTERVAL_MS = 1.0
+
+
+def _resolve(futures: list[asyncio.Future]):
+    for future in futures:
+        if not future.done():
+            future.set_result(True)
+
+
+def _expire(future: asyncio.Future):
+    if not future.done():
+        future.set_result(False)
+
+
+class StateWaker:
+    """A helper thread that sleeps on the event words of the awaited instances and wakes their loops.
+
+    The thread also waits on a private generation word. Registering or dropping an
+    instance bumps it and wakes the thread, which then re-arms `futex_waitv` with the new
+    set. Beyond FUTEX_WAITV_MAX - 1 awaited instances, the rest are checked every
+    POLL_INTERVAL_MS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Instance -> (event word, loop, future), for every instance being awaited.
+        self._pending: dict[SilkSongSharedMemory, tuple[ctypes.c_int, asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._generation = ctypes.c_int(0)
+        self._thread = threading.Thread(target=self._run, name="StateWaker", daemon=True)
+        self._thread.start()
+
+    async def wait(self, shm: SilkSongSharedMemory, timeout_ms: float) -> bool:
+        """Wait up to `timeout_ms` for the event of `shm`. Returns True if it is signaled."""
+        event_word = shm._event_word
+        if event_word.value == 1:
+            return True
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            self._pending[shm] = (event_word, loop, future)
+        self._poke()
+        handle = loop.call_later(timeout_ms / 1000.0, _expire, future)
+        try:
+            return await future
+        finally:
+            handle.cancel()
+            with self._lock:
+                entry = self._pending.get(shm)
+                dropped = entry is not None and entry[2] is future
+                if dropped:
+                    del self._pending[shm]
+            # The thread still sleeps on the word of a timed-out or cancelled wait.
+            if dropped:
+                self._poke()
+
+    def _poke(self):
+        with self._lock:
+            self._generation.value += 1
+        futex_wake(ctypes.addressof(self._generation))
+
+    def _run(self):
+        generation_address = ctypes.addressof(self._generation)
+        while True:
+            with self._lock:
+                generation = self._generation.value
+                entries = list(self._pending.items())
+            watched = entries[:FUTEX_WAITV_MAX - 1]
+            addresses = [generation_address] + [ctypes.addressof(entry[0]) for _, entry in watched]
+            futex_waitv(addresses, [generation] + [0] * len(watched),
+                        POLL_INTERVAL_MS if len(entries) > len(watched) else None)
+
+            fired: dict[asyncio.AbstractEventLoop, list[asyncio.Future]] = {}
+            with self._lock:
+                for shm, entry in entries:
+                    event_word, loop, future = entry
+                    if event_word.value == 1 and self._pending.get(shm) is entry:
+                        del self._pending[shm]
+                        fired.setdefault(loop, []).append(future)
+            for loop, futures in fired.items():
+                try:
+                    loop.call_soon_threadsafe(_resolve, futures)
+                except RuntimeError:
+                    # The loop was closed while its instances were awaited.
+                    pass
+
+
+_waker: StateWaker = None
+_waker_lock = threading.Lock()
+_waker_supported: bool = None
+
+
+def _futex_waitv_supported() -> bool:
+    global _waker_supported
+    if _waker_supported is None:
+        _waker_supported = False
+        if IS_LINUX and SYS_FUTEX_WAITV is not None:
+            word = ctypes.c_int(1)
+            try:
+                # The word already differs from the expected value, so this returns at once.
+                futex_waitv([ctypes.addressof(word)], [0], 0)
+                _waker_supported = True
+            except OSError as e:
+                if e.errno != errno.ENOSYS:
+                    raise
+    return _waker_supported
+
+
+def get_waker() -> StateWaker:
+    """The process-wide StateWaker, started on first use. None where `futex_waitv` is unavailable."""
+    global _waker
+    if _waker is None and _futex_waitv_supported():
+        with _waker_lock:
+            if _waker is None:
+                _waker = StateWaker()
+    return _waker
+
+
+async def wait_for_event(shm: SilkSongSharedMemory, timeout_ms: float) -> bool:
+    """`SilkSongSharedMemory._wait_for_event` for asyncio. Returns True if the event is signaled."""
+    waker = get_waker() if shm._use_futex() else None
+    if waker is not None:
+        return await waker.wait(shm, timeout_ms)
+
+    deadline = time.monotonic() + timeout_ms / 1000.0
+    while not shm._wait_for_event(0):
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(POLL_INTERVAL_MS / 1000.0)
+    return True
+
+
+async def as_completed(awaitables: Iterable[Any]) -> AsyncIterator[tuple[int, Any]]:
+    """Run `awaitables` concurrently and yield `(index, result)` pairs as they finish.
+
+    For example, `async for i, (obs, reward, terminated, truncated, info) in
+    as_completed(env.astep(action) for env, action in zip(envs, actions))`. An exception
+    is raised at the pair that failed. Leaving the loop early cancels the rest.
+    """
+    tasks = {asyncio.ensure_future(awaitable): index for index, awaitable in enumerate(awaitables)}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=tasks.__getitem__):
+                yield tasks[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,414 @@
+"""Cheap 2D model of the Lace fight used by the stand-in game process.
+
+It is not a faithful copy of the game. It produces `GameState` records with the same
+layout, ranges and dynamics the agent sees: a hero that runs, jumps, dashes, attacks,
+pulls itself in with the clawline, casts a silk skill and heals, and a boss that cycles
+through wind-ups, slashes, charges, hops, projectiles and stuns. The 32 rays report
+terrain, the boss and its projectiles like `RaycastSensor.cs`.
+"""
+import math
+import random
+import struct
+
+from silksong.constants import (
+    ARENA_MAX_X,
+    ARENA_MAX_Y,
+    ARENA_MIN_X,
+    BOSS_MAX_HEALTH,
+    NUM_RAYS,
+    PLAYER_BASE_ATTACK_DAMAGE,
+    PLAYER_MAX_HEALTH,
+    PLAYER_MAX_SILK,
+    SILK_COST_CLAWLINE,
+    SILK_COST_HEAL,
+    SILK_COST_SKILL,
+)
+
+# The game's fixed update, and the updates per agent step by default (Constants.FramesPerStep).
+FIXED_DT = 0.02
+FRAMES_PER_STEP = 2
+MAX_RAY_DISTANCE = 25.0
+
+HERO_SPAWN = (49.27, 100.5677)
+BOSS_SPAWN = (59.19379, 100.5931)
+FLOOR_Y = 99.8
+HERO_HALF_HEIGHT = HERO_SPAWN[1] - FLOOR_Y
+BOSS_RADIUS = 1.3
+PROJECTILE_RADIUS = 0.6
+
+RUN_SPEED = 8.3
+JUMP_SPEED = 21.0
+GRAVITY = -65.0
+MAX_FALL_SPEED = -35.0
+DASH_SPEED = 28.0
+DASH_TIME = 0.2
+DASH_COOLDOWN = 0.6
+ATTACK_TIME = 0.35
+ATTACK_RANGE = 2.6
+CLAWLINE_RANGE = 12.0
+CLAWLINE_SPEED = 40.0
+CLAWLINE_DAMAGE = 32
+SKILL_RADIUS = 4.5
+SKILL_DAMAGE = 60
+HEAL_TIME = 0.6
+HEAL_AMOUNT = 3
+HURT_INVINCIBILITY = 1.3
+STAGGER_HITS = 8
+
+# Hit types (RaycastSensor.cs).
+HIT_NONE, HIT_TERRAIN, HIT_ENEMY, HIT_BOSS_PROJECTILE = 0, 1, 2, 5
+
+# Player animation ids (PlayerAnimationState in SharedMemoryManager.cs).
+ANIM_IDLE, ANIM_AIRBORNE, ANIM_DASH, ANIM_SLASH, ANIM_UP_SLASH = 0, 1, 9, 18, 17
+ANIM_DOWN_SPIKE, ANIM_HARPOON_DASH, ANIM_RUN, ANIM_WOUND = 20, 29, 44, 50
+ANIM_SHUTTLECOCK, ANIM_BIND, ANIM_FALL = 62, 73, 77
+
+# Boss moves: (animation id, duration, active window as progress fractions, damage).
+BOSS_MOVES = {
+    "idle": (0, 0.5, None, 0),
+    "hop": (8, 0.5, None, 0),
+    "antic": (2, 0.45, None, 0),
+    "combo_slash": (1, 0.5, (0.2, 0.8), 1),
+    "charge_antic": (4, 0.5, None, 0),
+    "charge": (10, 0.45, (0.0, 1.0), 1),
+    "charge_recover": (11, 0.4, None, 0),
+    "jump_antic": (21, 0.3, None, 0),
+    "jump_away": (28, 0.5, None, 0),
+    "downstab": (13, 0.4, (0.3, 1.0), 1),
+    "bomb_slash_antic": (37, 0.4, None, 0),
+    "bomb_slash": (38, 0.3, None, 0),
+    "p2_shift": (57, 1.2, None, 0),
+    "stun": (9, 1.6, None, 0),
+    "stun_recover": (26, 0.4, None, 0),
+}
+BOSS_FOLLOW_UPS = {
+    "antic": "combo_slash",
+    "charge_antic": "charge",
+    "charge": "charge_recover",
+    "jump_antic": "jump_away",
+    "jump_away": "downstab",
+    "bomb_slash_antic": "bomb_slash",
+    "stun": "stun_recover",
+}
+RAY_DIRECTIONS = [
+    (math.cos(2.0 * math.pi * i / NUM_RAYS), math.sin(2.0 * math.pi * i / NUM_RAYS)) for i in range(NUM_RAYS)
+]
+
+
+def _ray_circle(ox: float, oy: float, dx: float, dy: float, cx: float, cy: float, radius: float) -> float:
+    """Distance along a unit ray to a circle, or infinity if it misses (or starts inside)."""
+    fx, fy = ox - cx, oy - cy
+    b = fx * dx + fy * dy
+    c = fx * fx + fy * fy - radius * radius
+    discriminant = b * b - c
+    if discriminant < 0:
+        return math.inf
+    t = -b - math.sqrt(discriminant)
+    return t if t > 0 else math.inf
+
+
+class ArenaModel:
+    def __init__(self, seed: int = None):
+        self.rng = random.Random(seed)
+        self.prev_buttons = (0,) * 10
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.frames = 0
+        self.hero_x, self.hero_y = HERO_SPAWN
+        self.hero_vx = self.hero_vy = 0.0
+        self.hero_facing_right = True
+        self.health = PLAYER_MAX_HEALTH
+        self.silk = 0
+        self.hero_action = None
+        self.hero_action_time = 0.0
+        self.hero_action_duration = 1.0
+        self.dash_cooldown = 0.0
+        self.invincible_time = 0.0
+        self.hero_anim = ANIM_IDLE
+
+        self.boss_x, self.boss_y = BOSS_SPAWN
+        self.boss_vx = self.boss_vy = 0.0
+        self.boss_facing_right = False
+        self.boss_health = BOSS_MAX_HEALTH
+        self.boss_phase = 0
+        self.boss_move = "idle"
+        self.boss_move_time = 0.0
+        self.boss_hit_landed = False
+        self.stagger = 0
+        self.projectiles: list[list[float]] = []
+        self.prev_buttons = (0,) * 10
+
+    @property
+    def done(self) -> bool:
+        return self.health <= 0 or self.boss_health <= 0
+
+    @property
+    def grounded(self) -> bool:
+        return self.hero_y <= HERO_SPAWN[1] + 1e-4
+
+    # Hero
+
+    def _start_hero_action(self, action: str, duration: float, animation: int):
+        self.hero_action, self.hero_action_time, self.hero_action_duration = action, duration, duration
+        self.hero_anim = animation
+
+    def _pressed(self, buttons, index: int) -> bool:
+        return buttons[index] != 0 and self.prev_buttons[index] == 0
+
+    def _damage_boss(self, amount: int):
+        if self.boss_health <= 0:
+            return
+        self.boss_health = max(0, self.boss_health - amount)
+        self.silk = min(PLAYER_MAX_SILK, self.silk + 1)
+        if self.boss_move not in ("stun", "stun_recover", "p2_shift"):
+            self.stagger += 1
+            if self.stagger >= STAGGER_HITS:
+                self.stagger = 0
+                self._start_boss_move("stun")
+
+    def _boss_in_front(self, reach: float) -> bool:
+        dx = self.boss_x - self.hero_x
+        if abs(self.boss_y - self.hero_y) > 2.0:
+            return False
+        return 0 <= (dx if self.hero_facing_right else -dx) <= reach
+
+    def _step_hero(self, buttons):
+        left, right, up, down, jump = (b != 0 for b in buttons[:5])
+        self.dash_cooldown = max(0.0, self.dash_cooldown - FIXED_DT)
+        self.invincible_time = max(0.0, self.invincible_time - FIXED_DT)
+
+        if self.hero_action is not None:
+            self.hero_action_time -= FIXED_DT
+            if self.hero_action_time <= 0:
+                if self.hero_action == "heal":
+                    self.health = min(PLAYER_MAX_HEALTH, self.health + HEAL_AMOUNT)
+                self.hero_action = None
+
+        if self.hero_action is None:
+            if self._pressed(buttons, 9) and self.silk >= SILK_COST_HEAL and self.grounded:
+                self.silk -= SILK_COST_HEAL
+                self._start_hero_action("heal", HEAL_TIME, ANIM_BIND)
+            elif self._pressed(buttons, 8) and self.silk >= SILK_COST_SKILL:
+                self.silk -= SILK_COST_SKILL
+                self._start_hero_action("skill", 0.3, ANIM_SHUTTLECOCK)
+                if math.hypot(self.boss_x - self.hero_x, self.boss_y - self.hero_y) <= SKILL_RADIUS:
+                    self._damage_boss(SKILL_DAMAGE)
+            elif self._pressed(buttons, 7) and self.silk >= SILK_COST_CLAWLINE and self._boss_in_front(CLAWLINE_RANGE):
+                self.silk -= SILK_COST_CLAWLINE
+                self._start_hero_action("clawline", 0.5, ANIM_HARPOON_DASH)
+            elif self._pressed(buttons, 6) and self.dash_cooldown <= 0:
+                self._start_hero_action("dash", DASH_TIME, ANIM_DASH)
+                self.dash_cooldown = DASH_COOLDOWN
+            elif self._pressed(buttons, 5):
+                if up:
+                    self._start_hero_action("attack", ATTACK_TIME, ANIM_UP_SLASH)
+                    hit = abs(self.boss_x - self.hero_x) < 1.5 and 0 <= self.boss_y - self.hero_y <= ATTACK_RANGE + 1.0
+                elif down and not self.grounded:
+                    self._start_hero_action("attack", ATTACK_TIME, ANIM_DOWN_SPIKE)
+                    hit = abs(self.boss_x - self.hero_x) < 1.5 and 0 <= self.hero_y - self.boss_y <= ATTACK_RANGE + 1.0
+                    if hit:
+                        self.hero_vy = 15.0
+                else:
+                    self._start_hero_action("attack", ATTACK_TIME, ANIM_SLASH)
+                    hit = self._boss_in_front(ATTACK_RANGE)
+                if hit:
+                    self._damage_boss(PLAYER_BASE_ATTACK_DAMAGE)
+
+        if self.hero_action == "heal":
+            self.hero_vx = 0.0
+        elif self.hero_action == "hurt":
+            self.hero_vy = max(MAX_FALL_SPEED, self.hero_vy + GRAVITY * FIXED_DT)
+        elif self.hero_action == "dash":
+            self.hero_vx = DASH_SPEED if self.hero_facing_right else -DASH_SPEED
+            self.hero_vy = 0.0
+        elif self.hero_action == "clawline":
+            dx, dy = self.boss_x - self.hero_x, self.boss_y - self.hero_y
+            distance = math.hypot(dx, dy)
+            if distance <= BOSS_RADIUS + 0.4:
+                self._damage_boss(CLAWLINE_DAMAGE)
+                self.hero_action = None
+                self.hero_vx = self.hero_vy = 0.0
+            else:
+                self.hero_vx, self.hero_vy = CLAWLINE_SPEED * dx / distance, CLAWLINE_SPEED * dy / distance
+        else:
+            if left != right:
+                self.hero_facing_right = right
+                self.hero_vx = RUN_SPEED if right else -RUN_SPEED
+            else:
+                self.hero_vx = 0.0
+            if self._pressed(buttons, 4) and self.grounded:
+                self.hero_vy = JUMP_SPEED
+            # Releasing jump cuts the rise short, like the game's variable jump height.
+            gravity = GRAVITY if jump or self.hero_vy <= 0 else GRAVITY * 2.5
+            self.hero_vy = max(MAX_FALL_SPEED, self.hero_vy + gravity * FIXED_DT)
+
+        self.hero_x = min(max(self.hero_x + self.hero_vx * FIXED_DT, ARENA_MIN_X + 0.5), ARENA_MAX_X - 0.5)
+        self.hero_y = min(self.hero_y + self.hero_vy * FIXED_DT, ARENA_MAX_Y - HERO_HALF_HEIGHT)
+        if self.hero_y <= HERO_SPAWN[1]:
+            self.hero_y, self.hero_vy = HERO_SPAWN[1], 0.0
+
+        if self.hero_action is None:
+            if not self.grounded:
+                self.hero_anim = ANIM_AIRBORNE if self.hero_vy > 0 else ANIM_FALL
+            else:
+                self.hero_anim = ANIM_RUN if self.hero_vx != 0 else ANIM_IDLE
+
+    # Boss
+
+    def _start_boss_move(self, move: str):
+        self.boss_move, self.boss_move_time, self.boss_hit_landed = move, 0.0, False
+        dx = self.hero_x - self.boss_x
+        if move not in ("stun", "stun_recover", "charge"):
+            self.boss_facing_right = dx > 0
+
+        direction = 1.0 if self.boss_facing_right else -1.0
+        if move == "charge":
+            self.boss_vx = 30.0 * direction
+        elif move == "jump_away":
+            self.boss_vx, self.boss_vy = -10.0 * direction, 24.0
+        elif move == "downstab":
+            self.boss_vx, self.boss_vy = (dx / BOSS_MOVES["downstab"][1]) * 0.8, -30.0
+        elif move == "bomb_slash":
+            for angle in (-0.4, 0.0, 0.4):
+                self.projectiles.append([
+                    self.boss_x, self.boss_y + 0.5, 14.0 * direction * math.cos(angle), 14.0 * math.sin(angle) + 3.0, 2.5,
+                ])
+        else:
+            self.boss_vx = 0.0
+
+    def _choose_boss_move(self) -> str:
+        if self.boss_phase == 0 and self.boss_health <= BOSS_MAX_HEALTH * 0.55:
+            self.boss_phase = 1
+            return "p2_shift"
+        if self.boss_phase == 1 and self.boss_health <= BOSS_MAX_HEALTH * 0.25:
+            self.boss_phase = 2
+            return "p2_shift"
+
+        distance = abs(self.hero_x - self.boss_x)
+        moves = ["antic", "charge_antic", "jump_antic", "hop"]
+        weights = [3.0 if distance < 4.0 else 0.5, 2.0 if distance > 6.0 else 1.0, 1.0, 1.5 if distance > 4.0 else 0.3]
+        if self.boss_phase > 0:
+            moves.append("bomb_slash_antic")
+            weights.append(1.5)
+        return self.rng.choices(moves, weights)[0]
+
+    def _step_boss(self):
+        animation, duration, active, damage = BOSS_MOVES[self.boss_move]
+        self.boss_move_time += FIXED_DT * (1.0 + 0.15 * self.boss_phase)
+
+        if self.boss_move == "hop":
+            self.boss_vx = 6.0 if self.hero_x > self.boss_x else -6.0
+        if self.boss_move in ("jump_away", "downstab") or self.boss_y > BOSS_SPAWN[1]:
+            self.boss_vy += GRAVITY * FIXED_DT
+
+        self.boss_x = min(max(self.boss_x + self.boss_vx * FIXED_DT, ARENA_MIN_X + BOSS_RADIUS), ARENA_MAX_X - BOSS_RADIUS)
+        self.boss_y = min(self.boss_y + self.boss_vy * FIXED_DT, ARENA_MAX_Y - BOSS_RADIUS)
+        if self.boss_y <= BOSS_SPAWN[1]:
+            self.boss_y, self.boss_vy = BOSS_SPAWN[1], 0.0
+
+        progress = self.boss_move_time / duration
+        if active is not None and active[0] <= progress <= active[1] and not self.boss_hit_landed:
+            reach = 3.0 if self.boss_move == "combo_slash" else BOSS_RADIUS + 0.6
+            dx = self.hero_x - self.boss_x
+            in_front = (dx if self.boss_facing_right else -dx) >= -0.5 or self.boss_move != "combo_slash"
+            if in_front and abs(dx) <= reach and abs(self.hero_y - self.boss_y) <= 2.0:
+                self.boss_hit_landed = self._damage_hero(damage + (1 if self.boss_phase == 2 else 0))
+
+        if progress >= 1.0:
+            self.boss_vx = 0.0
+            self._start_boss_move(BOSS_FOLLOW_UPS.get(self.boss_move) or self._choose_boss_move())
+
+    def _damage_hero(self, amount: int) -> bool:
+        if self.invincible_time > 0 or self.hero_action == "dash" or self.health <= 0:
+            return False
+        self.health = max(0, self.health - amount)
+        self.invincible_time = HURT_INVINCIBILITY
+        self._start_hero_action("hurt", 0.25, ANIM_WOUND)
+        self.hero_vx = -8.0 if self.boss_x > self.hero_x else 8.0
+        return True
+
+    def _step_projectiles(self):
+        alive = []
+        for projectile in self.projectiles:
+            projectile[0] += projectile[2] * FIXED_DT
+            projectile[1] += projectile[3] * FIXED_DT
+            projectile[4] -= FIXED_DT
+            if math.hypot(projectile[0] - self.hero_x, projectile[1] - self.hero_y) <= PROJECTILE_RADIUS + 0.5:
+                self._damage_hero(1)
+                continue
+            if projectile[4] > 0 and ARENA_MIN_X < projectile[0] < ARENA_MAX_X and FLOOR_Y < projectile[1] < ARENA_MAX_Y:
+                alive.append(projectile)
+        self.projectiles = alive
+
+    # Public API
+
+    def step(self, buttons, frames: int = FRAMES_PER_STEP):
+        """Advance one agent step of `frames` fixed updates with the 10 plugin buttons held.
+
+        Presses register on the first update, as the plugin applies the command once before
+        running the frames.
+        """
+        buttons = tuple(int(b) for b in buttons)
+        for _ in range(frames):
+            if not self.done:
+                self._step_hero(buttons)
+                self._step_boss()
+                self._step_projectiles()
+            self.prev_buttons = buttons
+            self.frames += 1
+        self.steps += 1
+
+    def raycast(self) -> tuple[list[float], list[int]]:
+        distances, hit_types = [], []
+        ox, oy = self.hero_x, self.hero_y
+        for dx, dy in RAY_DIRECTIONS:
+            closest, hit_type = MAX_RAY_DISTANCE, HIT_NONE
+
+            for projectile in self.projectiles:
+                t = _ray_circle(ox, oy, dx, dy, projectile[0], projectile[1], PROJECTILE_RADIUS)
+                if t < closest:
+                    closest, hit_type = t, HIT_BOSS_PROJECTILE
+
+            t = _ray_circle(ox, oy, dx, dy, self.boss_x, self.boss_y, BOSS_RADIUS)
+            if t < closest:
+                closest, hit_type = t, HIT_ENEMY
+
+            walls = []
+            if dx > 1e-9:
+                walls.append((ARENA_MAX_X - ox) / dx)
+            elif dx < -1e-9:
+                walls.append((ARENA_MIN_X - ox) / dx)
+            if dy > 1e-9:
+                walls.append((ARENA_MAX_Y - oy) / dy)
+            elif dy < -1e-9:
+                walls.append((FLOOR_Y - oy) / dy)
+            t = min(walls)
+            if t < closest:
+                closest, hit_type = t, HIT_TERRAIN
+
+            distances.append(closest / MAX_RAY_DISTANCE)
+            hit_types.append(hit_type)
+        return distances, hit_types
+
+    def values(self) -> list:
+        """Field values in `protocol.GAME_STATE` order, as `SilkSongSharedMemory.GAME_STATE_FORMAT` packs them."""
+        animation, duration, _, _ = BOSS_MOVES[self.boss_move]
+        hero_progress = 0.0
+        if self.hero_action is not None:
+            hero_progress = min(1.0, max(0.0, 1.0 - self.hero_action_time / self.hero_action_duration))
+        distances, hit_types = self.raycast()
+        return [
+            self.hero_x, self.hero_y, self.hero_vx, self.hero_vy,
+            self.health, PLAYER_MAX_HEALTH, self.silk, self.hero_anim, hero_progress,
+            int(self.grounded), int(self.dash_cooldown <= 0), int(self.hero_facing_right),
+            int(self.invincible_time > 0), int(self.hero_action is None),
+            self.boss_x, self.boss_y, self.boss_vx, self.boss_vy,
+            self.boss_health, BOSS_MAX_HEALTH, self.boss_phase, animation,
+            min(1.0, self.boss_move_time / duration), int(self.boss_facing_right),
+            self.frames * FIXED_DT, 0, 0,
+        ] + distances + hit_types
+
+    def pack_into(self, fmt: str, buffer, offset: int):
+        struct.pack_into(fmt, buffer, offset, *self.values())
@@ -0,0 +1,271 @@
+import copy
+import threading
+import time
+
+import numpy as np
+import torch as th
+from gymnasium import spaces
+from stable_baselines3 import PPO
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.buffers import RolloutBuffer
+from stable_baselines3.common.utils import obs_as_tensor
+from stable_baselines3.common.vec_env import VecEnv
+
+
+class _CallbackRecorder:
+    """Stands in for the callbacks on the collector thread.
+
+    Callbacks save checkpoints and write to the logger, which must not happen while
+    `train` updates the policy on the main thread. The recorder keeps each call with the
+    rollout's locals and timestep count instead, and `replay` makes them once the
+    collector has been joined.
+    """
+
+    def __init__(self, model: "AsyncPPO"):
+        self.model = model
+        self.calls: list[tuple[str, dict, int]] = []
+        self._locals = None
+
+    def on_rollout_start(self) -> None:
+        self.calls.append(("on_rollout_start", None, self.model.num_timesteps))
+
+    def update_locals(self, locals_: dict) -> None:
+        self._locals = dict(locals_)
+
+    def on_step(self) -> bool:
+        self.calls.append(("on_step", self._locals, self.model.num_timesteps))
+        return True
+
+    def on_rollout_end(self) -> None:
+        self.calls.append(("on_rollout_end", self._locals, self.model.num_timesteps))
+
+    def replay(self, callback: BaseCallback) -> bool:
+        """Make the recorded calls on `callback`. Returns False if it asked to stop training."""
+        num_timesteps = self.model.num_timesteps
+        try:
+            for name, locals_, timesteps in self.calls:
+                self.model.num_timesteps = timesteps
+                if locals_ is not None:
+                    callback.update_locals(locals_)
+                if name == "on_step":
+                    if not callback.on_step():
+                        return False
+                else:
+                    getattr(callback, name)()
+        finally:
+            self.model.num_timesteps = num_timesteps
+        return True
+
+
+class AsyncPPO(PPO):
+    """PPO that collects the next rollout while it trains on the current one.
+
+    A snapshot of the policy (the behavior policy) steps the games in a background thread
+    while the learner runs its epochs, so every rollout is trained on one update after it
+    was collected (IMPALA/APPO-style lag of one policy version). The clipped ratio uses the
+    behavior policy's log-probs and values, which is what keeps the lag stable.
+
+    Logs `async/policy_lag`, `async/game_busy_fraction`, `async/collect_time` and
+    `async/train_time` every iteration so the gain over synchronous PPO can be measured.
+
+    Callbacks run on the main thread only. The calls a background rollout makes are
+    recorded and replayed after it is joined, while no training runs, so checkpoints never
+    catch a half-updated policy. A callback that stops training therefore takes effect
+    at the end of the rollout, and env changes it makes (such as `EpisodeTimingCallback`)
+    apply from the next one.
+    """
+
+    def _setup_model(self) -> None:
+        super()._setup_model()
+        self._behavior_policy = copy.deepcopy(self.policy)
+        self._next_rollout_buffer = self.rollout_buffer_class(
+            self.n_steps,
+            self.observation_space,
+            self.action_space,
+            device=self.device,
+            gamma=self.gamma,
+            gae_lambda=self.gae_lambda,
+            n_envs=self.n_envs,
+            **self.rollout_buffer_kwargs,
+        )
+        self._rollout_policy = self.policy
+        self._policy_version = 0
+
+    def _excluded_save_params(self) -> list[str]:
+        return super()._excluded_save_params() + ["_behavior_policy", "_next_rollout_buffer", "_rollout_policy"]
+
+    def collect_rollouts(
+        self,
+        env: VecEnv,
+        callback: BaseCallback,
+        rollout_buffer: RolloutBuffer,
+        n_rollout_steps: int,
+    ) -> bool:
+        """`OnPolicyAlgorithm.collect_rollouts` driven by `self._rollout_policy` instead of `self.policy`."""
+        assert self._last_obs is not None, "No previous observation was provided"
+        policy = self._rollout_policy
+        policy.set_training_mode(False)
+
+        n_steps = 0
+        rollout_buffer.reset()
+        if self.use_sde:
+            policy.reset_noise(env.num_envs)
+
+        callback.on_rollout_start()
+
+        while n_steps < n_rollout_steps:
+            if self.use_sde and self.sde_sample_freq > 0 and n_steps % self.sde_sample_freq == 0:
+                policy.reset_noise(env.num_envs)
+
+            with th.no_grad():
+                obs_tensor = obs_as_tensor(self._last_obs, self.device)
+                actions, values, log_probs = policy(obs_tensor)
+            actions = actions.cpu().numpy()
+
+            clipped_actions = actions
+            if isinstance(self.action_space, spaces.Box):
+                if policy.squash_output:
+                    clipped_actions = policy.unscale_action(clipped_actions)
+                else:
+                    clipped_actions = np.clip(actions, self.action_space.low, self.action_space.high)
+
+            new_obs, rewards, dones, infos = env.step(clipped_actions)
+
+            self.num_timesteps += env.num_envs
+
+            callback.update_locals(locals())
+            if not callback.on_step():
+                return False
+
+            self._update_info_buffer(infos, dones)
+            n_steps += 1
+
+            if isinstance(self.action_space, spaces.Discrete):
+                actions = actions.reshape(-1, 1)
+
+            for idx, done in enumerate(dones):
+                if (
+                    done
+                    and infos[idx].get("terminal_observation") is not None
+                    and infos[idx].get("TimeLimit.truncated", False)
+                ):
+                    terminal_obs = policy.obs_to_tensor(infos[idx]["terminal_observation"])[0]
+                    with th.no_grad():
+                        terminal_value = policy.predict_values(terminal_obs)[0]
+                    rewards[idx] += self.gamma * terminal_value
+
+            rollout_buffer.add(
+                self._last_obs,
+                actions,
+                rewards,
+                self._last_episode_starts,
+                values,
+                log_probs,
+            )
+            self._last_obs = new_obs
+            self._last_episode_starts = dones
+
+        with th.no_grad():
+            values = policy.predict_values(obs_as_tensor(new_obs, self.device))
+
+        rollout_buffer.compute_returns_and_advantage(last_values=values, dones=dones)
+
+        callback.update_locals(locals())
+
+        callback.on_rollout_end()
+
+        return True
+
+    def learn(
+        self,
+        total_timesteps: int,
+        callback=None,
+        log_interval: int = 1,
+        tb_log_name: str = "AsyncPPO",
+        reset_num_timesteps: bool = True,
+        progress_bar: bool = False,
+    ):
+        iteration = 0
+
+        total_timesteps, callback = self._setup_learn(
+            total_timesteps,
+            callback,
+            reset_num_timesteps,
+            tb_log_name,
+            progress_bar,
+        )
+
+        callback.on_training_start(locals(), globals())
+
+        assert self.env is not None
+
+        # The first rollout has nothing to overlap with, so it is collected with the live policy.
+        self._rollout_policy = self.policy
+        collect_start = time.perf_counter()
+        continue_training = self.collect_rollouts(self.env, callback, self.rollout_buffer, n_rollout_steps=self.n_steps)
+        collect_time = time.perf_counter() - collect_start
+        behavior_version = self._policy_version
+        iteration_start = time.perf_counter()
+
+        while continue_training:
+            iteration += 1
+            self._update_current_progress_remaining(self.num_timesteps, total_timesteps)
+
+            if log_interval is not None and iteration % log_interval == 0:
+                assert self.ep_info_buffer is not None
+                self.dump_logs(iteration)
+
+            self.logger.record("async/policy_lag", self._policy_version - behavior_version)
+            self.logger.record("async/collect_time", collect_time)
+
+            collector = None
+            result = {}
+            if self.num_timesteps < total_timesteps:
+                self._behavior_policy.load_state_dict(self.policy.state_dict())
+                self._rollout_policy = self._behavior_policy
+                next_behavior_version = self._policy_version
+                recorder = _CallbackRecorder(self)
+                collector = threading.Thread(
+                    target=self._collect_in_background,
+                    args=(recorder, result),
+                    name="AsyncPPO-collector",
+                    daemon=True,
+                )
+                collector.start()
+
+            train_start = time.perf_counter()
+            self.train()
+            self._policy_version += 1
+            self.logger.record("async/train_time", time.perf_counter() - train_start)
+
+            if collector is None:
+                break
+
+            collector.join()
+            if "error" in result:
+                raise result["error"]
+
+            now = time.perf_counter()
+            collect_time = result["collect_time"]
+            self.logger.record("async/game_busy_fraction", min(1.0, collect_time / max(now - iteration_start, 1e-9)))
+            iteration_start = now
+
+            behavior_version = next_behavior_version
+            continue_training = result["continue_training"] and recorder.replay(callback)
+            self.rollout_buffer, self._next_rollout_buffer = self._next_rollout_buffer, self.rollout_buffer
+
+        self._rollout_policy = self.policy
+
+        callback.on_training_end()
+
+        return self
+
+    def _collect_in_background(self, callback: _CallbackRecorder, result: dict):
+        start = time.perf_counter()
+        try:
+            result["continue_training"] = self.collect_rollouts(
+                self.env, callback, self._next_rollout_buffer, n_rollout_steps=self.n_steps
+            )
+        except BaseException as e:
+            result["error"] = e
+        result["collect_time"] = time.perf_counter() - start
@@ -0,0 +1,105 @@
+import numpy as np
+
+from silksong.protocol import BUTTONS
+from silksong.shared_memory import CommandType, SilkSongSharedMemory
+
+# MultiDiscrete action: move x (none/left/right), move y (none/up/down), jump, attack,
+# dash, clawline, skill, heal.
+ACTION_NVEC = (3, 3, 2, 2, 2, 2, 2, 2)
+ACTION_STRIDES = np.array([int(np.prod(ACTION_NVEC[i + 1:])) for i in range(len(ACTION_NVEC))], dtype=np.int64)
+NUM_ACTIONS = int(np.prod(ACTION_NVEC))
+
+NUM_BUTTONS = len(BUTTONS)
+ATTACK_BUTTON = BUTTONS.index("attack")
+# CommandData up to (not including) commandReady: int commandType, then one byte per button.
+COMMAND_PAYLOAD_SIZE = SilkSongSharedMemory.COMMAND_PAYLOAD_SIZE
+_BUTTONS_START = SilkSongSharedMemory.COMMAND_BUTTONS_OFFSET - SilkSongSharedMemory.COMMAND_OFFSET
+
+
+def _action_buttons(action: np.ndarray, prev_attack: int) -> list[int]:
+    """The 10 plugin buttons for `action`, following `convert_to_binary`."""
+    buttons = [0] * NUM_BUTTONS
+    if action[0] in (1, 2):
+        buttons[action[0] - 1] = 1
+    if action[1] in (1, 2):
+        buttons[1 + action[1]] = 1
+    buttons[4] = action[2]
+    buttons[ATTACK_BUTTON] = 0 if prev_attack == 1 else action[3]
+    buttons[6:] = action[4:]
+    return buttons
+
+
+def _build_payloads() -> np.ndarray:
+    actions = np.stack(np.unravel_index(np.arange(NUM_ACTIONS), ACTION_NVEC), axis=1)
+    payloads = np.zeros((2, NUM_ACTIONS, COMMAND_PAYLOAD_SIZE), dtype=np.uint8)
+    pack = SilkSongSharedMemory.COMMAND_PAYLOAD.pack
+    for prev_attack in (0, 1):
+        for index, action in enumerate(actions):
+            payloads[prev_attack, index] = np.frombuffer(
+                pack(CommandType.STEP, *_action_buttons(action, prev_attack)), dtype=np.uint8
+            )
+    return payloads
+
+
+# (prev_attack, action index) -> packed STEP command, commandReady excluded.
+COMMAND_PAYLOADS = _build_payloads()
+COMMAND_PAYLOADS.flags.writeable = False
+_PAYLOAD_BYTES = [[row.tobytes() for row in table] for table in COMMAND_PAYLOADS]
+
+
+class CommandEncoder:
+    """Maps MultiDiscrete actions straight to packed STEP commands through a lookup table.
+
+    The 576 actions times the two attack-debounce states are packed once at import; a
+    step is an index computation and a table lookup, and the payload goes into the
+    command block in one slice assignment (`SilkSongSharedMemory.write_command`), with
+    commandReady written after it. The debounce state (`prev_attack`) is kept per env:
+    attack is released for one step after every press, exactly as in `convert_to_binary`.
+    """
+
+    def __init__(self, n_envs: int = 1):
+        self.n_envs = n_envs
+        self.prev_attack = np.zeros(n_envs, dtype=np.uint8)
+
+    @staticmethod
+    def action_index(actions: np.ndarray) -> np.ndarray:
+        return np.asarray(actions, dtype=np.int64) @ ACTION_STRIDES
+
+    def reset(self, indices=None):
+        """Clear the debounce state of the given envs (all by default), e.g. on episode reset."""
+        if indices is None:
+            self.prev_attack[:] = 0
+        else:
+            self.prev_attack[indices] = 0
+
+    def encode(self, action: np.ndarray, env: int = 0) -> bytes:
+        """Packed command for one env's action. Advances that env's debounce state."""
+        prev_attack = self.prev_attack[env]
+        payload = _PAYLOAD_BYTES[prev_attack][int(self.action_index(action))]
+        self.prev_attack[env] = payload[_BUTTONS_START + ATTACK_BUTTON]
+        return payload
+
+    def encode_batch(self, actions: np.ndarray) -> np.ndarray:
+        """`(n_envs, COMMAND_PAYLOAD_SIZE)` packed commands for an `(n_envs, 8)` action batch."""
+        payloads = COMMAND_PAYLOADS[self.prev_attack, self.action_index(actions)]
+        self.prev_attack[:] = payloads[:, _BUTTONS_START + ATTACK_BUTTON]
+        return payloads
+
+    def chunk_buttons(self, actions: np.ndarray, env: int = 0) -> np.ndarray:
+        """`(K, 10)` buttons for K consecutive actions of one env, debounced along the chunk.
+
+        The debounce state is left alone: only the caller knows how many of the actions
+        the game executed, see `commit_chunk`.
+        """
+        indices = self.action_index(actions)
+        buttons = np.empty((len(indices), NUM_BUTTONS), dtype=np.uint8)
+        prev_attack = self.prev_attack[env]
+        for k, index in enumerate(indices):
+            buttons[k] = COMMAND_PAYLOADS[prev_attack, index, _BUTTONS_START:]
+            prev_attack = buttons[k, ATTACK_BUTTON]
+        return buttons
+
+    def commit_chunk(self, buttons: np.ndarray, executed: int, env: int = 0):
+        """Advance the debounce state past the first `executed` steps of a chunk."""
+        if executed > 0:
+            self.prev_attack[env] = buttons[executed - 1, ATTACK_BUTTON]
@@ -21,6 +21,11 @@ STATE_DIM = BASE_STATE_DIM + NUM_BOSS_ANIMATION_STATES + 1 + NUM_PLAYER_ANIMATIO
 RAYCAST_DIM = NUM_RAYS + NUM_RAYS * NUM_HIT_TYPES  # 32 + 192 = 224
 OBSERVATION_DIM = STATE_DIM + RAYCAST_DIM  # 419
 
+# Compact observations keep the categorical fields (animations, ray hit types) as indices.
+COMPACT_CONTINUOUS_DIM = BASE_STATE_DIM + 2 + NUM_RAYS  # 55
+COMPACT_INDEX_DIM = 2 + NUM_RAYS  # 34
+COMPACT_OBSERVATION_DIM = COMPACT_CONTINUOUS_DIM + COMPACT_INDEX_DIM  # 89
+
 ARENA_MIN_X = 32.68
 ARENA_MAX_X = 78.26
 ARENA_MIN_Y = 95.0
@@ -1,28 +1,91 @@
+import asyncio
+
 import gymnasium as gym
 import numpy as np
 from gymnasium import spaces
 
-from silksong.shared_memory import SilkSongSharedMemory, GameState, GameTimeoutError
-from silksong.constants import (
-    PLAYER_MAX_HEALTH,
-    BOSS_MAX_HEALTH,
-    MAX_EPISODE_STEPS,
-    OBSERVATION_DIM,
-)
+from silksong.command import CommandEncoder
+from silksong.observation import ObservationEncoder
+from silksong.pool import InstancePool
+from silksong.profiling import DEFAULT_PROFILE_EVERY, StepProfiler
+from silksong.reward import DEFAULT_REWARD_CONFIG, RewardConfig, calculate_reward
+from silksong.shared_memory import EpisodeTiming, SilkSongSharedMemory, GameState, GameTimeoutError
+from silksong.trace import ReplaySharedMemory, trace_path_for
+from silksong.trajectory import TrajectoryWriter
+
+
+def convert_to_binary(action: np.ndarray, prev_attack: int) -> np.ndarray:
+    """Map a MultiDiscrete action to the 10 plugin buttons. Attack is released for a step after each press."""
+    binary = np.zeros(10, dtype=np.int8)
+
+    if action[0] == 1:
+        binary[0] = 1
+    elif action[0] == 2:
+        binary[1] = 1
+
+    if action[1] == 1:
+        binary[2] = 1
+    elif action[1] == 2:
+        binary[3] = 1
+
+    binary[4] = action[2]
+
+    if prev_attack == 1:
+        binary[5] = 0
+    else:
+        binary[5] = action[3]
+
+    binary[6] = action[4]
+    binary[7] = action[5]
+    binary[8] = action[6]
+    binary[9] = action[7]
+
+    return binary
 
 
 class SilksongBossEnv(gym.Env):
+    """One game instance as a Gymnasium env.
+
+    `areset` and `astep` are coroutine versions of `reset` and `step` that await the game
+    instead of blocking, so one event loop can drive many envs (see silksong/aio.py).
+
+    `timing` sets the frames per step and time scale the game runs each episode with; it
+    is sent with every RESET, and `set_episode_timing` changes it from the next episode on.
+    """
+
     metadata = {"render_modes": []}
 
-    def __init__(self, id: int = 1, time_scale: float = 1.0, nofx: bool = False):
+    def __init__(self, id: int = 1, time_scale: float = 1.0, nofx: bool = False, action_repeat: int = 1,
+                 pool: InstancePool = None, profile_every: int = DEFAULT_PROFILE_EVERY,
+                 reward_config: RewardConfig = None, trajectory_path: str = None, compact_obs: bool = False,
+                 history_length: int = 1, history_deltas: bool = False, timing: EpisodeTiming = None,
+                 **shm_kwargs):
         super().__init__()
 
+        if not 1 <= action_repeat <= SilkSongSharedMemory.MAX_CHUNK_STEPS:
+            raise ValueError(f"action_repeat must be between 1 and {SilkSongSharedMemory.MAX_CHUNK_STEPS}")
+        self.action_repeat = action_repeat
+        self.reward_config = reward_config or DEFAULT_REWARD_CONFIG
+        self.timing = timing
+
+        self.encoder = ObservationEncoder(compact=compact_obs)
+        # The last `history_length` observations, oldest first (silksong/observation.py).
+        self.history = self.encoder.history(history_length, history_deltas) if history_length > 1 else None
+
         self.action_space = spaces.MultiDiscrete([3, 3, 2, 2, 2, 2, 2, 2])
         self.observation_space = spaces.Box(
-            low=-np.inf, high=np.inf, shape=(OBSERVATION_DIM,), dtype=np.float32
+            low=-np.inf, high=np.inf, shape=(self.encoder.dim * history_length,), dtype=np.float32,
         )
 
-        self.shm = SilkSongSharedMemory(id, time_scale, nofx)
+        self.pool = pool
+        shm_class = ReplaySharedMemory if shm_kwargs.get("replay") else SilkSongSharedMemory
+        self.shm = shm_class(id, time_scale, nofx, **shm_kwargs)
+        # Phase timings of every `profile_every`-th step, handed over in info["latency"].
+        self.profiler = StepProfiler(profile_every)
+        self.shm.profiler = self.profiler
+        self.commands = CommandEncoder()
+        # Every state, action and reward, for offline reward relabeling (silksong/trajectory.py).
+        self.trajectory = TrajectoryWriter(trace_path_for(trajectory_path, id)) if trajectory_path else None
 
         self.prev_boss_health = 0
         self.prev_player_health = 0
@@ -36,18 +99,40 @@ class SilksongBossEnv(gym.Env):
         self.episode_reward = 0.0
         self.lowest_boss_hp = float('inf')
 
-        self.prev_attack = 0
-
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        timer = self.profiler.start()
+
+        try:
+            game_state = self.shm.reset(self.timing)
+        except GameTimeoutError as e:
+            print(f"[Env] Reset timeout: {e}")
+            self._restart(e.cause)
+            game_state = self.shm.reset(self.timing)
+        timer.total("reset")
+
+        return self._start_episode(game_state)
+
+    async def areset(self, seed=None, options=None):
+        """`reset` for asyncio."""
+        super().reset(seed=seed)
+        timer = self.profiler.start()
 
         try:
-            game_state = self.shm.reset()
+            game_state = await self.shm.areset(self.timing)
         except GameTimeoutError as e:
             print(f"[Env] Reset timeout: {e}")
-            self.shm.restart()
-            game_state = self.shm.reset()
+            await self._arestart(e.cause)
+            game_state = await self.shm.areset(self.timing)
+        timer.total("reset")
 
+        return self._start_episode(game_state)
+
+    def set_episode_timing(self, timing: EpisodeTiming):
+        """Run the episodes from the next reset on with `timing` (None for the plugin defaults)."""
+        self.timing = timing
+
+    def _start_episode(self, game_state: GameState):
         self.prev_boss_health = game_state.boss_health
         self.prev_player_health = game_state.player_health
         self.prev_player_silk = game_state.player_silk
@@ -59,33 +144,121 @@ class SilksongBossEnv(gym.Env):
         self.hurt_count = 0
         self.episode_reward = 0.0
         self.lowest_boss_hp = game_state.boss_health
-        self.prev_attack = 0
+        self.commands.reset()
+        if self.trajectory is not None:
+            self.trajectory.append(self.shm.state_view)
 
-        observation = game_state.to_observation()
+        observation = self._observe(start=True)
         info = self._get_info(game_state)
 
         return observation, info
 
     def step(self, action):
+        timer = self.profiler.start_step()
+
+        if self.action_repeat > 1:
+            return self._end_step(self.step_chunk([action] * self.action_repeat))
+
+        payload = self._encode_step(action, timer)
+        try:
+            game_state = self.shm.step_command(payload)
+        except GameTimeoutError as e:
+            print(f"[Env] {e}")
+            return self._end_step([self._handle_timeout(e)])
+        return self._end_step([self._transition(game_state, self.shm.state_view, action)])
+
+    async def astep(self, action):
+        """`step` for asyncio."""
+        timer = self.profiler.start_step()
+
+        if self.action_repeat > 1:
+            return self._end_step(await self.astep_chunk([action] * self.action_repeat))
+
+        payload = self._encode_step(action, timer)
+        try:
+            game_state = await self.shm.astep_command(payload)
+        except GameTimeoutError as e:
+            print(f"[Env] {e}")
+            return self._end_step([await self._ahandle_timeout(e)])
+        return self._end_step([self._transition(game_state, self.shm.state_view, action)])
+
+    def _encode_step(self, action, timer) -> bytes:
         self.total_steps += 1
+        payload = self.commands.encode(action)
+        timer.lap("convert_action")
+        return payload
+
+    def _end_step(self, transitions: list[tuple]):
+        if self.action_repeat > 1:
+            observation, _, terminated, truncated, info = transitions[-1]
+            reward = sum(transition[1] for transition in transitions)
+        else:
+            observation, reward, terminated, truncated, info = transitions[0]
+
+        self.profiler.end_step()
+        if self.profiler.report_due:
+            info["latency"] = self.profiler.report()
+        return observation, reward, terminated, truncated, info
 
-        binary_action = self._convert_to_binary(action)
+    def step_chunk(self, actions) -> list[tuple]:
+        """Send several actions in one round trip and return one step() tuple per executed action.
 
+        The list stops at the first terminated or truncated transition.
+        """
+        buttons = self._encode_chunk(actions)
         try:
-            game_state = self.shm.step(binary_action)
+            records = self.shm.step_chunk(buttons)
         except GameTimeoutError as e:
             print(f"[Env] {e}")
-            return self._handle_timeout()
+            return [self._handle_timeout(e)]
+        return self._chunk_transitions(actions, buttons, records)
 
+    async def astep_chunk(self, actions) -> list[tuple]:
+        """`step_chunk` for asyncio."""
+        buttons = self._encode_chunk(actions)
+        try:
+            records = await self.shm.astep_chunk(buttons)
+        except GameTimeoutError as e:
+            print(f"[Env] {e}")
+            return [await self._ahandle_timeout(e)]
+        return self._chunk_transitions(actions, buttons, records)
+
+    def _encode_chunk(self, actions) -> np.ndarray:
+        buttons = self.commands.chunk_buttons(actions)
+        self.profiler.timer.lap("convert_action")
+        return buttons
+
+    def _chunk_transitions(self, actions, buttons: np.ndarray, records: np.ndarray) -> list[tuple]:
+        timer = self.profiler.timer
+        transitions = []
+        for action, record in zip(actions, records):
+            self.total_steps += 1
+            game_state = GameState.from_record(record)
+            timer.lap("read_game_state")
+            transition = self._transition(game_state, record, action)
+            transitions.append(transition)
+            if transition[2] or transition[3]:
+                break
+
+        # Unexecuted actions must not count towards the attack debounce.
+        self.commands.commit_chunk(buttons, len(transitions))
+        return transitions
+
+    def _transition(self, game_state: GameState, record: np.ndarray, action: np.ndarray) -> tuple:
+        timer = self.profiler.timer
         reward = self._calculate_reward(game_state)
 
         self.episode_reward += reward
         self.lowest_boss_hp = min(self.lowest_boss_hp, game_state.boss_health)
+        timer.lap("reward")
 
-        observation = game_state.to_observation()
+        observation = self._observe(record)
+        timer.lap("observe")
 
         terminated = self._is_terminated(game_state)
         truncated = self._is_truncated(game_state)
+        if self.trajectory is not None:
+            self.trajectory.append(record, action, reward, terminated, truncated)
 
         self.prev_boss_health = game_state.boss_health
         self.prev_player_health = game_state.player_health
@@ -96,86 +269,73 @@ class SilksongBossEnv(gym.Env):
 
         return observation, reward, terminated, truncated, info
 
-    def _handle_timeout(self):
-        self.shm.restart()
+    def _restart(self, cause: str):
+        """Swap in a warm spare when a pool is attached, otherwise relaunch the game in place."""
+        timer = self.profiler.start()
+        if self.pool is not None:
+            self.shm = self.pool.replace(self.shm, cause=cause)
+            self.shm.profiler = self.profiler
+        else:
+            self.shm.restart(cause=cause)
+        timer.total("restart")
 
-        game_state = self.shm.reset()
+    async def _arestart(self, cause: str):
+        # Relaunching blocks for the whole boot; it is rare enough to hand to the default executor.
+        await asyncio.get_running_loop().run_in_executor(None, self._restart, cause)
 
+    def _handle_timeout(self, error: GameTimeoutError):
+        self._restart(error.cause)
+        return self._timeout_transition(self.shm.reset(self.timing))
+
+    async def _ahandle_timeout(self, error: GameTimeoutError):
+        await self._arestart(error.cause)
+        return self._timeout_transition(await self.shm.areset(self.timing))
+
+    def _timeout_transition(self, game_state: GameState):
         self.prev_boss_health = game_state.boss_health
         self.prev_player_health = game_state.player_health
         self.prev_player_silk = game_state.player_silk
 
-        observation = game_state.to_observation()
+        # The history holds frames of the game that failed; start over from the new one.
+        observation = self._observe(start=True)
         info = self._get_info(game_state, episode_end=True)
         info["timeout_restart"] = True
+        # The pool may know better than the watchdog (a crashed daemon-owned game looks hung from here).
+        info["restart_cause"] = self.shm.restart_history[-1]["cause"]
+        info["restart_time"] = self.shm.restart_history[-1]["recovery_time"]
 
         return observation, 0.0, False, True, info
 
-    def _calculate_reward(self, game_state: GameState) -> float:
-        boss_dmg = self.prev_boss_health - game_state.boss_health
-        player_dmg = self.prev_player_health - game_state.player_health
-        health_gained = game_state.player_health - self.prev_player_health
+    def _observe(self, record: np.ndarray = None, start: bool = False) -> np.ndarray:
+        # Copied because vec envs keep the terminal observation around across the auto-reset;
+        # the copy is negligible next to the encode itself.
+        if record is None:
+            record = self.shm.state_view
+        observation = self.encoder.encode(record)
+        if self.history is not None:
+            frame = observation.reshape(1, -1)
+            observation = (self.history.reset(frame) if start else self.history.push(frame))[0]
+        return observation.copy()
 
-        hurt = player_dmg > 0
-        hit = boss_dmg > 0
-        boss_stunned = game_state.boss_animation_state == 16
-        silk_used = self.prev_player_silk - game_state.player_silk
+    def _calculate_reward(self, game_state: GameState) -> float:
+        reward, hit, hurt, healed = calculate_reward(
+            game_state, self.prev_boss_health, self.prev_player_health, self.prev_player_silk, self.reward_config
+        )
 
         if hit:
             self.attack_count += 1
         if hurt:
             self.hurt_count += 1
-
-        reward = 0.0
-
-        if hit:
-            if boss_stunned:
-                reward += 2.0
-            else:
-                reward += 1.0
-        if hurt:
-            if boss_stunned:
-                reward -= 2.0
-            else:
-                reward -= 1.0
-
-        if silk_used > 0:
-            reward -= 0.05 * silk_used
-
-        if health_gained > 0:
-            reward += health_gained
+        if healed:
             self.heal_count += 1
 
-        if not (hurt or hit or health_gained > 0):
-            reward -= 0.001
-
-        rel_x = game_state.boss_pos_x - game_state.player_pos_x
-        rel_y = game_state.boss_pos_y - game_state.player_pos_y
-        distance_to_boss = np.sqrt(rel_x ** 2 + rel_y ** 2)
-
-        if distance_to_boss > 15.0:
-            reward -= 0.001
-        if distance_to_boss < 1.0:
-            reward -= 0.001
-
-        win = game_state.boss_health <= 0
-        lose = game_state.player_health <= 0
-
-        if win:
-            health_bonus = game_state.player_health / PLAYER_MAX_HEALTH
-            time_bonus = min(1.0, 100.0 / max(game_state.episode_time, 1.0))
-            reward += health_bonus + time_bonus
-        elif lose:
-            boss_remaining = game_state.boss_health / BOSS_MAX_HEALTH
-            reward -= boss_remaining
-
         return reward
 
     def _is_terminated(self, game_state: GameState) -> bool:
         return game_state.boss_health <= 0 or game_state.player_health <= 0
 
     def _is_truncated(self, game_state: GameState) -> bool:
-        if self.total_steps >= MAX_EPISODE_STEPS:
+        if self.total_steps >= self.reward_config.max_episode_steps:
             return True
         return game_state.truncated
 
@@ -199,35 +359,13 @@ class SilksongBossEnv(gym.Env):
 
         return info
 
-    def _convert_to_binary(self, action: np.ndarray) -> np.ndarray:
-        binary = np.zeros(10, dtype=np.int8)
-
-        if action[0] == 1:
-            binary[0] = 1
-        elif action[0] == 2:
-            binary[1] = 1
-
-        if action[1] == 1:
-            binary[2] = 1
-        elif action[1] == 2:
-            binary[3] = 1
-
-        binary[4] = action[2]
-
-        if self.prev_attack == 1:
-            binary[5] = 0
-        else:
-            binary[5] = action[3]
-        self.prev_attack = binary[5]
-
-        binary[6] = action[4]
-        binary[7] = action[5]
-        binary[8] = action[6]
-        binary[9] = action[7]
-
-        return binary
-
     def close(self):
+        if getattr(self, 'trajectory', None) is not None:
+            self.trajectory.close()
+            self.trajectory = None
         if hasattr(self, 'shm') and self.shm is not None:
             self.shm.close()
             self.shm = None
+        if getattr(self, 'pool', None) is not None:
+            self.pool.close()
+            self.pool = None
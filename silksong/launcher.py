@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Sequence
+
+from silksong.shared_memory import GameTimeoutError, SilkSongSharedMemory
+from silksong.trace import ReplaySharedMemory
+
+DEFAULT_MAX_CONCURRENT_BOOTS = 4
+DEFAULT_LAUNCH_STAGGER = 0.5
+
+
+def provision_instances(env_ids: Sequence[int], max_workers: int = 8) -> list[str]:
+    """Create the per-instance game folders concurrently. Returns the executable paths."""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(env_ids)))) as executor:
+        return list(executor.map(SilkSongSharedMemory.get_game_path, env_ids))
+
+
+def launch_instances(
+    env_ids: Sequence[int],
+    time_scale: float = 1.0,
+    nofx: bool = False,
+    max_concurrent_boots: int = DEFAULT_MAX_CONCURRENT_BOOTS,
+    stagger: float = DEFAULT_LAUNCH_STAGGER,
+    boot_timeout: float = None,
+    **shm_kwargs,
+) -> list[SilkSongSharedMemory]:
+    """Launch one game per env_id and wait on all of their READY signals together.
+
+    At most `max_concurrent_boots` games are booting at any time (0 for no limit), and
+    consecutive launches are at least `stagger` seconds apart so they don't all hit the
+    disk and shader caches at once. Startup takes about as long as the slowest boot
+    instead of the sum of all of them. Each instance's `boot_time` is filled in.
+
+    If any instance fails to boot, every instance is closed and the error is raised.
+    """
+    env_ids = list(env_ids)
+    if boot_timeout is None:
+        boot_timeout = SilkSongSharedMemory.BOOT_TIMEOUT_MS / 1000.0
+    if max_concurrent_boots <= 0:
+        max_concurrent_boots = len(env_ids)
+
+    if shm_kwargs.get("attach"):
+        return [SilkSongSharedMemory(env_id, time_scale, nofx, **shm_kwargs) for env_id in env_ids]
+    if shm_kwargs.get("replay"):
+        return [ReplaySharedMemory(env_id, time_scale, nofx, **shm_kwargs) for env_id in env_ids]
+
+    if not shm_kwargs.get("simulator") and len(env_ids) > 1:
+        provision_instances(env_ids)
+
+    start = time.monotonic()
+    pending = list(env_ids)
+    booting: list[SilkSongSharedMemory] = []
+    ready: dict[int, SilkSongSharedMemory] = {}
+    last_launch = None
+
+    try:
+        while pending or booting:
+            now = time.monotonic()
+            if pending and len(booting) < max_concurrent_boots and (last_launch is None or now - last_launch >= stagger):
+                booting.append(SilkSongSharedMemory(pending.pop(0), time_scale, nofx, wait_ready=False, **shm_kwargs))
+                last_launch = now
+
+            for shm in booting[:]:
+                if shm.poll_ready():
+                    print(f"[Env {shm.id}] Game connected after {shm.boot_time:.1f}s")
+                    booting.remove(shm)
+                    ready[shm.id] = shm
+                elif now - shm.launch_time > boot_timeout:
+                    raise GameTimeoutError(f"[Env {shm.id}] Game did not reach READY within {boot_timeout:.0f}s")
+
+            time.sleep(0.01)
+    except BaseException:
+        for shm in booting + list(ready.values()):
+            shm.close()
+        raise
+
+    instances = [ready[env_id] for env_id in env_ids]
+    boot_times = [shm.boot_time for shm in instances]
+    print(
+        f"[Launcher] {len(instances)} instance(s) ready in {time.monotonic() - start:.1f}s "
+        f"(slowest boot {max(boot_times):.1f}s, sum of boots {sum(boot_times):.1f}s)"
+    )
+    return instances
@@ -1,18 +1,62 @@
+import time
 from collections import deque
+from typing import TYPE_CHECKING
 
 import numpy as np
 import torch
 import torch.nn as nn
-from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.callbacks import BaseCallback, EvalCallback
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 
-from silksong.constants import STATE_DIM, RAYCAST_DIM
+from silksong.constants import COMPACT_CONTINUOUS_DIM, COMPACT_OBSERVATION_DIM, OBSERVATION_DIM, STATE_DIM, RAYCAST_DIM
+from silksong.observation import COMPACT_CONTINUOUS_COLUMNS, COMPACT_INDEX_OFFSETS
+from silksong.profiling import LatencyHistogram
+from silksong.schedule import TimingSchedule
+from silksong.vec_env import VecLatencyMonitor
+
+if TYPE_CHECKING:
+    import optuna
+
+
+def expand_compact_observations(observations: torch.Tensor, continuous_columns: torch.Tensor,
+                                index_offsets: torch.Tensor) -> torch.Tensor:
+    """Rebuild full observations from compact ones: copy the continuous columns, scatter the one-hots."""
+    full = observations.new_zeros(observations.shape[0], OBSERVATION_DIM)
+    full[:, continuous_columns] = observations[:, :COMPACT_CONTINUOUS_DIM]
+    indices = observations[:, COMPACT_CONTINUOUS_DIM:].long() + index_offsets
+    full.scatter_(1, indices, 1.0)
+    return full
 
 
 class MultiHeadFeatureExtractor(BaseFeaturesExtractor):
+    """State and raycast branches over the full observation layout.
+
+    Compact observations (`compact_obs=True` envs, detected from the observation space) are
+    expanded to the full layout on the device first, so both modes share weights and a
+    checkpoint trained in one runs in the other.
+
+    With a frame history (`history_length` > 1 envs, also detected from the observation
+    space), the newest frame goes through the state and raycast branches as before. Each
+    older frame is encoded by a small shared frame branch, and a history branch mixes the
+    encoded frames into 128 features that are fed to the combined layers.
+    """
+
     def __init__(self, observation_space, features_dim: int = 256):
         super().__init__(observation_space, features_dim)
 
+        dim = observation_space.shape[0]
+        if dim % OBSERVATION_DIM == 0:
+            self.frame_dim = OBSERVATION_DIM
+        elif dim % COMPACT_OBSERVATION_DIM == 0:
+            self.frame_dim = COMPACT_OBSERVATION_DIM
+        else:
+            raise ValueError(f"Observation size {dim} is not a whole number of full or compact frames")
+        self.compact = self.frame_dim == COMPACT_OBSERVATION_DIM
+        self.history_length = dim // self.frame_dim
+        # Not persistent, so state dicts are the same in both modes.
+        self.register_buffer("continuous_columns", torch.as_tensor(COMPACT_CONTINUOUS_COLUMNS), persistent=False)
+        self.register_buffer("index_offsets", torch.as_tensor(COMPACT_INDEX_OFFSETS), persistent=False)
+
         self.state_branch = nn.Sequential(
             nn.Linear(STATE_DIM, 256),
             nn.ReLU(),
@@ -29,8 +73,20 @@ class MultiHeadFeatureExtractor(BaseFeaturesExtractor):
             nn.ReLU(),
         )
 
+        history_features = 0
+        if self.history_length > 1:
+            self.frame_branch = nn.Sequential(
+                nn.Linear(OBSERVATION_DIM, 64),
+                nn.ReLU(),
+            )
+            self.history_branch = nn.Sequential(
+                nn.Linear(64 * (self.history_length - 1), 128),
+                nn.ReLU(),
+            )
+            history_features = 128
+
         self.combined = nn.Sequential(
-            nn.Linear(256, 256),
+            nn.Linear(256 + history_features, 256),
             nn.ReLU(),
             nn.LayerNorm(256),
             nn.Linear(256, features_dim),
@@ -38,13 +94,24 @@ class MultiHeadFeatureExtractor(BaseFeaturesExtractor):
         )
 
     def forward(self, observations: torch.Tensor) -> torch.Tensor:
-        state_obs = observations[:, :STATE_DIM]
-        raycast_obs = observations[:, STATE_DIM:]
+        batch = observations.shape[0]
+        frames = observations.reshape(batch * self.history_length, self.frame_dim)
+        if self.compact:
+            frames = expand_compact_observations(frames, self.continuous_columns, self.index_offsets)
+        frames = frames.reshape(batch, self.history_length, OBSERVATION_DIM)
+        current = frames[:, -1]
+        state_obs = current[:, :STATE_DIM]
+        raycast_obs = current[:, STATE_DIM:]
 
         state_features = self.state_branch(state_obs)
         raycast_features = self.raycast_branch(raycast_obs)
+        features = [state_features, raycast_features]
+
+        if self.history_length > 1:
+            past = self.frame_branch(frames[:, :-1]).flatten(1)
+            features.append(self.history_branch(past))
 
-        combined = torch.cat([state_features, raycast_features], dim=-1)
+        combined = torch.cat(features, dim=-1)
         return self.combined(combined)
 
 
@@ -56,9 +123,15 @@ class TensorboardCallback(BaseCallback):
         self.attack_counts = deque(maxlen=buffer_size)
         self.hurt_counts = deque(maxlen=buffer_size)
         self.lowest_boss_hps = deque(maxlen=buffer_size)
+        self.restart_count = 0
 
     def _on_step(self) -> bool:
         for i, info in enumerate(self.locals.get("infos", [])):
+            if "restart_cause" in info:
+                self.restart_count += 1
+                self.logger.record("restarts/count", self.restart_count)
+                self.logger.record(f"restarts/{info['restart_cause']}_recovery_time", info["restart_time"])
+
             if "episode_reward" in info:
                 episode_reward = info["episode_reward"]
                 lowest_boss_hp = info["lowest_boss_hp"]
@@ -78,3 +151,134 @@ class TensorboardCallback(BaseCallback):
                 self.logger.record("episode/highest_reward", self.highest_reward)
 
         return True
+
+
+class TrialEvalCallback(EvalCallback):
+    """`EvalCallback` that reports each evaluation to an Optuna trial and stops the run when it is pruned."""
+
+    def __init__(self, trial: "optuna.Trial", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trial = trial
+        self.eval_idx = 0
+        self.is_pruned = False
+        self.all_mean_rewards = []
+
+    def _on_step(self) -> bool:
+        result = super()._on_step()
+
+        if self.eval_idx > 0 and self.last_mean_reward is not None:
+            self.trial.report(self.last_mean_reward, self.eval_idx)
+
+            if self.trial.should_prune():
+                self.is_pruned = True
+                return False
+
+        return result
+
+    def _on_event(self) -> None:
+        super()._on_event()
+        self.eval_idx += 1
+        if self.last_mean_reward is not None:
+            self.all_mean_rewards.append(self.last_mean_reward)
+
+    def get_average_reward(self) -> float:
+        if not self.all_mean_rewards:
+            return float('-inf')
+        return sum(self.all_mean_rewards) / len(self.all_mean_rewards)
+
+
+class LatencyCallback(BaseCallback):
+    """Logs per-phase step latency percentiles, steps/sec and reset/restart durations.
+
+    Phase histograms arrive in the envs' `info["latency"]` (see `silksong.profiling`) and are
+    merged over all envs; at the end of each rollout their p50/p95/p99 are logged in
+    milliseconds under `latency/`, together with a `VecLatencyMonitor` in the env chain if
+    there is one. With `per_env`, each env's step p99 is logged under `latency_env/`.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, verbose=0, per_env: bool = True):
+        super().__init__(verbose)
+        self.per_env = per_env
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.monitor = None
+        self._last_time = None
+        self._last_timesteps = 0
+
+    def _on_training_start(self) -> None:
+        env = self.training_env
+        while env is not None and not isinstance(env, VecLatencyMonitor):
+            env = getattr(env, "venv", None)
+        self.monitor = env
+        self._last_time = time.perf_counter()
+        self._last_timesteps = self.num_timesteps
+
+    def _merge(self, histograms: dict[str, LatencyHistogram]):
+        for phase, histogram in histograms.items():
+            if phase in self.histograms:
+                self.histograms[phase].merge(histogram)
+            else:
+                self.histograms[phase] = histogram
+
+    def _on_step(self) -> bool:
+        for i, info in enumerate(self.locals.get("infos", [])):
+            latency = info.get("latency")
+            if latency is None:
+                continue
+            if self.per_env and "step" in latency:
+                self.logger.record(f"latency_env/{i}_step_p99_ms", latency["step"].percentile(99) * 1000)
+            self._merge(latency)
+        return True
+
+    def _on_rollout_end(self) -> None:
+        now = time.perf_counter()
+        if now > self._last_time:
+            self.logger.record("latency/steps_per_sec", (self.num_timesteps - self._last_timesteps) / (now - self._last_time))
+        self._last_time = now
+        self._last_timesteps = self.num_timesteps
+
+        if self.monitor is not None:
+            self._merge(self.monitor.report())
+
+        for phase, histogram in sorted(self.histograms.items()):
+            if histogram.count == 0:
+                continue
+            for q in self.PERCENTILES:
+                self.logger.record(f"latency/{phase}_p{q}_ms", histogram.percentile(q) * 1000)
+            if phase in ("reset", "restart"):
+                self.logger.record(f"latency/{phase}_count", histogram.count)
+        self.histograms = {}
+
+
+class EpisodeTimingCallback(BaseCallback):
+    """Follows a `TimingSchedule`: hands every env the episode timing due at the current timestep.
+
+    The envs send it with their next RESET, so episodes already running finish with the
+    timing they started with. The timing in effect is logged under `timing/`.
+    """
+
+    def __init__(self, schedule: TimingSchedule, verbose=0):
+        super().__init__(verbose)
+        self.schedule = schedule
+        self.timing = None
+
+    def _on_training_start(self) -> None:
+        self._apply()
+
+    def _on_step(self) -> bool:
+        self._apply()
+        return True
+
+    def _apply(self):
+        timing = self.schedule.at(self.num_timesteps)
+        if timing == self.timing:
+            return
+        self.training_env.env_method("set_episode_timing", timing)
+        if self.timing is not None:
+            print(f"\nEpisode timing from step {self.num_timesteps:,}: {timing}")
+        self.timing = timing
+        if timing.frames_per_step is not None:
+            self.logger.record("timing/frames_per_step", timing.frames_per_step)
+        if timing.time_scale is not None:
+            self.logger.record("timing/time_scale", timing.time_scale)
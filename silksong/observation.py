@@ -0,0 +1,320 @@
+import math
+from typing import Sequence
+
+import numpy as np
+
+from silksong.constants import (
+    PLAYER_MAX_HEALTH,
+    PLAYER_MAX_SILK,
+    BOSS_MAX_HEALTH,
+    NUM_BOSS_ANIMATION_STATES,
+    NUM_PLAYER_ANIMATION_STATES,
+    NUM_HIT_TYPES,
+    NUM_RAYS,
+    BASE_STATE_DIM,
+    STATE_DIM,
+    OBSERVATION_DIM,
+    COMPACT_CONTINUOUS_DIM,
+    COMPACT_OBSERVATION_DIM,
+    ARENA_MIN_X,
+    ARENA_MAX_X,
+    ARENA_MIN_Y,
+    ARENA_MAX_Y,
+    HERO_VEL_X_RANGE,
+    HERO_VEL_Y_RANGE,
+    BOSS_VEL_X_RANGE,
+    BOSS_VEL_Y_RANGE,
+)
+from silksong.protocol import GAME_STATE
+
+MAX_DISTANCE = np.sqrt((ARENA_MAX_X - ARENA_MIN_X) ** 2 + (ARENA_MAX_Y - ARENA_MIN_Y) ** 2)
+
+# (record field, observation column, offset, scale) for the clipped min-max features.
+LINEAR_FEATURES = [
+    ("player_pos_x", 0, ARENA_MIN_X, ARENA_MAX_X - ARENA_MIN_X),
+    ("player_pos_y", 1, ARENA_MIN_Y, ARENA_MAX_Y - ARENA_MIN_Y),
+    ("player_vel_x", 2, HERO_VEL_X_RANGE[0], HERO_VEL_X_RANGE[1] - HERO_VEL_X_RANGE[0]),
+    ("player_vel_y", 3, HERO_VEL_Y_RANGE[0], HERO_VEL_Y_RANGE[1] - HERO_VEL_Y_RANGE[0]),
+    ("boss_pos_x", 11, ARENA_MIN_X, ARENA_MAX_X - ARENA_MIN_X),
+    ("boss_pos_y", 12, ARENA_MIN_Y, ARENA_MAX_Y - ARENA_MIN_Y),
+    ("boss_vel_x", 13, BOSS_VEL_X_RANGE[0], BOSS_VEL_X_RANGE[1] - BOSS_VEL_X_RANGE[0]),
+    ("boss_vel_y", 14, BOSS_VEL_Y_RANGE[0], BOSS_VEL_Y_RANGE[1] - BOSS_VEL_Y_RANGE[0]),
+]
+
+# (record field, observation column, divisor) for the plain ratio features.
+RATIO_FEATURES = [
+    ("player_health", 4, PLAYER_MAX_HEALTH),
+    ("player_silk", 5, PLAYER_MAX_SILK),
+    ("boss_health", 15, BOSS_MAX_HEALTH),
+    ("boss_phase", 16, 2.0),
+]
+
+FLAG_FEATURES = [
+    ("player_grounded", 6),
+    ("player_can_dash", 7),
+    ("player_facing_right", 8),
+    ("player_invincible", 9),
+    ("player_can_attack", 10),
+    ("boss_facing_right", 17),
+]
+
+BOSS_ANIM_START = BASE_STATE_DIM
+BOSS_PROGRESS_COLUMN = BOSS_ANIM_START + NUM_BOSS_ANIMATION_STATES
+PLAYER_ANIM_START = BOSS_PROGRESS_COLUMN + 1
+PLAYER_PROGRESS_COLUMN = PLAYER_ANIM_START + NUM_PLAYER_ANIMATION_STATES
+RAY_DISTANCE_START = STATE_DIM
+HIT_TYPE_START = RAY_DISTANCE_START + NUM_RAYS
+
+# Compact layout: the base features, both animation progresses and the ray distances,
+# then the boss animation, player animation and per-ray hit type as float indices.
+COMPACT_BOSS_PROGRESS_COLUMN = BASE_STATE_DIM
+COMPACT_PLAYER_PROGRESS_COLUMN = BASE_STATE_DIM + 1
+COMPACT_RAY_DISTANCE_START = BASE_STATE_DIM + 2
+COMPACT_BOSS_ANIM_COLUMN = COMPACT_CONTINUOUS_DIM
+COMPACT_PLAYER_ANIM_COLUMN = COMPACT_CONTINUOUS_DIM + 1
+COMPACT_HIT_TYPE_START = COMPACT_CONTINUOUS_DIM + 2
+
+# Where the compact columns go in the full layout: continuous columns map one to one,
+# and index column k becomes a one-hot at COMPACT_INDEX_OFFSETS[k] + index.
+COMPACT_CONTINUOUS_COLUMNS = np.concatenate([
+    np.arange(BASE_STATE_DIM),
+    [BOSS_PROGRESS_COLUMN, PLAYER_PROGRESS_COLUMN],
+    RAY_DISTANCE_START + np.arange(NUM_RAYS),
+])
+COMPACT_INDEX_OFFSETS = np.concatenate([
+    [BOSS_ANIM_START, PLAYER_ANIM_START],
+    HIT_TYPE_START + np.arange(NUM_RAYS) * NUM_HIT_TYPES,
+])
+
+
+class ObservationEncoder:
+    """Encodes `GAME_STATE_DTYPE` records into observations without per-step allocations.
+
+    Produces exactly the same float32 values as `GameState.to_observation`: every feature
+    is computed in float64 in the same order and only rounded when stored in the buffer.
+    The returned array is owned by the encoder and overwritten by the next call.
+
+    With `compact=True` observations use the `COMPACT_OBSERVATION_DIM` layout: the one-hot
+    groups are stored as their index instead, and `MultiHeadFeatureExtractor` expands them
+    back on the device.
+    """
+
+    def __init__(self, n_envs: int = 1, compact: bool = False):
+        self.n_envs = n_envs
+        self.compact = compact
+        self.dim = COMPACT_OBSERVATION_DIM if compact else OBSERVATION_DIM
+        self.buffer = np.zeros((n_envs, self.dim), dtype=np.float32)
+
+        self._linear_fields = [field for field, _, _, _ in LINEAR_FEATURES]
+        self._linear_columns = np.array([column for _, column, _, _ in LINEAR_FEATURES])
+        self._offsets = np.array([offset for _, _, offset, _ in LINEAR_FEATURES], dtype=np.float64)
+        self._scales = np.array([scale for _, _, _, scale in LINEAR_FEATURES], dtype=np.float64)
+
+        self._linear = np.zeros((n_envs, len(LINEAR_FEATURES)), dtype=np.float64)
+        self._rows = np.arange(n_envs)
+        self._ray_rows = np.repeat(self._rows, NUM_RAYS)
+        self._ray_columns = HIT_TYPE_START + np.tile(np.arange(NUM_RAYS) * NUM_HIT_TYPES, n_envs)
+
+        # `encode`: positions in `record.item()`, and the base columns in the order it computes them.
+        field = GAME_STATE.names.index
+        self._single_linear = [(field(name), offset, scale) for name, _, offset, scale in LINEAR_FEATURES]
+        self._single_ratios = [(field(name), divisor) for name, _, divisor in RATIO_FEATURES]
+        self._single_flags = [field(name) for name, _ in FLAG_FEATURES]
+        self._single_columns = np.array(
+            [column for _, column, _, _ in LINEAR_FEATURES] + [column for _, column, _ in RATIO_FEATURES]
+            + [column for _, column in FLAG_FEATURES] + [18, 19, 20]
+        )
+        self._single_positions = tuple(field(name) for name in (
+            "player_pos_x", "player_pos_y", "boss_pos_x", "boss_pos_y", "boss_animation_state",
+            "player_animation_state", "boss_animation_progress", "player_animation_progress",
+            "raycast_distances", "raycast_hit_types",
+        ))
+        self._single_ray_columns = HIT_TYPE_START + np.arange(NUM_RAYS) * NUM_HIT_TYPES
+
+    def history(self, length: int, deltas: bool = False) -> "ObservationHistory":
+        """A frame history for this encoder's layout, with deltas over its continuous columns if asked."""
+        delta_columns = None
+        if deltas:
+            delta_columns = np.arange(COMPACT_CONTINUOUS_DIM) if self.compact else COMPACT_CONTINUOUS_COLUMNS
+        return ObservationHistory(self.n_envs, length, self.dim, delta_columns)
+
+    def encode(self, record: np.ndarray) -> np.ndarray:
+        """Encode a single 0-d record. Returns a view of the first buffer row.
+
+        The scalar features are computed on the Python floats of one `record.item()`, in
+        the same float64 operations as `encode_batch`. A batch of one would spend most of
+        its time on the fixed overhead of each NumPy call.
+        """
+        values = record.item()
+        (player_x, player_y, boss_x, boss_y, boss_anim, player_anim, boss_progress, player_progress,
+         distances, hit_types) = (values[i] for i in self._single_positions)
+        out = self.buffer[0]
+
+        features = [min(max((values[i] - offset) / scale, 0.0), 1.0) for i, offset, scale in self._single_linear]
+        features += [values[i] / divisor for i, divisor in self._single_ratios]
+        features += [float(values[i] != 0) for i in self._single_flags]
+        dx = boss_x - player_x
+        dy = boss_y - player_y
+        features += [
+            min(max(dx / (ARENA_MAX_X - ARENA_MIN_X) + 0.5, 0.0), 1.0),
+            min(max(dy / (ARENA_MAX_Y - ARENA_MIN_Y) + 0.5, 0.0), 1.0),
+            min(max(math.sqrt(dx * dx + dy * dy) / MAX_DISTANCE, 0.0), 1.0),
+        ]
+        out[self._single_columns] = features
+
+        boss_anim = min(max(boss_anim, 0), NUM_BOSS_ANIMATION_STATES - 1)
+        player_anim = min(max(player_anim, 0), NUM_PLAYER_ANIMATION_STATES - 1)
+        boss_progress = min(max(boss_progress, 0.0), 1.0)
+        player_progress = min(max(player_progress, 0.0), 1.0)
+        hit_types = np.minimum(np.maximum(hit_types, 0), NUM_HIT_TYPES - 1)
+
+        if self.compact:
+            out[COMPACT_BOSS_PROGRESS_COLUMN] = boss_progress
+            out[COMPACT_PLAYER_PROGRESS_COLUMN] = player_progress
+            out[COMPACT_RAY_DISTANCE_START:COMPACT_CONTINUOUS_DIM] = distances
+            out[COMPACT_BOSS_ANIM_COLUMN] = boss_anim
+            out[COMPACT_PLAYER_ANIM_COLUMN] = player_anim
+            out[COMPACT_HIT_TYPE_START:] = hit_types
+            return out
+
+        out[BOSS_ANIM_START:RAY_DISTANCE_START] = 0.0
+        out[BOSS_ANIM_START + boss_anim] = 1.0
+        out[BOSS_PROGRESS_COLUMN] = boss_progress
+        out[PLAYER_ANIM_START + player_anim] = 1.0
+        out[PLAYER_PROGRESS_COLUMN] = player_progress
+        out[RAY_DISTANCE_START:HIT_TYPE_START] = distances
+        out[HIT_TYPE_START:] = 0.0
+        out[self._single_ray_columns + hit_types] = 1.0
+        return out
+
+    def encode_batch(self, records: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """Encode an `(n,)` record array into an `(n, OBSERVATION_DIM)` (or compact) float32 array."""
+        n = len(records)
+        if out is None:
+            out = self.buffer[:n]
+
+        linear = self._linear[:n]
+        for i, field in enumerate(self._linear_fields):
+            linear[:, i] = records[field]
+        np.subtract(linear, self._offsets, out=linear)
+        np.divide(linear, self._scales, out=linear)
+        np.clip(linear, 0.0, 1.0, out=linear)
+        out[:, self._linear_columns] = linear
+
+        for field, column, divisor in RATIO_FEATURES:
+            out[:, column] = records[field] / divisor
+
+        for field, column in FLAG_FEATURES:
+            out[:, column] = records[field] != 0
+
+        player_x = records["player_pos_x"].astype(np.float64)
+        player_y = records["player_pos_y"].astype(np.float64)
+        dx = records["boss_pos_x"] - player_x
+        dy = records["boss_pos_y"] - player_y
+        out[:, 18] = np.clip(dx / (ARENA_MAX_X - ARENA_MIN_X) + 0.5, 0.0, 1.0)
+        out[:, 19] = np.clip(dy / (ARENA_MAX_Y - ARENA_MIN_Y) + 0.5, 0.0, 1.0)
+        out[:, 20] = np.clip(np.sqrt(dx ** 2 + dy ** 2) / MAX_DISTANCE, 0.0, 1.0)
+
+        boss_anim = np.clip(records["boss_animation_state"], 0, NUM_BOSS_ANIMATION_STATES - 1)
+        player_anim = np.clip(records["player_animation_state"], 0, NUM_PLAYER_ANIMATION_STATES - 1)
+        hit_types = np.clip(records["raycast_hit_types"], 0, NUM_HIT_TYPES - 1)
+
+        if self.compact:
+            out[:, COMPACT_BOSS_PROGRESS_COLUMN] = np.clip(records["boss_animation_progress"], 0.0, 1.0)
+            out[:, COMPACT_PLAYER_PROGRESS_COLUMN] = np.clip(records["player_animation_progress"], 0.0, 1.0)
+            out[:, COMPACT_RAY_DISTANCE_START:COMPACT_CONTINUOUS_DIM] = records["raycast_distances"]
+            out[:, COMPACT_BOSS_ANIM_COLUMN] = boss_anim
+            out[:, COMPACT_PLAYER_ANIM_COLUMN] = player_anim
+            out[:, COMPACT_HIT_TYPE_START:] = hit_types
+            return out
+
+        rows = self._rows[:n]
+        out[:, BOSS_ANIM_START:BOSS_PROGRESS_COLUMN] = 0.0
+        out[rows, BOSS_ANIM_START + boss_anim] = 1.0
+        out[:, BOSS_PROGRESS_COLUMN] = np.clip(records["boss_animation_progress"], 0.0, 1.0)
+
+        out[:, PLAYER_ANIM_START:PLAYER_PROGRESS_COLUMN] = 0.0
+        out[rows, PLAYER_ANIM_START + player_anim] = 1.0
+        out[:, PLAYER_PROGRESS_COLUMN] = np.clip(records["player_animation_progress"], 0.0, 1.0)
+
+        out[:, RAY_DISTANCE_START:HIT_TYPE_START] = records["raycast_distances"]
+        out[:, HIT_TYPE_START:] = 0.0
+        out[self._ray_rows[:n * NUM_RAYS], self._ray_columns[:n * NUM_RAYS] + hit_types.reshape(-1)] = 1.0
+
+        return out
+
+
+def column_runs(columns: np.ndarray) -> list[slice]:
+    """Split sorted column indices into slices of consecutive columns."""
+    runs = []
+    start = previous = int(columns[0])
+    for column in columns[1:]:
+        column = int(column)
+        if column != previous + 1:
+            runs.append(slice(start, previous + 1))
+            start = column
+        previous = column
+    runs.append(slice(start, previous + 1))
+    return runs
+
+
+class ObservationHistory:
+    """The last `length` observations of `n_envs` envs, kept in a preallocated ring buffer.
+
+    Every frame is written twice: to slot p and to slot p + length of an
+    `(n_envs, 2 * length, dim)` array. The last `length` frames are then always one
+    contiguous run. `push` returns them as a view, oldest first and flattened to
+    `(n_envs, length * dim)`. A push writes two frames per env, whatever the length.
+    A frame stacker would shift the whole stack instead. All envs advance together,
+    and `reset` refills one env's ring with its first frame. Like `ObservationEncoder`,
+    the returned view is overwritten by the next call.
+
+    With `delta_columns`, each frame except the newest holds, in those columns, how much
+    it changed in the following step. The newest frame keeps its absolute values. The
+    other columns (one-hots, or compact indices) are stored unchanged. The history then
+    carries motion instead of repeating positions, and the current frame is still exact.
+    """
+
+    def __init__(self, n_envs: int, length: int, dim: int, delta_columns: np.ndarray = None):
+        if length < 1:
+            raise ValueError("history length must be at least 1")
+        self.n_envs = n_envs
+        self.length = length
+        self.dim = dim
+        self.frames = np.zeros((n_envs, 2 * length, dim), dtype=np.float32)
+        self.position = length - 1
+        self._delta_runs = column_runs(np.sort(delta_columns)) if delta_columns is not None else []
+        # One window view per position of the newest frame.
+        self._windows = [self.frames[:, p + 1:p + 1 + length].reshape(n_envs, length * dim) for p in range(length)]
+
+    @property
+    def window(self) -> np.ndarray:
+        return self._windows[self.position]
+
+    def push(self, frames: np.ndarray) -> np.ndarray:
+        """Append one `(n_envs, dim)` frame per env. Returns the `(n_envs, length * dim)` window."""
+        previous, length = self.position, self.length
+        position = (previous + 1) % length
+        buffer = self.frames
+        for run in self._delta_runs:
+            changed = buffer[:, previous, run]
+            np.subtract(frames[:, run], changed, out=changed)
+            buffer[:, previous + length, run] = changed
+        buffer[:, position] = frames
+        buffer[:, position + length] = frames
+        self.position = position
+        return self._windows[position]
+
+    def reset(self, frames: np.ndarray, indices: Sequence[int] = None) -> np.ndarray:
+        """Fill the rings of `indices` (all envs by default) with their first frame. Returns the window."""
+        if indices is None:
+            indices = slice(None)
+        self.frames[indices] = frames[:, None, :]
+        if self._delta_runs:
+            # No motion before the first frame.
+            older = np.ones(2 * self.length, dtype=bool)
+            older[[self.position, self.position + self.length]] = False
+            rows = np.arange(self.n_envs)[indices]
+            for run in self._delta_runs:
+                self.frames[np.ix_(rows, older, np.arange(run.start, run.stop))] = 0.0
+        return self.window
@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import deque
+from typing import Sequence
+
+from silksong.profiling import LatencyHistogram
+from silksong.shared_memory import EpisodeTiming, GameTimeoutError, SilkSongSharedMemory
+
+
+class InstancePool:
+    """Pre-launched spare game instances for immediate failover.
+
+    Every spare has its own env_id and shared-memory segment and has already completed the
+    READY handshake (and, with `warm_reset`, its first scene load). `replace` hands a spare
+    to the caller straight away, then closes the failed instance and boots a new spare on
+    the freed env_id in the background, so a crash costs a swap instead of a cold start.
+
+    Warm spares also stand in for resets. `take_ready` hands out a spare that already sits
+    at an episode start, and `recycle` resets a finished instance in the background and adds
+    it back as a spare once its RESET state arrives (see `SilksongVecEnv` `swap_resets`).
+    Those resets carry `timing`; a spare reset before `set_episode_timing` plays its next
+    episode with the timing it was reset with.
+    """
+
+    BOOT_ATTEMPTS = 3
+    SPARE_WAIT_TIMEOUT = 90.0
+
+    def __init__(self, spare_ids: Sequence[int], time_scale: float = 1.0, nofx: bool = False,
+                 warm_reset: bool = True, timing: EpisodeTiming = None, **shm_kwargs):
+        self.time_scale = time_scale
+        self.nofx = nofx
+        self.warm_reset = warm_reset
+        self.timing = timing
+        self.shm_kwargs = shm_kwargs
+        self.history: list[dict] = []
+        # Durations of background resets (`recycle`), handed over by `report_resets`.
+        self.reset_latency = LatencyHistogram()
+
+        self._spares: deque[SilkSongSharedMemory] = deque()
+        # Spares on their way: booting, or resetting after `recycle`.
+        self._booting = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+        for env_id in spare_ids:
+            self._boot_async(env_id)
+
+    @property
+    def ready_count(self) -> int:
+        with self._condition:
+            return len(self._spares)
+
+    def _boot_async(self, env_id: int, retire: SilkSongSharedMemory = None):
+        with self._condition:
+            self._booting += 1
+        thread = threading.Thread(target=self._boot, args=(env_id, retire), name=f"InstancePool-{env_id}", daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+
+    def _boot(self, env_id: int, retire: SilkSongSharedMemory = None):
+        # The failed instance still holds the shared-memory segment for this env_id.
+        if retire is not None:
+            retire.close()
+
+        shm = None
+        for attempt in range(1, self.BOOT_ATTEMPTS + 1):
+            if self._closed:
+                break
+            try:
+                shm = SilkSongSharedMemory(env_id, self.time_scale, self.nofx, **self.shm_kwargs)
+                if self.warm_reset:
+                    shm.reset(self.timing)
+                break
+            except Exception as e:
+                print(f"[Pool] Spare {env_id} failed to boot (attempt {attempt}/{self.BOOT_ATTEMPTS}): {e}")
+                if shm is not None:
+                    shm.close()
+                shm = None
+
+        with self._condition:
+            self._booting -= 1
+            if shm is not None and not self._closed:
+                self._spares.append(shm)
+                print(f"[Pool] Spare {env_id} ready ({len(self._spares)} available)")
+                shm = None
+            self._condition.notify_all()
+
+        if shm is not None:
+            shm.close()
+
+    def _alive(self, spare: SilkSongSharedMemory) -> bool:
+        if spare.process is None or spare.process.poll() is None:
+            return True
+        # Died while idle: recycle its env_id.
+        print(f"[Pool] Spare {spare.id} exited while idle, replacing it")
+        self._boot_async(spare.id, retire=spare)
+        return False
+
+    def set_episode_timing(self, timing: EpisodeTiming):
+        """Reset spares with `timing` from now on."""
+        self.timing = timing
+
+    def take_ready(self) -> SilkSongSharedMemory:
+        """Pop a live spare without waiting. Returns None if none is ready right now."""
+        while True:
+            with self._condition:
+                if not self._spares:
+                    return None
+                spare = self._spares.popleft()
+            if self._alive(spare):
+                return spare
+
+    def recycle(self, shm: SilkSongSharedMemory):
+        """Reset `shm` in the background and add it to the spares once it is at an episode start."""
+        with self._condition:
+            self._booting += 1
+        thread = threading.Thread(target=self._recycle, args=(shm,), name=f"InstancePool-{shm.id}", daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+
+    def _recycle(self, shm: SilkSongSharedMemory):
+        start = time.perf_counter()
+        try:
+            shm.reset(self.timing)
+        except GameTimeoutError as e:
+            print(f"[Pool] Env {shm.id} failed to reset in the background, replacing it: {e}")
+            with self._condition:
+                self._booting -= 1
+            self._boot_async(shm.id, retire=shm)
+            return
+
+        with self._condition:
+            self._booting -= 1
+            self.reset_latency.record(time.perf_counter() - start)
+            if not self._closed:
+                self._spares.append(shm)
+                shm = None
+            self._condition.notify_all()
+
+        if shm is not None:
+            shm.close()
+
+    def report_resets(self) -> LatencyHistogram:
+        """Hand over the background reset durations recorded since the last call."""
+        with self._condition:
+            histogram = self.reset_latency
+            self.reset_latency = LatencyHistogram()
+        return histogram
+
+    def _take_spare(self) -> SilkSongSharedMemory:
+        """Pop a live spare, waiting for one that is still booting. Returns None if there is none."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._spares or self._booting == 0, timeout=self.SPARE_WAIT_TIMEOUT)
+                if not self._spares:
+                    return None
+                spare = self._spares.popleft()
+
+            if self._alive(spare):
+                return spare
+
+    def replace(self, failed: SilkSongSharedMemory, cause: str = "manual") -> SilkSongSharedMemory:
+        """Swap `failed` for a ready spare. Falls back to restarting it in place when no spare is left."""
+        start = time.monotonic()
+        spare = self._take_spare()
+
+        if spare is None:
+            print(f"[Pool] No spare available, restarting env {failed.id} in place (cause: {cause})")
+            failed.restart(cause=cause)
+            replacement = failed
+        else:
+            print(f"[Pool] Env {failed.id} replaced by spare {spare.id} (cause: {cause})")
+            self._boot_async(failed.id, retire=failed)
+            replacement = spare
+            replacement.restart_history.append(
+                {"cause": cause, "recovery_time": time.monotonic() - start, "time": time.time()}
+            )
+
+        self.history.append({
+            "cause": cause,
+            "failed_id": failed.id,
+            "replacement_id": replacement.id,
+            "from_spare": spare is not None,
+            "recovery_time": replacement.restart_history[-1]["recovery_time"],
+        })
+        return replacement
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            spares = list(self._spares)
+            self._spares.clear()
+            self._condition.notify_all()
+
+        for spare in spares:
+            spare.close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
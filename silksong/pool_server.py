@@ -0,0 +1,362 @@
+"""Long-lived pool of game instances shared by train, tune and evaluate runs.
+
+The daemon boots the games once and leases them to clients by env_id. Clients attach to
+the leased shared-memory segments directly, so stepping never goes through the daemon.
+Released instances are soft-reset (a RESET command) instead of relaunched:
+
+    python -m silksong.pool_server --instances 8 --time_scale 4 --nofx
+    python train.py --vec_env shm --n_envs 8 --pool 127.0.0.1:47800
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from silksong.shared_memory import GameTimeoutError, SilkSongSharedMemory
+
+DEFAULT_ADDRESS = ("127.0.0.1", 47800)
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+
+def default_authkey() -> bytes:
+    return os.getenv("SILKSONG_POOL_AUTHKEY", "silksong").encode()
+
+
+class PoolServer:
+    """Owns the game processes and their shared-memory segments and leases them out.
+
+    Instances move between `booting`, `idle`, `leased` and `resetting` (or `failed` when
+    even a restart does not bring them back). A client that disconnects without releasing
+    its instances has them released for it.
+    """
+
+    LEASE_TIMEOUT = 180.0
+
+    def __init__(self, n_instances: int, time_scale: float = 1.0, nofx: bool = False, first_id: int = 1,
+                 max_instances: int = None, address: tuple[str, int] = DEFAULT_ADDRESS, authkey: bytes = None,
+                 **shm_kwargs):
+        self.time_scale = time_scale
+        self.nofx = nofx
+        self.max_instances = max(max_instances or n_instances, n_instances)
+        self.address = address
+        self.authkey = authkey or default_authkey()
+        self.shm_kwargs = shm_kwargs
+
+        self.instances: dict[int, SilkSongSharedMemory] = {}
+        self.states: dict[int, str] = {}
+        self.owners: dict[int, int] = {}
+        self._next_id = itertools.count(first_id)
+        self._client_ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._listener = None
+        self._running = False
+
+        for _ in range(n_instances):
+            self._boot_async(next(self._next_id))
+
+    def _boot_async(self, env_id: int):
+        with self._condition:
+            self.states[env_id] = "booting"
+        threading.Thread(target=self._boot, args=(env_id,), name=f"PoolServer-boot-{env_id}", daemon=True).start()
+
+    def _boot(self, env_id: int):
+        try:
+            shm = SilkSongSharedMemory(env_id, self.time_scale, self.nofx, **self.shm_kwargs)
+            shm.reset()
+        except Exception as e:
+            print(f"[Pool] Instance {env_id} failed to boot: {e}")
+            with self._condition:
+                del self.states[env_id]
+                self._condition.notify_all()
+            return
+
+        with self._condition:
+            self.instances[env_id] = shm
+            self.states[env_id] = "idle"
+            self._condition.notify_all()
+        print(f"[Pool] Instance {env_id} ready")
+
+    def _soft_reset_async(self, env_id: int, cause: str = None):
+        """Reset (or, with a cause, restart) an instance in the background before it becomes idle again."""
+        with self._condition:
+            self.states[env_id] = "resetting"
+            self.owners.pop(env_id, None)
+        threading.Thread(target=self._soft_reset, args=(env_id, cause), name=f"PoolServer-reset-{env_id}", daemon=True).start()
+
+    def _soft_reset(self, env_id: int, cause: str = None):
+        shm = self.instances[env_id]
+        state = "idle"
+        try:
+            if cause is not None:
+                shm.restart(cause=cause)
+            else:
+                # The lease holder has been stepping the game through its own mapping.
+                shm.resync()
+            try:
+                shm.reset()
+            except GameTimeoutError as e:
+                print(f"[Pool] Instance {env_id} did not reset: {e}")
+                shm.restart(cause=e.cause)
+                shm.reset()
+        except Exception as e:
+            print(f"[Pool] Instance {env_id} is out of service: {e}")
+            state = "failed"
+
+        with self._condition:
+            self.states[env_id] = state
+            self._condition.notify_all()
+
+    def _failure_cause(self, env_id: int, cause: str) -> str:
+        # Clients only see a stalled heartbeat; the daemon can tell a crash from a hang.
+        process = self.instances[env_id].process
+        if process is not None and process.poll() is not None:
+            return "crash"
+        return cause
+
+    def _idle_ids(self) -> list[int]:
+        idle = []
+        for env_id, state in sorted(self.states.items()):
+            if state != "idle":
+                continue
+            process = self.instances[env_id].process
+            if process is not None and process.poll() is not None:
+                print(f"[Pool] Idle instance {env_id} exited, restarting it")
+                self._soft_reset_async(env_id, cause="crash")
+                continue
+            idle.append(env_id)
+        return idle
+
+    def lease(self, client_id: int, count: int, time_scale: float = None, nofx: bool = None) -> list[int]:
+        if time_scale is not None and time_scale != self.time_scale:
+            raise ValueError(f"Pool runs at time scale {self.time_scale}, lease asked for {time_scale}")
+        if nofx is not None and nofx != self.nofx:
+            raise ValueError(f"Pool runs with nofx={self.nofx}, lease asked for nofx={nofx}")
+
+        with self._condition:
+            pending = sum(state in ("booting", "resetting", "idle") for state in self.states.values())
+            grow = min(count - pending, self.max_instances - len(self.states))
+            if count - pending > grow:
+                raise ValueError(
+                    f"Pool has {pending} free of {len(self.states)} instances (max {self.max_instances}), "
+                    f"lease asked for {count}"
+                )
+            for _ in range(max(0, grow)):
+                self._boot_async(next(self._next_id))
+
+            if not self._condition.wait_for(lambda: len(self._idle_ids()) >= count, timeout=self.LEASE_TIMEOUT):
+                raise TimeoutError(f"Pool could not provide {count} instances within {self.LEASE_TIMEOUT:.0f}s")
+
+            env_ids = self._idle_ids()[:count]
+            for env_id in env_ids:
+                self.states[env_id] = "leased"
+                self.owners[env_id] = client_id
+
+        print(f"[Pool] Client {client_id} leased {env_ids}")
+        return env_ids
+
+    def release(self, client_id: int, env_ids: list[int]):
+        for env_id in env_ids:
+            if self.owners.get(env_id) == client_id:
+                self._soft_reset_async(env_id)
+        print(f"[Pool] Client {client_id} released {list(env_ids)}")
+
+    def replace(self, client_id: int, env_id: int, cause: str) -> dict:
+        """Swap a failed leased instance for an idle one, or restart it in place if none is idle."""
+        if self.owners.get(env_id) != client_id:
+            raise ValueError(f"Instance {env_id} is not leased by client {client_id}")
+
+        start = time.monotonic()
+        cause = self._failure_cause(env_id, cause)
+
+        with self._condition:
+            idle = self._idle_ids()
+            if idle:
+                replacement = idle[0]
+                self.states[replacement] = "leased"
+                self.owners[replacement] = client_id
+
+        if idle:
+            self._soft_reset_async(env_id, cause=cause)
+        else:
+            replacement = env_id
+            shm = self.instances[env_id]
+            shm.restart(cause=cause)
+
+        print(f"[Pool] Client {client_id}: instance {env_id} replaced by {replacement} (cause: {cause})")
+        return {"env_id": replacement, "cause": cause, "recovery_time": time.monotonic() - start}
+
+    def status(self) -> dict:
+        with self._condition:
+            return {
+                "time_scale": self.time_scale,
+                "nofx": self.nofx,
+                "max_instances": self.max_instances,
+                "states": dict(self.states),
+                "owners": dict(self.owners),
+            }
+
+    def _dispatch(self, client_id: int, message: dict):
+        op = message.get("op")
+        if op == "lease":
+            return self.lease(client_id, message["count"], message.get("time_scale"), message.get("nofx"))
+        if op == "release":
+            return self.release(client_id, message["env_ids"])
+        if op == "replace":
+            return self.replace(client_id, message["env_id"], message["cause"])
+        if op == "status":
+            return self.status()
+        if op == "shutdown":
+            self._running = False
+            # Wake the accept loop so it notices.
+            Client(self.address, authkey=self.authkey).close()
+            return None
+        raise ValueError(f"Unknown pool operation: {op}")
+
+    def _serve_client(self, conn):
+        client_id = next(self._client_ids)
+        try:
+            while True:
+                message = conn.recv()
+                try:
+                    conn.send({"ok": True, "result": self._dispatch(client_id, message)})
+                except Exception as e:
+                    conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            leased = [env_id for env_id, owner in list(self.owners.items()) if owner == client_id]
+            if leased:
+                self.release(client_id, leased)
+
+    def serve_forever(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self._running = True
+        print(f"[Pool] Listening on {self.address[0]}:{self.address[1]}")
+        try:
+            while self._running:
+                try:
+                    conn = self._listener.accept()
+                except OSError as e:
+                    print(f"[Pool] Rejected connection: {e}")
+                    continue
+                if not self._running:
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+            self.close()
+
+    def close(self):
+        self._running = False
+        for shm in list(self.instances.values()):
+            shm.close()
+        self.instances.clear()
+        self.states.clear()
+
+
+class PoolClient:
+    """Client side of `PoolServer`. Implements `replace` like `InstancePool`, so envs accept either."""
+
+    def __init__(self, address: tuple[str, int] = DEFAULT_ADDRESS, authkey: bytes = None):
+        self.address = address
+        self._conn = Client(address, authkey=authkey or default_authkey())
+        self._lock = threading.Lock()
+        self.leased: list[int] = []
+
+    def _request(self, op: str, **kwargs):
+        with self._lock:
+            self._conn.send({"op": op, **kwargs})
+            reply = self._conn.recv()
+        if not reply["ok"]:
+            raise RuntimeError(f"[Pool] {op} failed: {reply['error']}")
+        return reply["result"]
+
+    def lease(self, count: int = 1, time_scale: float = None, nofx: bool = None) -> list[int]:
+        env_ids = self._request("lease", count=count, time_scale=time_scale, nofx=nofx)
+        self.leased += env_ids
+        return env_ids
+
+    def release(self, env_ids: list[int]):
+        self._request("release", env_ids=list(env_ids))
+        self.leased = [env_id for env_id in self.leased if env_id not in env_ids]
+
+    def status(self) -> dict:
+        return self._request("status")
+
+    def replace(self, failed: SilkSongSharedMemory, cause: str = "manual") -> SilkSongSharedMemory:
+        result = self._request("replace", env_id=failed.id, cause=cause)
+
+        if result["env_id"] == failed.id:
+            replacement = failed
+            # The daemon relaunched the game, so its sequence numbers started over.
+            replacement.resync()
+        else:
+            self.leased = [env_id for env_id in self.leased if env_id != failed.id] + [result["env_id"]]
+            replacement = SilkSongSharedMemory(
+                result["env_id"], failed.time_scale, failed.nofx, timeout_ms=failed.timeout_ms,
+                wait_mode=failed.wait_mode, hang_timeout_ms=failed.hang_timeout_ms, attach=True,
+            )
+            replacement.restart_history = failed.restart_history
+            failed.close()
+
+        replacement.restart_history.append(
+            {"cause": result["cause"], "recovery_time": result["recovery_time"], "time": time.time()}
+        )
+        return replacement
+
+    def shutdown(self):
+        """Stop the daemon and close every game it owns."""
+        self._request("shutdown")
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            if self.leased:
+                self.release(self.leased)
+        except (EOFError, OSError, RuntimeError):
+            pass
+        self._conn.close()
+        self._conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep game instances alive across train, tune and evaluate runs")
+    parser.add_argument("--instances", type=int, default=1, help="Instances booted at start-up")
+    parser.add_argument("--max_instances", type=int, default=None, help="Upper bound when leases ask for more")
+    parser.add_argument("--time_scale", type=float, default=4.0)
+    parser.add_argument("--nofx", action="store_true")
+    parser.add_argument("--first_id", type=int, default=1, help="env_id of the first instance")
+    parser.add_argument("--address", type=str, default=f"{DEFAULT_ADDRESS[0]}:{DEFAULT_ADDRESS[1]}")
+    parser.add_argument("--simulator", action="store_true", help="Run the stand-in game instead of Silksong")
+    parser.add_argument("--simulator_args", type=str, nargs=argparse.REMAINDER, default=[],
+                        help="Arguments passed to every simulator (must come last)")
+
+    args = parser.parse_args()
+
+    server = PoolServer(
+        args.instances,
+        time_scale=args.time_scale,
+        nofx=args.nofx,
+        first_id=args.first_id,
+        max_instances=args.max_instances,
+        address=parse_address(args.address),
+        simulator=args.simulator,
+        simulator_args=args.simulator_args,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
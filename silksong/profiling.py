@@ -0,0 +1,171 @@
+"""Low-overhead per-phase latency instrumentation.
+
+Phases of a step are timed with `time.perf_counter` laps into streaming log-bucket
+histograms (8 buckets per doubling, about 9% resolution, 1us to ~3 days), so
+percentiles cost no memory per sample. Only every `sample_every`-th step is timed;
+unsampled steps go through a no-op timer. Envs hand their histograms over in
+`info["latency"]` every `report_every` steps, and `silksong.networks.LatencyCallback`
+merges and logs them.
+"""
+import math
+import time
+
+import numpy as np
+
+# Timing every step costs a few microseconds per phase; one step in eight keeps the
+# overhead below the noise of a replayed (game-free) step.
+DEFAULT_PROFILE_EVERY = 8
+
+
+class LatencyHistogram:
+    """Streaming histogram of durations in seconds, with log-spaced buckets."""
+
+    BUCKETS_PER_OCTAVE = 8
+    MIN_SECONDS = 1e-6
+    NUM_BUCKETS = 8 * 38
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * self.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds > self.MIN_SECONDS:
+            index = min(int(math.log2(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_OCTAVE), self.NUM_BUCKETS - 1)
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Approximate `q`-th percentile (0-100): the geometric middle of the bucket it falls in."""
+        if self.count == 0:
+            return 0.0
+        cumulative = np.cumsum(self.counts)
+        index = int(np.searchsorted(cumulative, q / 100.0 * self.count))
+        index = min(index, self.NUM_BUCKETS - 1)
+        seconds = self.MIN_SECONDS * 2.0 ** ((index + 0.5) / self.BUCKETS_PER_OCTAVE)
+        return min(seconds, self.max)
+
+    def summary(self) -> dict:
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "mean": self.mean,
+            "max": self.max,
+            "count": self.count,
+        }
+
+    def __getstate__(self):
+        return self.counts, self.count, self.total, self.max
+
+    def __setstate__(self, state):
+        self.counts, self.count, self.total, self.max = state
+
+
+class _PhaseTimer:
+    __slots__ = ("profiler", "start", "last")
+
+    def __init__(self, profiler: "StepProfiler"):
+        self.profiler = profiler
+        self.start = self.last = time.perf_counter()
+
+    def lap(self, phase: str):
+        """Record the time since the previous lap (or the start) under `phase`."""
+        now = time.perf_counter()
+        self.profiler.record(phase, now - self.last)
+        self.last = now
+
+    def total(self, phase: str):
+        """Record the time since the start under `phase`."""
+        self.profiler.record(phase, time.perf_counter() - self.start)
+
+    def mark(self):
+        """Restart the lap clock without recording, e.g. after working on other envs."""
+        self.last = time.perf_counter()
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, phase: str):
+        pass
+
+    def total(self, phase: str):
+        pass
+
+    def mark(self):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class StepProfiler:
+    """Per-env phase histograms, timed on every `sample_every`-th step (0 disables timing).
+
+    `start_step` returns the timer for the step (a no-op one when the step is not
+    sampled) and exposes it as `timer`, so code further down the call chain, such as
+    `SilkSongSharedMemory.step`, can add its own laps to the same step.
+    """
+
+    def __init__(self, sample_every: int = DEFAULT_PROFILE_EVERY, report_every: int = 1000):
+        self.sample_every = sample_every
+        self.report_every = report_every
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.timer = NULL_TIMER
+        self._steps = 0
+        self._steps_since_report = 0
+
+    def start_step(self):
+        self._steps += 1
+        self._steps_since_report += 1
+        if self.sample_every > 0 and self._steps % self.sample_every == 0:
+            self.timer = _PhaseTimer(self)
+        else:
+            self.timer = NULL_TIMER
+        return self.timer
+
+    def end_step(self, phase: str = "step"):
+        """Record the whole step under `phase` and stop handing out its timer."""
+        self.timer.total(phase)
+        self.timer = NULL_TIMER
+
+    def start(self):
+        """A timer that ignores sampling, for rare events such as resets and restarts."""
+        return _PhaseTimer(self) if self.sample_every > 0 else NULL_TIMER
+
+    def record(self, phase: str, seconds: float):
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @property
+    def report_due(self) -> bool:
+        return self.report_every > 0 and self._steps_since_report >= self.report_every
+
+    def report(self) -> dict[str, LatencyHistogram]:
+        """Hand over the histograms collected since the last report and start new ones."""
+        histograms = self.histograms
+        self.histograms = {}
+        self._steps_since_report = 0
+        return histograms
+
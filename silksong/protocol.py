@@ -0,0 +1,170 @@
+"""The structs shared with the plugin, declared once.
+
+`GAME_STATE` and `COMMAND` list the fields of the C# `GameState` and `CommandData`
+structs in memory order. The NumPy dtype, the `struct` formats and the `GameState`
+decoder on the Python side are derived from them at import, and
+`python -m scripts.generate_protocol` writes the C# structs, enums and layout constants
+to `plugin/Source/Core/Protocol.g.cs` (`--check` fails when that file has drifted).
+Adding a field to the per-step state is a line here, a `GameState` attribute, the
+generator run and the code that fills it in on the plugin side.
+
+Field kinds are 4-byte floats, 4-byte ints and one-byte bools. Offsets follow C
+alignment (NumPy `align=True`): every field starts at a multiple of its size, and the
+struct is padded to a multiple of its largest field. The C# structs use these offsets
+explicitly, so both sides agree byte for byte whatever the struct packing.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from silksong.constants import NUM_RAYS
+
+# kind -> (NumPy type, struct code, C# type)
+KINDS = {
+    "float": ("<f4", "f", "float"),
+    "int": ("<i4", "i", "int"),
+    "bool": ("u1", "?", "byte"),
+}
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    kind: str
+    count: int = 1
+
+    @property
+    def csharp_name(self) -> str:
+        head, *rest = self.name.split("_")
+        return head + "".join(part.capitalize() for part in rest)
+
+
+class Struct:
+    """A fixed-layout struct: its dtype, offsets, `struct` format and C# declaration."""
+
+    def __init__(self, name: str, fields: tuple[Field, ...], aligned: bool = True):
+        for field in fields:
+            if field.kind not in KINDS:
+                raise ValueError(f"{name}.{field.name}: unknown kind {field.kind!r}")
+        self.name = name
+        self.fields = fields
+        self.names = tuple(field.name for field in fields)
+        self.dtype = np.dtype([
+            (field.name, KINDS[field.kind][0], (field.count,)) if field.count > 1
+            else (field.name, KINDS[field.kind][0])
+            for field in fields
+        ], align=aligned)
+        self.size = self.dtype.itemsize
+
+    def offset(self, name: str) -> int:
+        return self.dtype.fields[name][1]
+
+    def struct_format(self, start: str = None, stop: str = None) -> str:
+        """Little-endian `struct` format of the fields from `start` up to (not including) `stop`, padding spelled out."""
+        position = self.offset(start) if start is not None else 0
+        end = self.offset(stop) if stop is not None else self.size
+        parts = ["<"]
+        for field in self.fields:
+            offset = self.offset(field.name)
+            if offset < position:
+                continue
+            if offset >= end:
+                break
+            parts.append("x" * (offset - position))
+            code = KINDS[field.kind][1]
+            parts.append(f"{field.count}{code}" if field.count > 1 else code)
+            position = offset + self.dtype.fields[field.name][0].itemsize
+        parts.append("x" * (end - position))
+        return "".join(parts)
+
+    def decoder_source(self) -> str:
+        """Source of `from_record(cls, record)`: one `record.item()` and a positional constructor call.
+
+        Bools become Python bools; array fields are copied as float32 arrays, the
+        observation type.
+        """
+        args = []
+        for index, field in enumerate(self.fields):
+            if field.count > 1:
+                value = f"data[{index}]" if field.kind == "float" else f"data[{index}].astype(np.float32)"
+            elif field.kind == "bool":
+                value = f"bool(data[{index}])"
+            else:
+                value = f"data[{index}]"
+            args.append(f"        {field.name}={value},")
+        return "\n".join([
+            "def from_record(cls, record):",
+            "    data = record.item()",
+            "    return cls(",
+            *args,
+            "    )",
+        ])
+
+    def build_decoder(self):
+        namespace = {"np": np}
+        exec(compile(self.decoder_source(), f"<{self.name} decoder>", "exec"), namespace)
+        return namespace["from_record"]
+
+    def csharp(self, indent: str = "") -> list[str]:
+        """Explicit-layout C# struct with the dtype offsets."""
+        unsafe = "unsafe " if any(field.count > 1 for field in self.fields) else ""
+        lines = [
+            f"{indent}[StructLayout(LayoutKind.Explicit, Size = {self.size})]",
+            f"{indent}public {unsafe}struct {self.name}",
+            f"{indent}{{",
+        ]
+        for field in self.fields:
+            ctype = KINDS[field.kind][2]
+            declaration = f"public {ctype} {field.csharp_name};"
+            if field.count > 1:
+                declaration = f"public fixed {ctype} {field.csharp_name}[{field.count}];"
+            lines.append(f"{indent}    [FieldOffset({self.offset(field.name)})] {declaration}")
+        lines.append(f"{indent}}}")
+        return lines
+
+
+GAME_STATE = Struct("GameState", (
+    Field("player_pos_x", "float"),
+    Field("player_pos_y", "float"),
+    Field("player_vel_x", "float"),
+    Field("player_vel_y", "float"),
+    Field("player_health", "int"),
+    Field("player_max_health", "int"),
+    Field("player_silk", "int"),
+    Field("player_animation_state", "int"),
+    Field("player_animation_progress", "float"),
+    Field("player_grounded", "bool"),
+    Field("player_can_dash", "bool"),
+    Field("player_facing_right", "bool"),
+    Field("player_invincible", "bool"),
+    Field("player_can_attack", "bool"),
+    Field("boss_pos_x", "float"),
+    Field("boss_pos_y", "float"),
+    Field("boss_vel_x", "float"),
+    Field("boss_vel_y", "float"),
+    Field("boss_health", "int"),
+    Field("boss_max_health", "int"),
+    Field("boss_phase", "int"),
+    Field("boss_animation_state", "int"),
+    Field("boss_animation_progress", "float"),
+    Field("boss_facing_right", "bool"),
+    Field("episode_time", "float"),
+    Field("terminated", "bool"),
+    Field("truncated", "bool"),
+    Field("raycast_distances", "float", NUM_RAYS),
+    Field("raycast_hit_types", "int", NUM_RAYS),
+))
+
+# The buttons, in `SilkSongSharedMemory.send_command` / chunk-action order.
+BUTTONS = ("left", "right", "up", "down", "jump", "attack", "dash", "clawline", "skill", "heal")
+
+# Packed: commandReady sits right after the last button. The episode timing of a RESET
+# (protocol 3) follows it, where plugins and clients of protocol 2 never look; 0 asks for
+# the plugin's defaults (Constants.FramesPerStep and the launch time scale).
+COMMAND = Struct("CommandData", (
+    Field("command_type", "int"),
+    *(Field(button, "bool") for button in BUTTONS),
+    Field("command_ready", "int"),
+    Field("frames_per_step", "int"),
+    Field("time_scale", "float"),
+), aligned=False)
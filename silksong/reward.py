@@ -0,0 +1,256 @@
+from dataclasses import asdict, dataclass
+from typing import Sequence
+
+import numpy as np
+
+from silksong.constants import BOSS_MAX_HEALTH, MAX_EPISODE_STEPS, PLAYER_MAX_HEALTH
+from silksong.shared_memory import GameState
+
+
+@dataclass(frozen=True)
+class RewardConfig:
+    """Reward coefficients. The defaults are the shaping the agent has always been trained with."""
+
+    hit: float = 1.0
+    stunned_hit: float = 2.0
+    hurt: float = 1.0
+    stunned_hurt: float = 2.0
+    # Per unit of silk spent / mask healed.
+    silk_cost: float = 0.05
+    heal: float = 1.0
+    # Charged on steps where nothing was hit, lost or healed.
+    idle: float = 0.001
+    far_distance: float = 15.0
+    far_penalty: float = 0.001
+    near_distance: float = 1.0
+    near_penalty: float = 0.001
+    # Win: health_bonus * health left + time_bonus * min(1, time_bonus_seconds / episode_time).
+    health_bonus: float = 1.0
+    time_bonus: float = 1.0
+    time_bonus_seconds: float = 100.0
+    # Loss: loss_penalty * boss health left.
+    loss_penalty: float = 1.0
+    stunned_animation_state: int = 16
+    max_episode_steps: int = MAX_EPISODE_STEPS
+
+    @classmethod
+    def from_dict(cls, overrides: dict) -> "RewardConfig":
+        unknown = set(overrides) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown reward coefficients: {', '.join(sorted(unknown))}")
+        return cls(**overrides)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+DEFAULT_REWARD_CONFIG = RewardConfig()
+
+
+def calculate_reward(game_state: GameState, prev_boss_health: int, prev_player_health: int,
+                     prev_player_silk: int,
+                     config: RewardConfig = DEFAULT_REWARD_CONFIG) -> tuple[float, bool, bool, bool]:
+    """Step reward for `game_state` given the previous step's values.
+
+    Returns (reward, hit, hurt, healed) so callers can keep their own episode counters.
+    """
+    boss_dmg = prev_boss_health - game_state.boss_health
+    player_dmg = prev_player_health - game_state.player_health
+    health_gained = game_state.player_health - prev_player_health
+
+    hurt = player_dmg > 0
+    hit = boss_dmg > 0
+    boss_stunned = game_state.boss_animation_state == config.stunned_animation_state
+    silk_used = prev_player_silk - game_state.player_silk
+
+    reward = 0.0
+
+    if hit:
+        if boss_stunned:
+            reward += config.stunned_hit
+        else:
+            reward += config.hit
+    if hurt:
+        if boss_stunned:
+            reward -= config.stunned_hurt
+        else:
+            reward -= config.hurt
+
+    if silk_used > 0:
+        reward -= config.silk_cost * silk_used
+
+    if health_gained > 0:
+        reward += config.heal * health_gained
+
+    if not (hurt or hit or health_gained > 0):
+        reward -= config.idle
+
+    rel_x = game_state.boss_pos_x - game_state.player_pos_x
+    rel_y = game_state.boss_pos_y - game_state.player_pos_y
+    distance_to_boss = np.sqrt(rel_x ** 2 + rel_y ** 2)
+
+    if distance_to_boss > config.far_distance:
+        reward -= config.far_penalty
+    if distance_to_boss < config.near_distance:
+        reward -= config.near_penalty
+
+    win = game_state.boss_health <= 0
+    lose = game_state.player_health <= 0
+
+    if win:
+        health_bonus = game_state.player_health / PLAYER_MAX_HEALTH
+        time_bonus = min(1.0, config.time_bonus_seconds / max(game_state.episode_time, 1.0))
+        reward += config.health_bonus * health_bonus + config.time_bonus * time_bonus
+    elif lose:
+        boss_remaining = game_state.boss_health / BOSS_MAX_HEALTH
+        reward -= config.loss_penalty * boss_remaining
+
+    return reward, hit, hurt, health_gained > 0
+
+
+class RewardKernel:
+    """`calculate_reward`, the termination checks and the episode counters for `n_envs` games at once.
+
+    Works on `(n_envs,)` `GAME_STATE_DTYPE` record arrays and gives bit-identical results to
+    `calculate_reward`. Each reward term is a row of an `(8, n_envs)` float64 matrix, and the
+    rows are summed with a sequential `np.add.accumulate`, so the additions happen in the
+    scalar order. A row is zero where the scalar code skips that term, and adding a zero
+    does not change the sum. The idle term comes before the silk term. This is safe because
+    the idle term is only nonzero when the hit, hurt and heal terms are zero. Counters are
+    public arrays indexed by env. `step` returns buffers owned by the kernel.
+    """
+
+    # Rows of the term matrix (`terms`, kept after each step), in summation order.
+    TERM_NAMES = ("hit", "hurt", "idle", "silk", "heal", "far", "near", "end")
+    HIT, HURT, IDLE, SILK, HEAL, FAR, NEAR, END = range(8)
+
+    def __init__(self, n_envs: int = 1, config: RewardConfig = None):
+        self.n_envs = n_envs
+        self.config = config = config or DEFAULT_REWARD_CONFIG
+
+        # Rows: boss health, player health, player silk.
+        self._prev = np.zeros((3, n_envs), dtype=np.int64)
+        self._current = np.zeros((3, n_envs), dtype=np.int64)
+        self._delta = np.zeros((3, n_envs), dtype=np.int64)
+        self.prev_boss_health, self.prev_player_health, self.prev_player_silk = self._prev
+        self.total_steps = np.zeros(n_envs, dtype=np.int64)
+
+        # Rows: hit, hurt, healed, so one add updates all three counters.
+        self._counts = np.zeros((3, n_envs), dtype=np.int64)
+        self.attack_count, self.hurt_count, self.heal_count = self._counts
+        self.episode_reward = np.zeros(n_envs, dtype=np.float64)
+        self.lowest_boss_hp = np.zeros(n_envs, dtype=np.int64)
+
+        # Hit, hurt and idle terms for every (hit, hurt, healed, stunned) combination,
+        # indexed by the flags packed into bits 0-3.
+        events = np.zeros((3, 16), dtype=np.float64)
+        for index in range(16):
+            hit, hurt, healed, stunned = (index >> bit & 1 for bit in range(4))
+            if hit:
+                events[0, index] = config.stunned_hit if stunned else config.hit
+            if hurt:
+                events[1, index] = -config.stunned_hurt if stunned else -config.hurt
+            if not (hit or hurt or healed):
+                events[2, index] = -config.idle
+        self._event_terms = events
+        self._distance_penalties = np.array([[-config.far_penalty], [-config.near_penalty]])
+
+        self._flags = np.zeros((4, n_envs), dtype=bool)
+        self._distance_flags = np.zeros((2, n_envs), dtype=bool)
+        self._ended = np.zeros((2, n_envs), dtype=bool)
+        self._relative = np.zeros((2, n_envs), dtype=np.float64)
+        self._distance = np.zeros(n_envs, dtype=np.float64)
+        self._gains = np.zeros(n_envs, dtype=np.int64)
+        self.terms = np.zeros((8, n_envs), dtype=np.float64)
+        self._partial_sums = np.zeros((8, n_envs), dtype=np.float64)
+
+        self.rewards = self._partial_sums[-1]
+        self.terminated = np.zeros(n_envs, dtype=bool)
+        self.truncated = np.zeros(n_envs, dtype=bool)
+
+    def reset(self, records: np.ndarray, indices: Sequence[int] = None):
+        """Start new episodes from the reset states in `records` (one per index, all envs by default)."""
+        if indices is None:
+            indices = slice(None)
+        self.prev_boss_health[indices] = records["boss_health"]
+        self.prev_player_health[indices] = records["player_health"]
+        self.prev_player_silk[indices] = records["player_silk"]
+        self.total_steps[indices] = 0
+
+        self._counts[:, indices] = 0
+        self.episode_reward[indices] = 0.0
+        self.lowest_boss_hp[indices] = records["boss_health"]
+
+    def ends_episode(self, i: int, record: np.ndarray) -> bool:
+        """Whether the next `step` will terminate or truncate env `i` on `record`, before the batch is scored."""
+        return bool(record["boss_health"] <= 0 or record["player_health"] <= 0 or record["truncated"]
+                    or self.total_steps[i] + 1 >= self.config.max_episode_steps)
+
+    def step(self, records: np.ndarray, timed_out: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Score one step of every env. Returns (rewards, terminated, truncated).
+
+        Envs flagged in `timed_out` were restarted instead of stepped: they get no reward,
+        are truncated, and keep their counters; `records` holds their fresh state.
+        """
+        config = self.config
+        current, delta, flags, terms = self._current, self._delta, self._flags, self.terms
+        current[0] = records["boss_health"]
+        current[1] = records["player_health"]
+        current[2] = records["player_silk"]
+        self.total_steps += 1
+
+        # Damage dealt, damage taken and silk spent. Health gained is minus damage taken.
+        np.subtract(self._prev, current, out=delta)
+        np.greater(delta[:2], 0, out=flags[:2])
+        np.less(delta[1], 0, out=flags[2])
+        np.equal(records["boss_animation_state"], config.stunned_animation_state, out=flags[3])
+        events = np.packbits(flags, axis=0, bitorder="little")[0]
+        np.take(self._event_terms, events, axis=1, out=terms[self.HIT:self.IDLE + 1], mode="clip")
+
+        np.maximum(delta[2], 0, out=self._gains)
+        np.multiply(self._gains, -config.silk_cost, out=terms[self.SILK])
+        np.minimum(delta[1], 0, out=self._gains)
+        np.multiply(self._gains, -config.heal, out=terms[self.HEAL])
+
+        relative, distance = self._relative, self._distance
+        np.subtract(records["boss_pos_x"], records["player_pos_x"], out=relative[0], dtype=np.float64)
+        np.subtract(records["boss_pos_y"], records["player_pos_y"], out=relative[1], dtype=np.float64)
+        np.multiply(relative, relative, out=relative)
+        np.add(relative[0], relative[1], out=distance)
+        np.sqrt(distance, out=distance)
+        np.greater(distance, config.far_distance, out=self._distance_flags[0])
+        np.less(distance, config.near_distance, out=self._distance_flags[1])
+        np.multiply(self._distance_flags, self._distance_penalties, out=terms[self.FAR:self.NEAR + 1])
+
+        # Win and loss: boss or player health at or below zero. Rare, so only the ended envs are scored.
+        np.less_equal(current[:2], 0, out=self._ended)
+        np.logical_or(self._ended[0], self._ended[1], out=self.terminated)
+        terms[self.END].fill(0.0)
+        if np.count_nonzero(self.terminated):
+            ended = np.flatnonzero(self.terminated)
+            win = self._ended[0, ended]
+            player_health, boss_health = current[1, ended], current[0, ended]
+            episode_time = records["episode_time"][ended].astype(np.float64)
+            time_bonus = np.minimum(1.0, config.time_bonus_seconds / np.maximum(episode_time, 1.0))
+            win_bonus = config.health_bonus * (player_health / PLAYER_MAX_HEALTH) + config.time_bonus * time_bonus
+            loss_penalty = -(config.loss_penalty * (boss_health / BOSS_MAX_HEALTH))
+            terms[self.END, ended] = np.where(win, win_bonus, loss_penalty)
+
+        np.add.accumulate(terms, axis=0, out=self._partial_sums)
+        np.greater_equal(self.total_steps, config.max_episode_steps, out=self.truncated)
+        np.logical_or(self.truncated, records["truncated"], out=self.truncated)
+
+        lowest = current[0]
+        if timed_out is not None and np.count_nonzero(timed_out):
+            self.rewards[timed_out] = 0.0
+            self.terminated[timed_out] = False
+            self.truncated[timed_out] = True
+            flags[:, timed_out] = False
+            lowest = np.where(timed_out, self.lowest_boss_hp, lowest)
+
+        self._counts += flags[:3]
+        self.episode_reward += self.rewards
+        np.minimum(self.lowest_boss_hp, lowest, out=self.lowest_boss_hp)
+        self._prev[:] = current
+
+        return self.rewards, self.terminated, self.truncated
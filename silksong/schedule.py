@@ -0,0 +1,68 @@
+from dataclasses import dataclass
+
+from silksong.shared_memory import EpisodeTiming
+
+
+def parse_schedule(text: str, cast: type) -> list[tuple[int, object]]:
+    """Parse "value[,value@timestep]...", e.g. "4,2@2000000", into (timestep, value) pairs.
+
+    The first value applies from timestep 0; each later one from its timestep on.
+    """
+    milestones = []
+    for index, entry in enumerate(part.strip() for part in text.split(",")):
+        value, _, timestep = entry.partition("@")
+        if index == 0 and timestep:
+            raise ValueError(f"{text!r}: the first value applies from the start and takes no @timestep")
+        if index > 0 and not timestep:
+            raise ValueError(f"{text!r}: {entry!r} needs an @timestep")
+        timestep = int(float(timestep)) if timestep else 0
+        if milestones and timestep <= milestones[-1][0]:
+            raise ValueError(f"{text!r}: timesteps must increase")
+        milestones.append((timestep, cast(value)))
+    return milestones
+
+
+@dataclass(frozen=True)
+class TimingSchedule:
+    """Episode timing by training progress, as (timestep, EpisodeTiming) pairs starting at 0.
+
+    Coarse steps early in training trade fidelity for throughput; finer ones later let the
+    policy react frame by frame. A new timing applies to the episodes that start after the
+    timestep it is set at.
+    """
+
+    milestones: tuple[tuple[int, EpisodeTiming], ...] = ((0, EpisodeTiming()),)
+
+    @classmethod
+    def parse(cls, frames_per_step: str = None, time_scale: str = None) -> "TimingSchedule":
+        """Combine a frames-per-step and a time-scale schedule (see `parse_schedule`); None keeps the defaults."""
+        frames = parse_schedule(frames_per_step, int) if frames_per_step else [(0, None)]
+        scales = parse_schedule(time_scale, float) if time_scale else [(0, None)]
+        timesteps = sorted({timestep for timestep, _ in frames + scales})
+        return cls(tuple(
+            (timestep, EpisodeTiming(_value_at(frames, timestep), _value_at(scales, timestep)))
+            for timestep in timesteps
+        ))
+
+    @property
+    def initial(self) -> EpisodeTiming:
+        return self.milestones[0][1]
+
+    @property
+    def final(self) -> EpisodeTiming:
+        return self.milestones[-1][1]
+
+    def at(self, timestep: int) -> EpisodeTiming:
+        return _value_at(self.milestones, timestep)
+
+    def __str__(self) -> str:
+        return "; ".join(f"{timing} from step {timestep:,}" for timestep, timing in self.milestones)
+
+
+def _value_at(milestones: list, timestep: int):
+    value = milestones[0][1]
+    for start, candidate in milestones:
+        if start > timestep:
+            break
+        value = candidate
+    return value
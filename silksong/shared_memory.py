@@ -1,5 +1,6 @@
 import atexit
 import ctypes
+import errno
 import mmap
 import os
 import platform
@@ -7,6 +8,7 @@ import shutil
 import signal
 import struct
 import subprocess
+import sys
 import time
 from enum import IntEnum
 from multiprocessing import shared_memory
@@ -15,6 +17,9 @@ from pathlib import Path
 
 import numpy as np
 
+from silksong.profiling import NULL_TIMER
+from silksong.protocol import BUTTONS, COMMAND, GAME_STATE
+
 IS_WINDOWS = platform.system() == "Windows"
 IS_LINUX = platform.system() == "Linux"
 
@@ -26,9 +31,88 @@ if IS_WINDOWS:
     INFINITE = 0xFFFFFFFF
     EVENT_ALL_ACCESS = 0x1F0003
 
+SYS_FUTEX = None
+SYS_FUTEX_WAITV = None
+
+if IS_LINUX:
+    libc = ctypes.CDLL(None, use_errno=True)
+    SYS_FUTEX = {"x86_64": 202, "aarch64": 98, "arm64": 98}.get(platform.machine())
+    # Linux 5.16+; the same number on both architectures.
+    SYS_FUTEX_WAITV = {"x86_64": 449, "aarch64": 449, "arm64": 449}.get(platform.machine())
+    FUTEX_WAIT = 0
+    FUTEX_WAKE = 1
+    FUTEX_32 = 2
+    FUTEX_WAITV_MAX = 128
+
+    class _Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    class _FutexWaitv(ctypes.Structure):
+        _fields_ = [("val", ctypes.c_uint64), ("uaddr", ctypes.c_uint64),
+                    ("flags", ctypes.c_uint32), ("reserved", ctypes.c_uint32)]
+
+
+def futex_wait(address: int, expected: int, timeout_ms: int) -> bool:
+    """Sleep while the int at `address` equals `expected`. Returns False on timeout."""
+    timeout = _Timespec(timeout_ms // 1000, (timeout_ms % 1000) * 1_000_000)
+    result = libc.syscall(
+        ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_int(FUTEX_WAIT),
+        ctypes.c_int(expected), ctypes.byref(timeout), None, ctypes.c_int(0),
+    )
+    if result == -1:
+        error = ctypes.get_errno()
+        if error == errno.ETIMEDOUT:
+            return False
+        if error not in (errno.EAGAIN, errno.EINTR):
+            raise OSError(error, os.strerror(error))
+    return True
+
+
+def futex_wake(address: int) -> int:
+    """Wake every process sleeping on the int at `address`."""
+    return libc.syscall(
+        ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_int(FUTEX_WAKE),
+        ctypes.c_int(0x7FFFFFFF), None, None, ctypes.c_int(0),
+    )
+
+
+def futex_waitv(addresses: list[int], expected: list[int], timeout_ms: float = None) -> bool:
+    """Sleep until one of the ints at `addresses` is woken, or already differs from its `expected` value.
+
+    Waits on at most FUTEX_WAITV_MAX words at once, forever without a timeout. Returns False
+    on timeout. Raises OSError(ENOSYS) on kernels without the syscall.
+    """
+    waiters = (_FutexWaitv * len(addresses))(*(
+        _FutexWaitv(value & 0xFFFFFFFF, address, FUTEX_32, 0) for address, value in zip(addresses, expected)
+    ))
+    timeout = None
+    if timeout_ms is not None:
+        # futex_waitv takes an absolute CLOCK_MONOTONIC deadline.
+        deadline = time.clock_gettime_ns(time.CLOCK_MONOTONIC) + int(timeout_ms * 1_000_000)
+        timeout = ctypes.byref(_Timespec(deadline // 1_000_000_000, deadline % 1_000_000_000))
+    result = libc.syscall(
+        ctypes.c_long(SYS_FUTEX_WAITV), waiters, ctypes.c_uint(len(addresses)), ctypes.c_uint(0),
+        timeout, ctypes.c_int(time.CLOCK_MONOTONIC),
+    )
+    if result == -1:
+        error = ctypes.get_errno()
+        if error == errno.ETIMEDOUT:
+            return False
+        if error not in (errno.EAGAIN, errno.EINTR):
+            raise OSError(error, os.strerror(error))
+    return True
+
 
 class GameTimeoutError(Exception):
-    pass
+    cause = "timeout"
+
+
+class GameCrashedError(GameTimeoutError):
+    cause = "crash"
+
+
+class GameHungError(GameTimeoutError):
+    cause = "hang"
 
 
 from silksong.constants import (
@@ -76,6 +160,7 @@ class CommandType(IntEnum):
     NONE = 0
     STEP = 1
     RESET = 2
+    STEP_CHUNK = 3
 
 
 class StateType(IntEnum):
@@ -85,6 +170,16 @@ class StateType(IntEnum):
     RESET = 3
 
 
+GAME_STATE_DTYPE = GAME_STATE.dtype
+# `GameState.from_record`, generated from the schema (see `silksong.protocol`).
+_decode_game_state = GAME_STATE.build_decoder()
+
+
+def game_state_view(buffer, offset: int = 0) -> np.ndarray:
+    """Zero-copy 0-d record over a C# `GameState` block. Fields change as the game writes."""
+    return np.ndarray(shape=(), dtype=GAME_STATE_DTYPE, buffer=buffer, offset=offset)
+
+
 @dataclass
 class GameState:
     player_pos_x: float
@@ -122,6 +217,11 @@ class GameState:
 
     MAX_DISTANCE = np.sqrt((ARENA_MAX_X - ARENA_MIN_X) ** 2 + (ARENA_MAX_Y - ARENA_MIN_Y) ** 2)
 
+    @classmethod
+    def from_record(cls, record: np.ndarray) -> "GameState":
+        """Copy a `GAME_STATE_DTYPE` record into a standalone GameState."""
+        return _decode_game_state(cls, record)
+
     def to_observation(self) -> np.ndarray:
         norm_player_x = (self.player_pos_x - ARENA_MIN_X) / (ARENA_MAX_X - ARENA_MIN_X)
         norm_player_y = (self.player_pos_y - ARENA_MIN_Y) / (ARENA_MAX_Y - ARENA_MIN_Y)
@@ -192,25 +292,107 @@ class GameState:
         return observe
 
 
+assert tuple(GameState.__dataclass_fields__) == GAME_STATE.names, "GameState fields differ from protocol.GAME_STATE"
+
+
+@dataclass(frozen=True)
+class EpisodeTiming:
+    """How the plugin runs the steps of an episode, sent with every RESET (protocol 3).
+
+    `frames_per_step` fixed updates (0.02 s of game time each) run per agent step, at
+    `time_scale` times real time. None keeps the plugin's default: `Constants.FramesPerStep`
+    (2) and the `-timescale` the game was launched with.
+    """
+
+    frames_per_step: int = None
+    time_scale: float = None
+
+    def __post_init__(self):
+        if self.frames_per_step is not None and self.frames_per_step < 1:
+            raise ValueError(f"frames_per_step must be >= 1, got {self.frames_per_step}")
+        if self.time_scale is not None and not self.time_scale > 0:
+            raise ValueError(f"time_scale must be > 0, got {self.time_scale}")
+
+    def __str__(self) -> str:
+        frames = "default" if self.frames_per_step is None else self.frames_per_step
+        scale = "launch" if self.time_scale is None else f"{self.time_scale:g}"
+        return f"{frames} frames/step, {scale} time scale"
+
+
+DEFAULT_EPISODE_TIMING = EpisodeTiming()
+
+
 class SilkSongSharedMemory:
     MEMORY_NAME = "silksong_shared_memory"
     EVENT_NAME = "silksong_state_event"
-    MEMORY_SIZE = 4096
+    MEMORY_SIZE = 16384
+    # A plugin of protocol 1 truncates the segment to its own 4 KB when it starts. Nothing
+    # past LEGACY_MEMORY_SIZE is touched until the plugin has announced protocol 2.
+    LEGACY_MEMORY_SIZE = 4096
 
     STATE_OFFSET = 0
     GAME_STATE_OFFSET = 4
     COMMAND_OFFSET = 1024
     EVENT_OFFSET = 2048
-
-    GAME_STATE_FORMAT = (
-        'ffff' + 'iiii' + 'f' + 'BBBBB' + 'xxx' +
-        'ffff' + 'iiii' + 'f' + 'B' + 'xxx' +
-        'f' + 'BB' + 'xx' +
-        'f' * 32 + 'i' * 32
-    )
-    GAME_STATE_SIZE = struct.calcsize(GAME_STATE_FORMAT)
+    FUTEX_SUPPORT_OFFSET = 2052
+    HEARTBEAT_OFFSET = 2056
+
+    # Protocol 2, used when both sides announce it: the plugin writes GameStates into two
+    # alternating slots, tags each with a sequence number and publishes that number last;
+    # Python acknowledges by sequence instead of writing READY back to STATE_OFFSET, which
+    # the plugin keeps updating as a mirror of the last state type. A skipped number shows
+    # that states were missed. Python copies a published slot and then checks that its tag
+    # still holds the number, like a seqlock reader, so a slot the plugin rewrote meanwhile
+    # is counted as torn and the next published state is taken instead. Version 1 is the
+    # single-slot protocol.
+    # Protocol 3 adds the episode timing a RESET carries (see `EpisodeTiming`); the slots
+    # are the same as in protocol 2.
+    PROTOCOL_VERSION = 3
+    LEGACY_PROTOCOL_VERSION = 1
+    DOUBLE_BUFFERED_VERSION = 2
+    EPISODE_TIMING_VERSION = 3
+    PLUGIN_VERSION_OFFSET = 2060
+    CLIENT_VERSION_OFFSET = 2064
+    STATE_SEQUENCE_OFFSET = 2068
+    ACK_SEQUENCE_OFFSET = 2072
+    # Per slot: the sequence number of the state it holds (-1 while it is written), and its state type.
+    SLOT_SEQUENCE_OFFSET = 2076
+    SLOT_STATE_OFFSET = 2084
+    GAME_STATE_SLOT_OFFSETS = (GAME_STATE_OFFSET, 3072)
+    SEQUENCE_MASK = 0x7FFFFFFF
+
+    # Action-chunk ring: Python queues up to MAX_CHUNK_STEPS button sets, the plugin runs them
+    # back-to-back and writes one GameState record per executed step. Plugins of protocol 1
+    # have neither the ring nor the memory it lives in.
+    MAX_CHUNK_STEPS = 32
+    CHUNK_LENGTH_OFFSET = 4096
+    CHUNK_EXECUTED_OFFSET = 4100
+    CHUNK_ACTIONS_OFFSET = 4104
+    CHUNK_ACTION_SIZE = len(BUTTONS)
+    CHUNK_STATES_OFFSET = 4608
+
+    # CommandData (`protocol.COMMAND`): int commandType, one byte per button, int commandReady.
+    COMMAND_PAYLOAD = struct.Struct(COMMAND.struct_format(stop="command_ready"))
+    COMMAND_PAYLOAD_SIZE = COMMAND_PAYLOAD.size
+    COMMAND_BUTTONS_OFFSET = COMMAND_OFFSET + COMMAND.offset(BUTTONS[0])
+    COMMAND_READY_OFFSET = COMMAND_OFFSET + COMMAND.offset("command_ready")
+    # frames_per_step and time_scale, read by the plugin when it latches a RESET.
+    RESET_TIMING = struct.Struct(COMMAND.struct_format(start="frames_per_step"))
+    RESET_TIMING_OFFSET = COMMAND_OFFSET + COMMAND.offset("frames_per_step")
+
+    GAME_STATE_FORMAT = GAME_STATE.struct_format()
+    GAME_STATE_SIZE = GAME_STATE.size
+    assert GAME_STATE_SLOT_OFFSETS[1] + GAME_STATE_SIZE <= LEGACY_MEMORY_SIZE <= CHUNK_LENGTH_OFFSET
 
     DEFAULT_TIMEOUT_MS = 30000
+    DEFAULT_HANG_TIMEOUT_MS = 10000
+    BOOT_TIMEOUT_MS = 60000
+    WATCHDOG_INTERVAL_MS = 10
+
+    # Set once the user was told that the game ignores the requested episode timing.
+    _timing_warned = False
+
+    WAIT_MODES = ("auto", "futex", "spin")
 
     @staticmethod
     def _create_symlink(link_path: Path, target_path: Path):
@@ -333,12 +515,16 @@ class SilkSongSharedMemory:
     def _create_event(self, event_name: str):
         """Create an event handle (cross-platform)."""
         if IS_WINDOWS:
-            handle = kernel32.CreateEventW(None, True, False, event_name)
+            if self.attach:
+                handle = kernel32.OpenEventW(EVENT_ALL_ACCESS, False, event_name)
+            else:
+                handle = kernel32.CreateEventW(None, True, False, event_name)
             if handle == 0:
                 raise RuntimeError(f"Failed to create event: {event_name}")
             return handle
         else:
             struct.pack_into('i', self.buf, self.EVENT_OFFSET, 0)
+            self._event_word = ctypes.c_int.from_buffer(self.buf, self.EVENT_OFFSET)
             return None
 
     def _set_event(self):
@@ -355,6 +541,14 @@ class SilkSongSharedMemory:
         else:
             struct.pack_into('i', self.buf, self.EVENT_OFFSET, 0)
 
+    def _use_futex(self) -> bool:
+        """Whether to sleep on the event word instead of spinning on it (Linux only)."""
+        if self.wait_mode == "spin" or SYS_FUTEX is None:
+            return False
+        if self.wait_mode == "futex":
+            return True
+        return struct.unpack_from('i', self.buf, self.FUTEX_SUPPORT_OFFSET)[0] == 1
+
     def _wait_for_event(self, timeout_ms: int) -> bool:
         """Wait for event signal with timeout. Returns True if signaled, False if timeout."""
         if IS_WINDOWS:
@@ -365,6 +559,11 @@ class SilkSongSharedMemory:
                 error = ctypes.get_last_error()
                 raise RuntimeError(f"[Env {self.id}] WaitForSingleObject failed with error: {error}")
             return True
+        elif self._use_futex():
+            # The plugin wakes the futex after setting the flag, so a zero flag means
+            # we can sleep; a flag set in between makes FUTEX_WAIT return immediately.
+            futex_wait(ctypes.addressof(self._event_word), 0, timeout_ms)
+            return self._event_word.value == 1
         else:
             start_time = time.monotonic()
             timeout_sec = timeout_ms / 1000.0
@@ -383,36 +582,97 @@ class SilkSongSharedMemory:
             if self.event_handle is not None:
                 kernel32.CloseHandle(self.event_handle)
         else:
-            pass
+            self._event_word = None
 
-    def __init__(self, id: int, time_scale: float = 1.0, nofx: bool = False, timeout_ms: int = None):
+    def _init_attributes(self, id: int, time_scale: float, nofx: bool, timeout_ms: int = None,
+                         hang_timeout_ms: int = None, wait_mode: str = "auto", simulator: bool = False,
+                         simulator_args: list[str] = None, attach: bool = False):
+        """Set every attribute that does not need the segment or the game; `ReplaySharedMemory` shares it."""
         self.id = id
+        self.attach = attach
         self.time_scale = time_scale
         self.nofx = nofx
         self.process = None
+        self.launch_time = None
+        self.boot_time = None
         self.event_handle = None
+        self.state_view = None
+        self._slot_views = None
+        self.chunk_view = None
         self.timeout_ms = timeout_ms if timeout_ms is not None else self.DEFAULT_TIMEOUT_MS
+        self.hang_timeout_ms = hang_timeout_ms if hang_timeout_ms is not None else self.DEFAULT_HANG_TIMEOUT_MS
+        self.restart_history: list[dict] = []
+        self._reset_heartbeat()
+        self.wait_mode = wait_mode
+        self.simulator = simulator
+        self.simulator_args = list(simulator_args or [])
+        self._recorder = None
+        self._pending_command = None
+        # Set by the owning env; its current step timer also gets this instance's phases.
+        self.profiler = None
+        # Negotiated when the game reports READY (or on attach); see PROTOCOL_VERSION.
+        self.protocol_version = self.LEGACY_PROTOCOL_VERSION
+        self.missed_states = 0
+        self.torn_states = 0
+        self._sequence = 0
+        self._torn_sequence = None
+        # Protocol 2 and later: the state taken last, copied out of its slot (see `_state_arrived`).
+        self._snapshot = game_state_view(bytearray(self.GAME_STATE_SIZE))
+
+    def __init__(self, id: int, time_scale: float = 1.0, nofx: bool = False, timeout_ms: int = None,
+                 wait_mode: str = "auto", simulator: bool = False, simulator_args: list[str] = None,
+                 hang_timeout_ms: int = None, attach: bool = False, wait_ready: bool = True,
+                 record_path: str = None):
+        """Create the shared-memory segment for env `id` and launch its game.
+
+        With `attach=True` the segment and the game are expected to exist already (they are
+        owned by a pool daemon): the segment is mapped without being cleared and nothing is
+        launched. Attached instances are restarted by their owner, not by `restart`.
+        With `wait_ready=False` the game is launched but not waited for; call `wait_ready`
+        or poll `poll_ready` (see `silksong.launcher`).
+        With `record_path` every step and reset is appended to a trace file (`{id}` in the
+        path is replaced by the env id); see `silksong.trace`.
+        """
+        self._init_attributes(id, time_scale, nofx, timeout_ms, hang_timeout_ms, wait_mode, simulator,
+                              simulator_args, attach)
 
         if id < 1:
             raise ValueError(f"Invalid environment ID: {id}. Must be >= 1.")
+        if wait_mode not in self.WAIT_MODES:
+            raise ValueError(f"Invalid wait mode: {wait_mode}. Must be one of {self.WAIT_MODES}.")
 
-        game_path = self.get_game_path(id)
         shm_name = self.MEMORY_NAME + f"_{id}"
         event_name = self.EVENT_NAME + f"_{id}"
 
         if IS_LINUX:
             shm_path = Path("/dev/shm") / shm_name
             self._shm_path = shm_path
-            try:
-                self._shm_fd = os.open(str(shm_path), os.O_CREAT | os.O_RDWR, 0o666)
-                os.ftruncate(self._shm_fd, self.MEMORY_SIZE)
-                self._shm_mmap = mmap.mmap(self._shm_fd, self.MEMORY_SIZE)
-                self._shm_mmap[:] = bytes(self.MEMORY_SIZE)
-                self._owns_shm = True
-                print(f"[Env {id}] Created shared memory (Linux): {shm_path}")
-            except Exception as e:
-                raise RuntimeError(f"Failed to create shared memory: {e}")
+            if attach:
+                try:
+                    self._shm_fd = os.open(str(shm_path), os.O_RDWR)
+                    if os.fstat(self._shm_fd).st_size < self.MEMORY_SIZE:
+                        # Truncated by a plugin of protocol 1; growing it leaves the first 4 KB as they are.
+                        os.ftruncate(self._shm_fd, self.MEMORY_SIZE)
+                    self._shm_mmap = mmap.mmap(self._shm_fd, self.MEMORY_SIZE)
+                except Exception as e:
+                    raise RuntimeError(f"Failed to attach to shared memory: {e}")
+                self._owns_shm = False
+                print(f"[Env {id}] Attached to shared memory (Linux): {shm_path}")
+            else:
+                try:
+                    self._shm_fd = os.open(str(shm_path), os.O_CREAT | os.O_RDWR, 0o666)
+                    os.ftruncate(self._shm_fd, self.MEMORY_SIZE)
+                    self._shm_mmap = mmap.mmap(self._shm_fd, self.MEMORY_SIZE)
+                    self._shm_mmap[:] = bytes(self.MEMORY_SIZE)
+                    self._owns_shm = True
+                    print(f"[Env {id}] Created shared memory (Linux): {shm_path}")
+                except Exception as e:
+                    raise RuntimeError(f"Failed to create shared memory: {e}")
             self.shm = None
+        elif attach:
+            self.shm = shared_memory.SharedMemory(name=shm_name, create=False)
+            self._owns_shm = False
+            print(f"[Env {id}] Attached to shared memory: {shm_name}")
         else:
             try:
                 self.shm = shared_memory.SharedMemory(
@@ -434,30 +694,96 @@ class SilkSongSharedMemory:
         self.event_handle = self._create_event(event_name)
         print(f"[Env {id}] Created event: {event_name}")
 
-        args = [game_path, "-id", str(id), "-timescale", str(time_scale)]
-        if nofx:
-            args.append("-nofx")
+        # Zero-copy views of both GameState slots. `state_view` is the one taken last, or its
+        # copy with protocol 2 and later.
+        self._slot_views = tuple(game_state_view(self.buf, offset) for offset in self.GAME_STATE_SLOT_OFFSETS)
+        self.state_view = self._slot_views[0]
+        if attach:
+            self._sync_protocol()
+        else:
+            struct.pack_into('i', self.buf, self.CLIENT_VERSION_OFFSET, self.PROTOCOL_VERSION)
+        self.chunk_view = np.ndarray(
+            shape=(self.MAX_CHUNK_STEPS,), dtype=GAME_STATE_DTYPE, buffer=self.buf, offset=self.CHUNK_STATES_OFFSET
+        )
 
-        print(f"[Env {id}] Launching game from: {game_path}")
-        print(f"[Env {id}] Time scale: {time_scale}, NoFx: {nofx}")
+        if record_path is not None:
+            # Imported here: silksong.trace builds on this module.
+            from silksong.trace import TraceWriter, trace_path_for
+            self._recorder = TraceWriter(trace_path_for(record_path, id))
+            print(f"[Env {id}] Recording to: {self._recorder.path}")
 
+        _active_instances.append(self)
+        if attach:
+            return
+
+        try:
+            self._launch_game()
+        except BaseException:
+            self.close()
+            raise
+
+        if wait_ready:
+            self.wait_ready()
+
+    def wait_ready(self, timeout_ms: int = None):
+        """Block until the launched game reports READY. Closes the instance if it never does."""
+        if timeout_ms is None:
+            timeout_ms = self.BOOT_TIMEOUT_MS
+
+        print(f"[Env {self.id}] Waiting for game to connect...")
+        try:
+            self.wait_for_state(StateType.READY, timeout_ms=timeout_ms)
+        except BaseException:
+            self.close()
+            raise
+        self.boot_time = time.monotonic() - self.launch_time
+        print(f"[Env {self.id}] Game connected!")
+
+    def poll_ready(self) -> bool:
+        """Non-blocking READY check, for launchers that wait on several instances at once.
+
+        Raises GameCrashedError if the game exited before reaching READY.
+        """
+        if self._state_arrived(StateType.READY):
+            self._take_state()
+            if self.boot_time is None:
+                self.boot_time = time.monotonic() - self.launch_time
+            return True
+        if self.process is not None and self.process.poll() is not None:
+            raise GameCrashedError(f"[Env {self.id}] Game exited with code {self.process.returncode} during boot")
+        return False
+
+    def _launch_game(self):
+        """Start the game (or the stand-in simulator) for this instance."""
         env = os.environ.copy()
-        game_dir = Path(game_path).parent
-        if IS_LINUX:
-            env["LD_PRELOAD"] = "./libdoorstop.so"
-            env["LD_LIBRARY_PATH"] = f".:{env.get('LD_LIBRARY_PATH', '')}"
-            env["DOORSTOP_ENABLED"] = "1"
-            env["DOORSTOP_TARGET_ASSEMBLY"] = str(game_dir / "BepInEx" / "core" / "BepInEx.Preloader.dll")
-            env["__GL_SYNC_TO_VBLANK"] = "0"
-            env["vblank_mode"] = "0"
 
-        self.process = subprocess.Popen(args, env=env, cwd=game_dir)
+        if self.simulator:
+            args = [sys.executable, "-m", "silksong.simulator", "-id", str(self.id), "-timescale", str(self.time_scale)]
+            args += self.simulator_args
+            game_dir = Path(__file__).resolve().parent.parent
+            print(f"[Env {self.id}] Launching simulator")
+        else:
+            game_path = self.get_game_path(self.id)
+            args = [game_path, "-id", str(self.id), "-timescale", str(self.time_scale)]
+            game_dir = Path(game_path).parent
+            print(f"[Env {self.id}] Launching game from: {game_path}")
+
+            if IS_LINUX:
+                env["LD_PRELOAD"] = "./libdoorstop.so"
+                env["LD_LIBRARY_PATH"] = f".:{env.get('LD_LIBRARY_PATH', '')}"
+                env["DOORSTOP_ENABLED"] = "1"
+                env["DOORSTOP_TARGET_ASSEMBLY"] = str(game_dir / "BepInEx" / "core" / "BepInEx.Preloader.dll")
+                env["__GL_SYNC_TO_VBLANK"] = "0"
+                env["vblank_mode"] = "0"
 
-        print(f"[Env {id}] Waiting for game to connect...")
-        self.wait_for_state(StateType.READY, timeout_ms=60000)
-        print(f"[Env {id}] Game connected!")
+        if self.nofx:
+            args.append("-nofx")
 
-        _active_instances.append(self)
+        print(f"[Env {self.id}] Time scale: {self.time_scale}, NoFx: {self.nofx}")
+
+        self.launch_time = time.monotonic()
+        self.boot_time = None
+        self.process = subprocess.Popen(args, env=env, cwd=game_dir)
 
     @property
     def buf(self):
@@ -470,42 +796,20 @@ class SilkSongSharedMemory:
         return struct.unpack_from('i', self.buf, offset=self.STATE_OFFSET)[0]
 
     def read_game_state(self) -> GameState:
-        data = struct.unpack_from(self.GAME_STATE_FORMAT, self.buf, offset=self.GAME_STATE_OFFSET)
-
-        raycast_distances = np.array(data[27:59], dtype=np.float32)
-        raycast_hit_types = np.array(data[59:91], dtype=np.float32)
-
-        return GameState(
-            player_pos_x=data[0],
-            player_pos_y=data[1],
-            player_vel_x=data[2],
-            player_vel_y=data[3],
-            player_health=data[4],
-            player_max_health=data[5],
-            player_silk=data[6],
-            player_animation_state=data[7],
-            player_animation_progress=data[8],
-            player_grounded=bool(data[9]),
-            player_can_dash=bool(data[10]),
-            player_facing_right=bool(data[11]),
-            player_invincible=bool(data[12]),
-            player_can_attack=bool(data[13]),
-            boss_pos_x=data[14],
-            boss_pos_y=data[15],
-            boss_vel_x=data[16],
-            boss_vel_y=data[17],
-            boss_health=data[18],
-            boss_max_health=data[19],
-            boss_phase=data[20],
-            boss_animation_state=data[21],
-            boss_animation_progress=data[22],
-            boss_facing_right=bool(data[23]),
-            episode_time=data[24],
-            terminated=bool(data[25]),
-            truncated=bool(data[26]),
-            raycast_distances=raycast_distances,
-            raycast_hit_types=raycast_hit_types,
-        )
+        return GameState.from_record(self.state_view)
+
+    def write_command(self, payload):
+        """Write a packed command (commandType and the 10 buttons) in one slice assignment.
+
+        commandReady is set only afterwards, so the plugin never latches a half-written
+        command. See `silksong.command.CommandEncoder` for payloads straight from actions.
+        """
+        offset = self.COMMAND_OFFSET
+        self.buf[offset:offset + self.COMMAND_PAYLOAD_SIZE] = payload
+        struct.pack_into('i', self.buf, self.COMMAND_READY_OFFSET, 1)
+
+        if self._recorder is not None:
+            self._pending_command = (struct.unpack_from('i', self.buf, offset)[0], time.monotonic())
 
     def send_command(self, command_type: CommandType,
                     left: bool = False, right: bool = False,
@@ -513,76 +817,300 @@ class SilkSongSharedMemory:
                     jump: bool = False, attack: bool = False,
                     dash: bool = False, clawline: bool = False,
                     skill: bool = False, heal: bool = False):
-        offset = self.COMMAND_OFFSET
+        self.write_command(self.COMMAND_PAYLOAD.pack(
+            int(command_type), left, right, up, down, jump, attack, dash, clawline, skill, heal
+        ))
+
+    def read_heartbeat(self) -> int:
+        return struct.unpack_from('i', self.buf, self.HEARTBEAT_OFFSET)[0]
+
+    def _check_heartbeat(self, now: float) -> bool:
+        """Track the plugin heartbeat. Returns False once it has stalled for hang_timeout_ms."""
+        heartbeat = self.read_heartbeat()
+        if heartbeat != self._heartbeat:
+            self._heartbeat_seen = self._heartbeat_seen or self._heartbeat is not None
+            self._heartbeat = heartbeat
+            self._heartbeat_time = now
+            return True
+        return not self._heartbeat_seen or (now - self._heartbeat_time) * 1000 < self.hang_timeout_ms
 
-        struct.pack_into('i', self.buf, offset + 0, int(command_type))
-        struct.pack_into('B', self.buf, offset + 4, 1 if left else 0)
-        struct.pack_into('B', self.buf, offset + 5, 1 if right else 0)
-        struct.pack_into('B', self.buf, offset + 6, 1 if up else 0)
-        struct.pack_into('B', self.buf, offset + 7, 1 if down else 0)
-        struct.pack_into('B', self.buf, offset + 8, 1 if jump else 0)
-        struct.pack_into('B', self.buf, offset + 9, 1 if attack else 0)
-        struct.pack_into('B', self.buf, offset + 10, 1 if dash else 0)
-        struct.pack_into('B', self.buf, offset + 11, 1 if clawline else 0)
-        struct.pack_into('B', self.buf, offset + 12, 1 if skill else 0)
-        struct.pack_into('B', self.buf, offset + 13, 1 if heal else 0)
-        struct.pack_into('i', self.buf, offset + 14, 1)
+    def _reset_heartbeat(self):
+        self._heartbeat = None
+        self._heartbeat_time = time.monotonic()
+        self._heartbeat_seen = False
 
     def wait_for_state(self, state_type: StateType, timeout_ms: int = None):
+        """Wait for the game to publish `state_type`.
+
+        Between event waits a watchdog checks that the game process is still alive and,
+        once the plugin heartbeat has been seen moving, that it keeps moving. Crashes
+        raise GameCrashedError within WATCHDOG_INTERVAL_MS, hangs raise GameHungError
+        after hang_timeout_ms; both are GameTimeoutErrors.
+        """
         if timeout_ms is None:
             timeout_ms = self.timeout_ms
 
-        elapsed_ms = 0
-        poll_interval_ms = 100
+        start_time = time.monotonic()
+        self._check_heartbeat(start_time)
 
         while True:
-            current_state = self.read_state()
-            if current_state == state_type:
-                struct.pack_into('i', self.buf, self.STATE_OFFSET, int(StateType.READY))
-                self._reset_event()
+            if self._state_arrived(state_type):
+                self._take_state()
                 break
 
-            signaled = self._wait_for_event(poll_interval_ms)
+            if self._wait_for_event(self.WATCHDOG_INTERVAL_MS):
+                continue
+
+            self._watchdog(state_type, start_time, timeout_ms)
+
+    async def await_state(self, state_type: StateType, timeout_ms: int = None):
+        """`wait_for_state` for asyncio: the event is awaited without blocking the loop (see `silksong.aio`)."""
+        # Imported here: silksong.aio builds on this module.
+        from silksong.aio import wait_for_event
+
+        if timeout_ms is None:
+            timeout_ms = self.timeout_ms
+
+        start_time = time.monotonic()
+        self._check_heartbeat(start_time)
+
+        while True:
+            if self._state_arrived(state_type):
+                self._take_state()
+                break
+
+            if await wait_for_event(self, self.WATCHDOG_INTERVAL_MS):
+                continue
+
+            self._watchdog(state_type, start_time, timeout_ms)
+
+    def _sync_protocol(self):
+        """Adopt the protocol both sides announced, and the plugin's last published sequence number."""
+        self._torn_sequence = None
+        plugin_version = struct.unpack_from('i', self.buf, self.PLUGIN_VERSION_OFFSET)[0]
+        client_version = struct.unpack_from('i', self.buf, self.CLIENT_VERSION_OFFSET)[0]
+        version = min(plugin_version, client_version, self.PROTOCOL_VERSION)
+        if version >= self.DOUBLE_BUFFERED_VERSION:
+            self.protocol_version = version
+            self._sequence = struct.unpack_from('i', self.buf, self.STATE_SEQUENCE_OFFSET)[0]
+            self._snapshot[...] = self._slot_views[self._sequence & 1]
+            self.state_view = self._snapshot
+        else:
+            self.protocol_version = self.LEGACY_PROTOCOL_VERSION
+            self._sequence = 0
+            self.state_view = self._slot_views[0]
+
+    def resync(self):
+        """Catch up with a game that another mapping of the segment has been driving.
+
+        A pool daemon taking back a released lease, or a client whose game the daemon
+        relaunched, would otherwise wait from a stale sequence number. States published
+        in between would count as missed, and an old RESET could pass for the answer to a
+        new one.
+        """
+        self._sync_protocol()
+        self._reset_heartbeat()
+
+    def _state_arrived(self, state_type: StateType) -> bool:
+        """Whether the game has published `state_type` since the last state taken. Points `state_view` at it.
+
+        With protocol 2 and later the slot is copied first and its tag checked afterwards.
+        The plugin tags a slot -1 while it rewrites it and with the new number once it is
+        published, so a changed tag means the copy may be torn: it is counted in
+        `torn_states` and the next published state is waited for instead.
+        """
+        if self.protocol_version == self.LEGACY_PROTOCOL_VERSION:
+            if self.read_state() != state_type:
+                return False
+            # The plugin announces its version before READY.
+            if state_type == StateType.READY:
+                self._sync_protocol()
+            return True
+
+        sequence = struct.unpack_from('i', self.buf, self.STATE_SEQUENCE_OFFSET)[0]
+        if sequence == self._sequence or sequence == self._torn_sequence:
+            return False
+        slot = sequence & 1
+        if struct.unpack_from('i', self.buf, self.SLOT_STATE_OFFSET + 4 * slot)[0] != state_type:
+            return False
+
+        self._snapshot[...] = self._slot_views[slot]
+        if struct.unpack_from('i', self.buf, self.SLOT_SEQUENCE_OFFSET + 4 * slot)[0] != sequence:
+            self.torn_states += 1
+            self._torn_sequence = sequence
+            print(f"[Env {self.id}] State {sequence} was overwritten while it was read; waiting for the next one")
+            return False
+
+        missed = (sequence - self._sequence - 1) & self.SEQUENCE_MASK
+        if missed:
+            self.missed_states += missed
+            print(f"[Env {self.id}] Missed {missed} state update(s) before sequence {sequence}")
+        self._sequence = sequence
+        self.state_view = self._snapshot
+        return True
+
+    def _take_state(self):
+        """Acknowledge the published state so the game can publish the next one."""
+        if self.protocol_version == self.LEGACY_PROTOCOL_VERSION:
+            struct.pack_into('i', self.buf, self.STATE_OFFSET, int(StateType.READY))
+        else:
+            struct.pack_into('i', self.buf, self.ACK_SEQUENCE_OFFSET, self._sequence)
+        self._reset_event()
+        if self._pending_command is not None:
+            self._record_exchange()
+
+    def _watchdog(self, state_type: StateType, start_time: float, timeout_ms: int):
+        """Raise if the game crashed, hung or ran out of time while `state_type` was awaited."""
+        now = time.monotonic()
+        current_state = self.read_state()
+
+        if self.process is not None and self.process.poll() is not None:
+            raise GameCrashedError(
+                f"[Env {self.id}] Game process exited with code {self.process.returncode}. "
+                f"Expected state: {state_type.name}"
+            )
 
-            if not signaled:
-                elapsed_ms += poll_interval_ms
-                if elapsed_ms >= timeout_ms:
-                    raise GameTimeoutError(
-                        f"[Env {self.id}] Game did not respond within {timeout_ms}ms. "
-                        f"Expected state: {state_type.name}, current state: {StateType(current_state).name}"
-                    )
+        if not self._check_heartbeat(now):
+            raise GameHungError(
+                f"[Env {self.id}] Game heartbeat stalled for {self.hang_timeout_ms}ms. "
+                f"Expected state: {state_type.name}, current state: {StateType(current_state).name}"
+            )
+
+        if (now - start_time) * 1000 >= timeout_ms:
+            raise GameTimeoutError(
+                f"[Env {self.id}] Game did not respond within {timeout_ms}ms. "
+                f"Expected state: {state_type.name}, current state: {StateType(current_state).name}"
+            )
 
-    def reset(self) -> GameState:
+    def _record_exchange(self):
+        """Append the answered command and the GameState record(s) it produced to the trace."""
+        command_type, sent_time = self._pending_command
+        self._pending_command = None
+        latency = time.monotonic() - sent_time
+
+        if command_type == CommandType.STEP_CHUNK:
+            executed = struct.unpack_from('i', self.buf, self.CHUNK_EXECUTED_OFFSET)[0]
+            buttons = np.frombuffer(
+                self.buf, dtype=np.uint8, count=executed * self.CHUNK_ACTION_SIZE, offset=self.CHUNK_ACTIONS_OFFSET
+            ).reshape(executed, self.CHUNK_ACTION_SIZE)
+            states = self.chunk_view[:executed]
+        else:
+            buttons = np.frombuffer(self.buf, dtype=np.uint8, count=self.CHUNK_ACTION_SIZE, offset=self.COMMAND_BUTTONS_OFFSET)[None]
+            states = self.state_view.reshape(1)
+
+        self._recorder.append(command_type, buttons, states, sent_time, latency)
+
+    def _step_timer(self):
+        return self.profiler.timer if self.profiler is not None else NULL_TIMER
+
+    def send_reset(self, timing: EpisodeTiming = None):
+        """Send RESET, asking the plugin to run the next episode with `timing` (its defaults if None)."""
+        timing = timing or DEFAULT_EPISODE_TIMING
+        if timing != DEFAULT_EPISODE_TIMING and self.protocol_version < self.EPISODE_TIMING_VERSION \
+                and not self._timing_warned:
+            self._timing_warned = True
+            print(f"[Env {self.id}] The game speaks protocol {self.protocol_version}, which has no episode "
+                  f"timing; {timing} is ignored")
+        self.RESET_TIMING.pack_into(self.buf, self.RESET_TIMING_OFFSET, timing.frames_per_step or 0,
+                                    timing.time_scale or 0.0)
         self.send_command(CommandType.RESET)
+
+    def reset(self, timing: EpisodeTiming = None) -> GameState:
+        self.send_reset(timing)
         self.wait_for_state(StateType.RESET)
         return self.read_game_state()
 
-    def step(self, action: np.ndarray) -> GameState:
-        if len(action) != 10:
-            raise ValueError(f"Action must have 10 elements, got {len(action)}")
-
-        self.send_command(
-            CommandType.STEP,
-            left=bool(action[0]),
-            right=bool(action[1]),
-            up=bool(action[2]),
-            down=bool(action[3]),
-            jump=bool(action[4]),
-            attack=bool(action[5]),
-            dash=bool(action[6]),
-            clawline=bool(action[7]),
-            skill=bool(action[8]),
-            heal=bool(action[9])
-        )
-        self.wait_for_state(StateType.STEP)
+    async def areset(self, timing: EpisodeTiming = None) -> GameState:
+        """`reset` for asyncio."""
+        self.send_reset(timing)
+        await self.await_state(StateType.RESET)
         return self.read_game_state()
 
-    def restart(self):
-        print(f"[Env {self.id}] Restarting game...")
+    def step(self, action: np.ndarray) -> GameState:
+        return self.step_command(self._step_payload(action))
+
+    async def astep(self, action: np.ndarray) -> GameState:
+        """`step` for asyncio."""
+        return await self.astep_command(self._step_payload(action))
+
+    def _step_payload(self, action: np.ndarray) -> bytes:
+        if len(action) != len(BUTTONS):
+            raise ValueError(f"Action must have {len(BUTTONS)} elements, got {len(action)}")
+        return self.COMMAND_PAYLOAD.pack(CommandType.STEP, *(bool(button) for button in action))
+
+    def step_command(self, payload) -> GameState:
+        """`step` for a command already packed by `CommandEncoder`."""
+        timer = self._step_timer()
+        self.write_command(payload)
+        timer.lap("send_command")
+        self.wait_for_state(StateType.STEP)
+        timer.lap("wait_for_state")
+        game_state = self.read_game_state()
+        timer.lap("read_game_state")
+        return game_state
+
+    async def astep_command(self, payload) -> GameState:
+        """`step_command` for asyncio."""
+        timer = self._step_timer()
+        self.write_command(payload)
+        timer.lap("send_command")
+        await self.await_state(StateType.STEP)
+        timer.lap("wait_for_state")
+        game_state = self.read_game_state()
+        timer.lap("read_game_state")
+        return game_state
+
+    def step_chunk(self, actions: np.ndarray) -> np.ndarray:
+        """Run up to MAX_CHUNK_STEPS button sets in one round trip.
+
+        `actions` is a `(K, 10)` array of buttons. The plugin stops early when the player or
+        the boss dies, so the returned zero-copy record array can be shorter than K. The
+        records stay valid until the next chunk is sent.
+        """
+        timer = self._send_chunk(actions)
+        self.wait_for_state(StateType.STEP)
+        timer.lap("wait_for_state")
+        return self.chunk_view[:struct.unpack_from('i', self.buf, self.CHUNK_EXECUTED_OFFSET)[0]]
+
+    async def astep_chunk(self, actions: np.ndarray) -> np.ndarray:
+        """`step_chunk` for asyncio."""
+        timer = self._send_chunk(actions)
+        await self.await_state(StateType.STEP)
+        timer.lap("wait_for_state")
+        return self.chunk_view[:struct.unpack_from('i', self.buf, self.CHUNK_EXECUTED_OFFSET)[0]]
+
+    def _send_chunk(self, actions: np.ndarray):
+        if self.protocol_version < self.DOUBLE_BUFFERED_VERSION:
+            raise RuntimeError(f"[Env {self.id}] The game speaks protocol {self.protocol_version}, which has no "
+                               f"action chunks; update the plugin or step one action at a time")
+        actions = np.asarray(actions)
+        if actions.ndim != 2 or actions.shape[1] != self.CHUNK_ACTION_SIZE:
+            raise ValueError(f"Actions must have shape (K, {self.CHUNK_ACTION_SIZE}), got {actions.shape}")
+        if not 1 <= len(actions) <= self.MAX_CHUNK_STEPS:
+            raise ValueError(f"Chunk length must be between 1 and {self.MAX_CHUNK_STEPS}, got {len(actions)}")
+
+        timer = self._step_timer()
+        payload = (actions != 0).astype(np.uint8).tobytes()
+        self.buf[self.CHUNK_ACTIONS_OFFSET:self.CHUNK_ACTIONS_OFFSET + len(payload)] = payload
+        struct.pack_into('ii', self.buf, self.CHUNK_LENGTH_OFFSET, len(actions), 0)
+
+        self.send_command(CommandType.STEP_CHUNK)
+        timer.lap("send_command")
+        return timer
+
+    def restart(self, cause: str = "manual"):
+        if self.attach:
+            raise RuntimeError(f"[Env {self.id}] Attached instances are restarted by the pool that owns them")
+        print(f"[Env {self.id}] Restarting game (cause: {cause})...")
+        restart_start = time.monotonic()
 
         if self.process is not None:
             try:
-                self.process.terminate()
+                # A hung game will not handle SIGTERM, so don't wait for it to.
+                if cause == "hang":
+                    self.process.kill()
+                else:
+                    self.process.terminate()
                 self.process.wait(timeout=5)
             except Exception:
                 try:
@@ -591,32 +1119,28 @@ class SilkSongSharedMemory:
                     pass
             self.process = None
 
+        if IS_LINUX:
+            # A game of protocol 1 has truncated the file; clearing the mapping past its end would fault.
+            os.ftruncate(self._shm_fd, self.MEMORY_SIZE)
         self.buf[:] = bytes(self.MEMORY_SIZE)
+        struct.pack_into('i', self.buf, self.CLIENT_VERSION_OFFSET, self.PROTOCOL_VERSION)
+        self.protocol_version = self.LEGACY_PROTOCOL_VERSION
+        self._sequence = 0
+        self._torn_sequence = None
+        self.state_view = self._slot_views[0]
 
         self._reset_event()
+        self._reset_heartbeat()
+        self._pending_command = None
 
-        game_path = self.get_game_path(self.id)
-        args = [game_path, "-id", str(self.id), "-timescale", str(self.time_scale)]
-        if self.nofx:
-            args.append("-nofx")
-
-        print(f"[Env {self.id}] Launching game from: {game_path}")
-
-        env = os.environ.copy()
-        game_dir = Path(game_path).parent
-        if IS_LINUX:
-            env["LD_PRELOAD"] = "./libdoorstop.so"
-            env["LD_LIBRARY_PATH"] = f".:{env.get('LD_LIBRARY_PATH', '')}"
-            env["DOORSTOP_ENABLED"] = "1"
-            env["DOORSTOP_TARGET_ASSEMBLY"] = str(game_dir / "BepInEx" / "core" / "BepInEx.Preloader.dll")
-            env["__GL_SYNC_TO_VBLANK"] = "0"
-            env["vblank_mode"] = "0"
-
-        self.process = subprocess.Popen(args, env=env, cwd=game_dir)
+        self._launch_game()
 
         print(f"[Env {self.id}] Waiting for game to connect...")
-        self.wait_for_state(StateType.READY, timeout_ms=60000)
-        print(f"[Env {self.id}] Game reconnected!")
+        self.wait_for_state(StateType.READY, timeout_ms=self.BOOT_TIMEOUT_MS)
+        self.boot_time = time.monotonic() - self.launch_time
+        recovery_time = time.monotonic() - restart_start
+        self.restart_history.append({"cause": cause, "recovery_time": recovery_time, "time": time.time()})
+        print(f"[Env {self.id}] Game reconnected after {recovery_time:.1f}s (cause: {cause})")
 
     def close(self):
         if self in _active_instances:
@@ -635,6 +1159,13 @@ class SilkSongSharedMemory:
 
         self._close_event()
         self.event_handle = None
+        self.state_view = None
+        self._slot_views = None
+        self.chunk_view = None
+
+        if getattr(self, '_recorder', None) is not None:
+            self._recorder.close()
+            self._recorder = None
 
         if IS_LINUX:
             if hasattr(self, '_shm_mmap') and self._shm_mmap is not None:
@@ -0,0 +1,264 @@
+"""Stand-in game process that speaks the shared-memory protocol.
+
+Launched by `SilkSongSharedMemory(..., simulator=True)` in place of the real
+executable so the Python side can be exercised and benchmarked without Unity:
+
+    python -m silksong.simulator -id 1 --step_latency_ms 2
+
+It follows `SharedMemoryManager.cs`: READY once at start-up, then one command per
+poll (buttons latched from the command block or the chunk ring), STEP after each step
+or chunk and RESET after each episode reset, with the GameState written before the
+state flag. When the client announced protocol 2, states go to alternating slots and
+are published by sequence number; `--protocol_version 1` behaves like an older plugin,
+which truncates the segment to its 4 KB and knows no action chunks.
+Fights are simulated by `silksong.arena.ArenaModel`.
+
+With protocol 3, a RESET carries the frames per step and time scale of the episode. A
+step then runs that many fixed updates of the arena, and `--step_latency_ms`, the wall
+time of a default step at the launch `-timescale`, stretches with the frames and shrinks
+with the time scale, as the game's frame time would.
+"""
+import argparse
+import ctypes
+import mmap
+import os
+import random
+import struct
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+from silksong.arena import FRAMES_PER_STEP, ArenaModel
+from silksong.shared_memory import (
+    IS_LINUX,
+    IS_WINDOWS,
+    SYS_FUTEX,
+    CommandType,
+    SilkSongSharedMemory,
+    StateType,
+    futex_wake,
+)
+
+if IS_WINDOWS:
+    kernel32 = ctypes.windll.kernel32
+    EVENT_MODIFY_STATE = 0x0002
+
+Layout = SilkSongSharedMemory
+COMMAND_READY_OFFSET = Layout.COMMAND_READY_OFFSET
+
+
+class GameSimulator:
+    def __init__(self, id: int, step_latency_ms: float = 0.0, reset_latency_ms: float = 0.0,
+                 poll_interval_ms: float = 0.2, futex: bool = True, crash_after_steps: int = 0,
+                 hang_after_steps: int = 0, step_jitter_ms: float = 0.0, crash_probability: float = 0.0,
+                 hang_probability: float = 0.0, seed: int = None,
+                 protocol_version: int = SilkSongSharedMemory.PROTOCOL_VERSION, time_scale: float = 1.0):
+        self.id = id
+        self.step_latency = step_latency_ms / 1000.0
+        self.step_jitter = step_jitter_ms / 1000.0
+        self.reset_latency = reset_latency_ms / 1000.0
+        self.poll_interval = poll_interval_ms / 1000.0
+        self.futex = futex and IS_LINUX and SYS_FUTEX is not None
+        self.crash_after_steps = crash_after_steps
+        self.hang_after_steps = hang_after_steps
+        self.crash_probability = crash_probability
+        self.hang_probability = hang_probability
+        self.rng = random.Random(seed)
+        self.arena = ArenaModel(seed)
+        self.total_steps = 0
+        self.protocol_version = protocol_version
+        self.sequence = 0
+        self.launch_time_scale = time_scale
+        # The timing of the current episode, set by each RESET.
+        self.frames_per_step = FRAMES_PER_STEP
+        self.time_scale = time_scale
+
+        shm_name = Layout.MEMORY_NAME + f"_{id}"
+        if IS_LINUX:
+            self._fd = os.open(str(Path("/dev/shm") / shm_name), os.O_RDWR)
+            size = Layout.MEMORY_SIZE
+            if protocol_version < Layout.DOUBLE_BUFFERED_VERSION:
+                # The baseline plugin sets the length of the file to its own layout.
+                size = Layout.LEGACY_MEMORY_SIZE
+                os.ftruncate(self._fd, size)
+            self._mmap = mmap.mmap(self._fd, size)
+            self.buf = self._mmap
+            self._event_word = ctypes.c_int.from_buffer(self._mmap, Layout.EVENT_OFFSET)
+        else:
+            self._shm = shared_memory.SharedMemory(name=shm_name, create=False)
+            self.buf = self._shm.buf
+            event_name = Layout.EVENT_NAME + f"_{id}"
+            self._event_handle = kernel32.OpenEventW(EVENT_MODIFY_STATE, False, event_name)
+
+        if self.futex:
+            struct.pack_into('i', self.buf, Layout.FUTEX_SUPPORT_OFFSET, 1)
+        if protocol_version >= Layout.DOUBLE_BUFFERED_VERSION:
+            struct.pack_into('i', self.buf, Layout.PLUGIN_VERSION_OFFSET, protocol_version)
+
+    def _set_event(self):
+        if IS_WINDOWS:
+            kernel32.SetEvent(self._event_handle)
+        else:
+            struct.pack_into('i', self.buf, Layout.EVENT_OFFSET, 1)
+            if self.futex:
+                futex_wake(ctypes.addressof(self._event_word))
+
+    def _version(self) -> int:
+        """The protocol both sides speak; the client announces its version before launching the game."""
+        client_version = struct.unpack_from('i', self.buf, Layout.CLIENT_VERSION_OFFSET)[0]
+        return min(self.protocol_version, client_version)
+
+    def _double_buffered(self) -> bool:
+        return self._version() >= Layout.DOUBLE_BUFFERED_VERSION
+
+    def _set_episode_timing(self):
+        """Adopt the timing of the RESET being handled, like `StepModeManager.SetEpisodeTiming`."""
+        frames_per_step, time_scale = 0, 0.0
+        if self._version() >= Layout.EPISODE_TIMING_VERSION:
+            frames_per_step, time_scale = Layout.RESET_TIMING.unpack_from(self.buf, Layout.RESET_TIMING_OFFSET)
+        self.frames_per_step = frames_per_step if frames_per_step > 0 else FRAMES_PER_STEP
+        self.time_scale = time_scale if time_scale > 0 else self.launch_time_scale
+
+    def write_state(self, state: StateType):
+        if self._double_buffered():
+            sequence = (self.sequence + 1) & Layout.SEQUENCE_MASK
+            slot = sequence & 1
+            struct.pack_into('i', self.buf, Layout.SLOT_STATE_OFFSET + 4 * slot, int(state))
+            struct.pack_into('i', self.buf, Layout.SLOT_SEQUENCE_OFFSET + 4 * slot, sequence)
+            struct.pack_into('i', self.buf, Layout.STATE_OFFSET, int(state))
+            struct.pack_into('i', self.buf, Layout.STATE_SEQUENCE_OFFSET, sequence)
+            self.sequence = sequence
+        else:
+            struct.pack_into('i', self.buf, Layout.STATE_OFFSET, int(state))
+        self._set_event()
+
+    def write_game_state(self, offset: int = None):
+        """Write the GameState at `offset`, by default into the slot of the next published state."""
+        if offset is None:
+            if self._double_buffered():
+                slot = (self.sequence + 1) & 1
+                struct.pack_into('i', self.buf, Layout.SLOT_SEQUENCE_OFFSET + 4 * slot, -1)
+                offset = Layout.GAME_STATE_SLOT_OFFSETS[slot]
+            else:
+                offset = Layout.GAME_STATE_OFFSET
+        self.arena.pack_into(Layout.GAME_STATE_FORMAT, self.buf, offset)
+
+    def _read_command(self) -> tuple[int, bytes]:
+        """Latch the command block like `ReadCommand`, then clear commandReady."""
+        if struct.unpack_from('i', self.buf, COMMAND_READY_OFFSET)[0] != 1:
+            return CommandType.NONE, b""
+        command_type = struct.unpack_from('i', self.buf, Layout.COMMAND_OFFSET)[0]
+        buttons = bytes(self.buf[Layout.COMMAND_BUTTONS_OFFSET:COMMAND_READY_OFFSET])
+        struct.pack_into('i', self.buf, COMMAND_READY_OFFSET, 0)
+        return command_type, buttons
+
+    def _advance(self, buttons: bytes):
+        """Simulate one step and inject the requested failure once it is due."""
+        latency = self.step_latency
+        if self.step_jitter > 0:
+            latency += self.rng.uniform(0.0, self.step_jitter)
+        if latency > 0:
+            time.sleep(latency * self.frames_per_step / FRAMES_PER_STEP * self.launch_time_scale / self.time_scale)
+        self.arena.step(buttons, self.frames_per_step)
+        self.total_steps += 1
+
+        if (self.crash_after_steps and self.total_steps >= self.crash_after_steps) or \
+                (self.crash_probability > 0 and self.rng.random() < self.crash_probability):
+            print(f"[Simulator {self.id}] Crashing after {self.total_steps} steps")
+            os._exit(1)
+        if (self.hang_after_steps and self.total_steps >= self.hang_after_steps) or \
+                (self.hang_probability > 0 and self.rng.random() < self.hang_probability):
+            print(f"[Simulator {self.id}] Hanging after {self.total_steps} steps")
+            while True:
+                time.sleep(1.0)
+
+    def step_chunk(self):
+        count = struct.unpack_from('i', self.buf, Layout.CHUNK_LENGTH_OFFSET)[0]
+        count = max(0, min(count, Layout.MAX_CHUNK_STEPS))
+
+        executed = 0
+        while executed < count:
+            offset = Layout.CHUNK_ACTIONS_OFFSET + executed * Layout.CHUNK_ACTION_SIZE
+            self._advance(bytes(self.buf[offset:offset + Layout.CHUNK_ACTION_SIZE]))
+            self.write_game_state(Layout.CHUNK_STATES_OFFSET + executed * Layout.GAME_STATE_SIZE)
+            executed += 1
+            if self.arena.done:
+                break
+
+        struct.pack_into('i', self.buf, Layout.CHUNK_EXECUTED_OFFSET, executed)
+        self.write_game_state()
+        self.write_state(StateType.STEP)
+
+    def run(self):
+        self.write_game_state()
+        self.write_state(StateType.READY)
+
+        heartbeat = 0
+        while True:
+            heartbeat = (heartbeat + 1) & 0x7FFFFFFF
+            struct.pack_into('i', self.buf, Layout.HEARTBEAT_OFFSET, heartbeat)
+
+            command_type, buttons = self._read_command()
+
+            if command_type == CommandType.STEP:
+                self._advance(buttons)
+                self.write_game_state()
+                self.write_state(StateType.STEP)
+            elif command_type == CommandType.STEP_CHUNK and self.protocol_version >= Layout.DOUBLE_BUFFERED_VERSION:
+                self.step_chunk()
+            elif command_type == CommandType.RESET:
+                if self.reset_latency > 0:
+                    time.sleep(self.reset_latency)
+                self._set_episode_timing()
+                self.arena.reset()
+                self.write_game_state()
+                self.write_state(StateType.RESET)
+            elif self.poll_interval > 0:
+                time.sleep(self.poll_interval)
+
+
+def main():
+    # Game-style single-dash arguments are accepted so the launch line matches the real executable.
+    parser = argparse.ArgumentParser(description="Shared-memory stand-in for the Silksong plugin")
+    parser.add_argument("-id", type=int, required=True)
+    parser.add_argument("-timescale", type=float, default=1.0)
+    parser.add_argument("-nofx", action="store_true")
+    parser.add_argument("--step_latency_ms", type=float, default=0.0, help="Simulated time per step")
+    parser.add_argument("--step_jitter_ms", type=float, default=0.0, help="Extra uniform random time per step")
+    parser.add_argument("--reset_latency_ms", type=float, default=0.0, help="Simulated time per reset")
+    parser.add_argument("--poll_interval_ms", type=float, default=0.2, help="Sleep between command polls")
+    parser.add_argument("--no_futex", action="store_true", help="Behave like a plugin without futex wake-ups")
+    parser.add_argument("--crash_after_steps", type=int, default=0, help="Exit without answering after this many steps")
+    parser.add_argument("--hang_after_steps", type=int, default=0, help="Stop responding and stop the heartbeat after this many steps")
+    parser.add_argument("--crash_probability", type=float, default=0.0, help="Chance per step of exiting without answering")
+    parser.add_argument("--hang_probability", type=float, default=0.0, help="Chance per step of hanging")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the boss and failure injection")
+    parser.add_argument("--protocol_version", type=int, default=SilkSongSharedMemory.PROTOCOL_VERSION,
+                        help="Shared-memory protocol to speak (1: single GameState slot, 2: no per-episode "
+                             "timing, like older plugins)")
+
+    args = parser.parse_args()
+
+    simulator = GameSimulator(
+        args.id,
+        step_latency_ms=args.step_latency_ms,
+        reset_latency_ms=args.reset_latency_ms,
+        poll_interval_ms=args.poll_interval_ms,
+        futex=not args.no_futex,
+        crash_after_steps=args.crash_after_steps,
+        hang_after_steps=args.hang_after_steps,
+        step_jitter_ms=args.step_jitter_ms,
+        crash_probability=args.crash_probability,
+        hang_probability=args.hang_probability,
+        seed=args.seed,
+        protocol_version=args.protocol_version,
+        time_scale=args.timescale,
+    )
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Record and replay of raw shared-memory traffic.
+
+A trace is a memory-mapped file of fixed-size records, one per executed step or reset:
+the buttons from the command block (or the chunk ring), the raw `GameState` block the
+plugin answered with, and when the command was sent and how long the answer took.
+Recording is enabled with `SilkSongSharedMemory(..., record_path=...)`.
+
+`ReplaySharedMemory` serves a trace back through the `SilkSongSharedMemory` API
+(`reset`, `step`, `step_chunk`, `send_command`/`wait_for_state`) without a game, either as
+fast as possible or with the recorded response times. Replays are open-loop: the
+recorded states come back whatever actions are sent, and `mismatched_steps` counts the
+steps whose buttons differ from the recording.
+"""
+import asyncio
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+
+from silksong.shared_memory import (
+    GAME_STATE_DTYPE,
+    CommandType,
+    GameTimeoutError,
+    SilkSongSharedMemory,
+    StateType,
+    game_state_view,
+)
+
+TRACE_MAGIC = b"SSTRACE\0"
+TRACE_VERSION = 1
+
+# magic, version, record size, GameState size, record count, wall-clock start time
+TRACE_HEADER_FORMAT = "<8sIIIQd"
+TRACE_HEADER_SIZE = 64
+
+TRACE_RECORD_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("latency", "<f4"),
+    ("command", "<i4"),
+    ("chunk_index", "u1"),
+    ("buttons", "u1", (SilkSongSharedMemory.CHUNK_ACTION_SIZE,)),
+    ("state", GAME_STATE_DTYPE),
+], align=True)
+
+
+def trace_path_for(path: str, env_id: int) -> str:
+    """Per-instance trace path: `{id}` in `path` is replaced by the env id."""
+    return str(path).format(id=env_id)
+
+
+class TraceWriter:
+    """Appends records to a trace file through a growing memory map.
+
+    The record count in the header is updated with every append, so a trace stays
+    readable if the process dies before `close`.
+    """
+
+    INITIAL_CAPACITY = 4096
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self.start_time = time.monotonic()
+        self.records = None
+        self._capacity = 0
+        self._mmap = None
+        self._fd = os.open(str(self.path), os.O_CREAT | os.O_RDWR | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+
+        self._grow(self.INITIAL_CAPACITY)
+        struct.pack_into(
+            TRACE_HEADER_FORMAT, self._mmap, 0, TRACE_MAGIC, TRACE_VERSION,
+            TRACE_RECORD_DTYPE.itemsize, GAME_STATE_DTYPE.itemsize, 0, time.time(),
+        )
+
+    def _grow(self, capacity: int):
+        # The record view has to go before the map it points into can be closed.
+        self.records = None
+        if self._mmap is not None:
+            self._mmap.close()
+        os.ftruncate(self._fd, TRACE_HEADER_SIZE + capacity * TRACE_RECORD_DTYPE.itemsize)
+        self._mmap = mmap.mmap(self._fd, TRACE_HEADER_SIZE + capacity * TRACE_RECORD_DTYPE.itemsize)
+        self.records = np.ndarray(shape=(capacity,), dtype=TRACE_RECORD_DTYPE, buffer=self._mmap, offset=TRACE_HEADER_SIZE)
+        self._capacity = capacity
+
+    def append(self, command: int, buttons: np.ndarray, states: np.ndarray, sent_time: float, latency: float):
+        """Append one exchange: `(K, 10)` buttons and the `K` GameState records they produced.
+
+        `sent_time` is a `time.monotonic()` value. A chunk's latency is split evenly over its
+        steps, so replays with a different chunk length keep the same total time.
+        """
+        count = len(states)
+        if count == 0:
+            return
+        while self.count + count > self._capacity:
+            self._grow(self._capacity * 2)
+
+        block = self.records[self.count:self.count + count]
+        block["time"] = sent_time - self.start_time
+        block["latency"] = latency / count
+        block["command"] = int(command)
+        block["chunk_index"] = np.arange(count)
+        block["buttons"] = buttons
+        block["state"] = states
+        self.count += count
+        struct.pack_into("<Q", self._mmap, 20, self.count)
+
+    def close(self):
+        if self._fd is None:
+            return
+        self.records = None
+        self._mmap.flush()
+        self._mmap.close()
+        self._mmap = None
+        os.ftruncate(self._fd, TRACE_HEADER_SIZE + self.count * TRACE_RECORD_DTYPE.itemsize)
+        os.close(self._fd)
+        self._fd = None
+
+
+def read_trace(path: str) -> np.ndarray:
+    """Memory-map a trace read-only as an array of TRACE_RECORD_DTYPE records."""
+    with open(path, "rb") as f:
+        header = f.read(TRACE_HEADER_SIZE)
+    if len(header) < TRACE_HEADER_SIZE:
+        raise ValueError(f"{path} is not a trace file (too short)")
+
+    magic, version, record_size, state_size, count, _ = struct.unpack_from(TRACE_HEADER_FORMAT, header)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"{path} is not a trace file")
+    if version != TRACE_VERSION or record_size != TRACE_RECORD_DTYPE.itemsize or state_size != GAME_STATE_DTYPE.itemsize:
+        raise ValueError(
+            f"{path} has an incompatible layout (version {version}, record size {record_size}, "
+            f"GameState size {state_size}); expected version {TRACE_VERSION}, record size "
+            f"{TRACE_RECORD_DTYPE.itemsize}, GameState size {GAME_STATE_DTYPE.itemsize}"
+        )
+
+    if count == 0:
+        return np.empty(0, dtype=TRACE_RECORD_DTYPE)
+    return np.memmap(path, dtype=TRACE_RECORD_DTYPE, mode="r", offset=TRACE_HEADER_SIZE, shape=(count,))
+
+
+class ReplaySharedMemory(SilkSongSharedMemory):
+    """Stand-in for `SilkSongSharedMemory` that answers from a recorded trace.
+
+    Commands are packed into a private buffer exactly as for a live game, so the
+    Python-side cost of a step is unchanged. A reset skips to the next recorded episode
+    (wrapping around with `loop`), steps return the episode's recorded states in order,
+    and a chunk stops early on a death like the plugin does. Stepping past the end of a
+    recorded episode repeats its last state with `truncated` set.
+
+    `replay_timing` is "fast" (no waiting) or "original" (each answer takes as long as it
+    did when recorded). Other shared-memory options are accepted and ignored.
+    """
+
+    REPLAY_TIMINGS = ("fast", "original")
+    # Recorded episodes keep the frames per step and time scale they were recorded with.
+    _timing_warned = True
+
+    def __init__(self, id: int, time_scale: float = 1.0, nofx: bool = False, replay: str = None,
+                 replay_timing: str = "fast", loop: bool = True, timeout_ms: int = None, **shm_kwargs):
+        if replay is None:
+            raise ValueError("ReplaySharedMemory needs a trace path (replay=...)")
+        if replay_timing not in self.REPLAY_TIMINGS:
+            raise ValueError(f"Invalid replay timing: {replay_timing}. Must be one of {self.REPLAY_TIMINGS}.")
+
+        # No segment and no game: only the plain attributes of the base class are set up.
+        self._init_attributes(id, time_scale, nofx, timeout_ms)
+        # Chunks and timed resets are answered like a current plugin would.
+        self.protocol_version = self.PROTOCOL_VERSION
+        self.launch_time = time.monotonic()
+        self.boot_time = 0.0
+
+        self.trace_path = trace_path_for(replay, id)
+        self.records = read_trace(self.trace_path)
+        self.replay_timing = replay_timing
+        self.loop = loop
+        self._resets = np.flatnonzero(self.records["command"] == CommandType.RESET)
+        if len(self._resets) == 0:
+            raise ValueError(f"{self.trace_path} contains no recorded reset")
+
+        self.cursor = 0
+        self.episodes = 0
+        self.mismatched_steps = 0
+
+        # A memoryview, like the Windows shared-memory buffer: slices accept any byte buffer.
+        self._buffer = memoryview(bytearray(self.MEMORY_SIZE))
+        self.state_view = game_state_view(self._buffer, self.GAME_STATE_OFFSET)
+        self.chunk_view = np.ndarray(
+            shape=(self.MAX_CHUNK_STEPS,), dtype=GAME_STATE_DTYPE, buffer=self._buffer, offset=self.CHUNK_STATES_OFFSET
+        )
+        self._command_view = np.frombuffer(self._buffer, dtype=np.uint8, count=self.CHUNK_ACTION_SIZE, offset=self.COMMAND_BUTTONS_OFFSET)
+        self._chunk_actions = np.frombuffer(
+            self._buffer, dtype=np.uint8, count=self.MAX_CHUNK_STEPS * self.CHUNK_ACTION_SIZE, offset=self.CHUNK_ACTIONS_OFFSET
+        ).reshape(self.MAX_CHUNK_STEPS, self.CHUNK_ACTION_SIZE)
+        struct.pack_into('i', self._buffer, self.STATE_OFFSET, int(StateType.READY))
+        print(f"[Env {id}] Replaying {len(self.records)} records from {self.trace_path} ({replay_timing} timing)")
+
+    @property
+    def buf(self):
+        return self._buffer
+
+    def wait_ready(self, timeout_ms: int = None):
+        pass
+
+    def poll_ready(self) -> bool:
+        return True
+
+    def read_heartbeat(self) -> int:
+        return 0
+
+    def _next_reset(self) -> int:
+        index = int(np.searchsorted(self._resets, self.cursor))
+        if index == len(self._resets):
+            if not self.loop:
+                raise EOFError(f"[Env {self.id}] Replay of {self.trace_path} is exhausted")
+            index = 0
+        self.cursor = int(self._resets[index]) + 1
+        self.episodes += 1
+        return int(self._resets[index])
+
+    def _next_steps(self, count: int, buttons: np.ndarray) -> tuple[int, int]:
+        """Index range of the next `count` recorded steps of the current episode."""
+        start = self.cursor
+        end = min(start + count, len(self.records))
+        records = self.records[start:end]
+
+        boundary = np.flatnonzero(records["command"] == CommandType.RESET)
+        if len(boundary):
+            end = start + int(boundary[0])
+            records = records[:end - start]
+        deaths = np.flatnonzero((records["state"]["player_health"] <= 0) | (records["state"]["boss_health"] <= 0))
+        if len(deaths):
+            end = start + int(deaths[0]) + 1
+
+        executed = end - start
+        if executed:
+            recorded = self.records["buttons"][start:end]
+            self.mismatched_steps += int(np.any(recorded != (buttons[:executed] != 0), axis=1).sum())
+        self.cursor = end
+        return start, end
+
+    def wait_for_state(self, state_type: StateType, timeout_ms: int = None):
+        latency = self._answer(state_type)
+        if self.replay_timing == "original" and latency > 0:
+            time.sleep(latency)
+
+    async def await_state(self, state_type: StateType, timeout_ms: int = None):
+        latency = self._answer(state_type)
+        if self.replay_timing == "original" and latency > 0:
+            await asyncio.sleep(latency)
+
+    def _answer(self, state_type: StateType) -> float:
+        """Answer the pending command from the trace. Returns the recorded response time."""
+        command_type, ready = struct.unpack_from('i', self._buffer, self.COMMAND_OFFSET)[0], \
+            struct.unpack_from('i', self._buffer, self.COMMAND_READY_OFFSET)[0]
+        if ready != 1:
+            raise GameTimeoutError(f"[Env {self.id}] No command pending. Expected state: {state_type.name}")
+        struct.pack_into('i', self._buffer, self.COMMAND_READY_OFFSET, 0)
+
+        if command_type == CommandType.RESET:
+            index = self._next_reset()
+            self.state_view[...] = self.records["state"][index]
+            latency = float(self.records["latency"][index])
+        else:
+            if command_type == CommandType.STEP_CHUNK:
+                count = struct.unpack_from('i', self._buffer, self.CHUNK_LENGTH_OFFSET)[0]
+                count = max(1, min(count, self.MAX_CHUNK_STEPS))
+                buttons = self._chunk_actions[:count]
+            else:
+                count = 1
+                buttons = self._command_view[None]
+
+            start, end = self._next_steps(count, buttons)
+            if end > start:
+                states = self.records["state"][start:end]
+                latency = float(self.records["latency"][start:end].sum())
+            else:
+                # The recorded episode ended earlier than this one; end it here as well.
+                states = self.records["state"][start - 1:start].copy()
+                states["truncated"] = 1
+                latency = 0.0
+
+            self.chunk_view[:len(states)] = states
+            self.state_view[...] = states[-1]
+            struct.pack_into('i', self._buffer, self.CHUNK_EXECUTED_OFFSET, len(states))
+
+        struct.pack_into('i', self._buffer, self.STATE_OFFSET, int(StateType.READY))
+        return latency
+
+    def restart(self, cause: str = "manual"):
+        self.restart_history.append({"cause": cause, "recovery_time": 0.0, "time": time.time()})
+
+    def close(self):
+        self.state_view = None
+        self.chunk_view = None
+        self._command_view = None
+        self._chunk_actions = None
+        self.records = None
@@ -0,0 +1,171 @@
+"""Columnar on-disk store of training trajectories, for offline reward experiments.
+
+A store is a directory with one raw little-endian file per column and a
+`columns.json` schema. Each row is one env state:
+- every `GAME_STATE_DTYPE` field (raycasts as `(32,)` columns);
+- the MultiDiscrete action that led to the state;
+- the reward the env paid for it;
+- `episode_start` (the reset state of an episode, no action or reward), `terminated`
+  and `truncated`.
+
+Rows are in the order the env produced them, so an episode is a start row followed by
+its transitions, and the previous row of a transition is the state it was taken from.
+
+Envs record with `trajectory_path=...` (`--trajectories` in train.py). Rows are buffered
+and written at every episode end, and a store killed mid-write is cut to its shortest
+column when read. `TrajectoryStore` memory-maps the columns read-only, and
+`scripts/relabel_rewards.py` recomputes rewards and returns over them for other
+`RewardConfig`s.
+"""
+import json
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from silksong.shared_memory import GAME_STATE_DTYPE
+
+TRAJECTORY_VERSION = 1
+SCHEMA_FILE = "columns.json"
+ACTION_DIM = 8
+
+EXTRA_COLUMNS = [
+    ("action", "u1", (ACTION_DIM,)),
+    ("reward", "<f4", ()),
+    ("episode_start", "?", ()),
+    ("terminated", "?", ()),
+    ("truncated", "?", ()),
+]
+
+
+def _column_dtypes() -> dict[str, tuple[np.dtype, tuple]]:
+    columns = {}
+    for name in GAME_STATE_DTYPE.names:
+        dtype = GAME_STATE_DTYPE.fields[name][0]
+        columns[name] = (dtype.base, dtype.shape)
+    for name, dtype, shape in EXTRA_COLUMNS:
+        columns[name] = (np.dtype(dtype), shape)
+    return columns
+
+
+COLUMNS = _column_dtypes()
+
+
+class TrajectoryWriter:
+    """Buffers rows for one env and appends them column by column to a store directory.
+
+    An existing store at `path` is replaced.
+    """
+
+    BUFFER_ROWS = 4096
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+
+        schema = {
+            "version": TRAJECTORY_VERSION,
+            "columns": {name: {"dtype": dtype.str, "shape": list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+        }
+        (self.path / SCHEMA_FILE).write_text(json.dumps(schema, indent=2))
+        for name in COLUMNS:
+            (self.path / f"{name}.bin").write_bytes(b"")
+
+        self._states = np.zeros(self.BUFFER_ROWS, dtype=GAME_STATE_DTYPE)
+        self._extras = {name: np.zeros((self.BUFFER_ROWS, *shape), dtype=dtype) for name, dtype, shape in EXTRA_COLUMNS}
+        self._buffered = 0
+
+    def append(self, record: np.ndarray, action: np.ndarray = None, reward: float = 0.0,
+               terminated: bool = False, truncated: bool = False):
+        """Buffer one row. Without an action, the row is the reset state of a new episode."""
+        i = self._buffered
+        self._states[i] = record
+        extras = self._extras
+        if action is None:
+            extras["action"][i] = 0
+            extras["episode_start"][i] = True
+        else:
+            extras["action"][i] = action
+            extras["episode_start"][i] = False
+        extras["reward"][i] = reward
+        extras["terminated"][i] = terminated
+        extras["truncated"][i] = truncated
+        self._buffered += 1
+
+        if terminated or truncated or self._buffered == self.BUFFER_ROWS:
+            self.flush()
+
+    def flush(self):
+        n = self._buffered
+        if n == 0:
+            return
+        for name in COLUMNS:
+            column = self._extras[name] if name in self._extras else self._states[name]
+            with open(self.path / f"{name}.bin", "ab") as f:
+                f.write(np.ascontiguousarray(column[:n]).tobytes())
+        self.count += n
+        self._buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+class TrajectoryStore:
+    """Read-only view of a store: `store[column]` is a memory-mapped array of all rows."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        schema_path = self.path / SCHEMA_FILE
+        if not schema_path.exists():
+            raise ValueError(f"{path} is not a trajectory store (no {SCHEMA_FILE})")
+        schema = json.loads(schema_path.read_text())
+        if schema.get("version") != TRAJECTORY_VERSION:
+            raise ValueError(f"{path} has store version {schema.get('version')}; expected {TRAJECTORY_VERSION}")
+
+        self.columns = {
+            name: (np.dtype(spec["dtype"]), tuple(spec["shape"])) for name, spec in schema["columns"].items()
+        }
+        # Columns are appended one after the other, so a killed writer can leave some a flush ahead.
+        self.length = min(
+            (self.path / f"{name}.bin").stat().st_size // (dtype.itemsize * int(np.prod(shape)))
+            for name, (dtype, shape) in self.columns.items()
+        )
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        column = self._cache.get(name)
+        if column is None:
+            dtype, shape = self.columns[name]
+            if self.length == 0:
+                column = np.empty((0, *shape), dtype=dtype)
+            else:
+                column = np.memmap(self.path / f"{name}.bin", dtype=dtype, mode="r", shape=(self.length, *shape))
+            self._cache[name] = column
+        return column
+
+    @property
+    def episode_starts(self) -> np.ndarray:
+        return np.flatnonzero(self["episode_start"])
+
+
+def read_columns(paths: Sequence[str], names: Sequence[str]) -> dict[str, np.ndarray]:
+    """Concatenate columns of several stores into in-memory arrays.
+
+    Each store starts a new episode, even if its first row is a transition
+    (a writer that was killed and restarted mid-episode).
+    """
+    stores = [TrajectoryStore(path) for path in paths]
+    columns = {}
+    for name in set(names) | {"episode_start"}:
+        parts = []
+        for store in stores:
+            part = np.array(store[name])
+            if name == "episode_start" and len(part):
+                part[0] = True
+            parts.append(part)
+        columns[name] = np.concatenate(parts) if parts else np.empty(0)
+    return columns
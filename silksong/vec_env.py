@@ -0,0 +1,411 @@
+import multiprocessing as mp
+import time
+from typing import Any, Callable, Sequence
+
+import cloudpickle
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import SubprocVecEnv, VecEnv, VecEnvWrapper
+
+from silksong.command import CommandEncoder
+from silksong.launcher import DEFAULT_LAUNCH_STAGGER, DEFAULT_MAX_CONCURRENT_BOOTS, launch_instances
+from silksong.observation import ObservationEncoder
+from silksong.pool import InstancePool
+from silksong.profiling import DEFAULT_PROFILE_EVERY, LatencyHistogram, StepProfiler
+from silksong.reward import RewardConfig, RewardKernel
+from silksong.shared_memory import (
+    GAME_STATE_DTYPE,
+    GameState,
+    EpisodeTiming,
+    GameTimeoutError,
+    StateType,
+)
+from silksong.trace import trace_path_for
+from silksong.trajectory import TrajectoryWriter
+from silksong.worker import EpisodeMonitor, env_worker
+
+
+class SilksongVecEnv(VecEnv):
+    """Drives several game instances from one process over their shared-memory segments.
+
+    Each step writes every command first and then waits for every instance, so the games
+    simulate in parallel without a worker process per env. Episode statistics are reported
+    Monitor-style (`info["episode"]`), so it can stand in for `SubprocVecEnv` + `Monitor`.
+    With a `pool`, failed instances are swapped for warm spares instead of relaunched; the
+    pool is closed together with the vec env.
+
+    Auto-resets overlap with the rest of the batch: an env's RESET is sent as soon as its
+    STEP state shows the episode ended, and the RESET states are collected only after every
+    other env has been waited on and the batch has been scored. With `swap_resets` (needs a
+    `pool`), a finished instance is swapped for a spare that already sits at an episode
+    start, and the pool resets it in the background, so a reset only stalls the batch when
+    no spare is ready. Latency reports carry `reset` (RESET sent to state received),
+    `reset_wait` (how long the batch was blocked on it) and `background_reset`.
+
+    `timing` (frames per step and time scale) goes out with every RESET, and the pool's
+    background resets; `set_episode_timing` changes it for the episodes that start after.
+    """
+
+    render_mode = None
+
+    def __init__(self, env_ids: Sequence[int], time_scale: float = 1.0, nofx: bool = False,
+                 pool: InstancePool = None, max_concurrent_boots: int = DEFAULT_MAX_CONCURRENT_BOOTS,
+                 launch_stagger: float = DEFAULT_LAUNCH_STAGGER, profile_every: int = DEFAULT_PROFILE_EVERY,
+                 reward_config: RewardConfig = None, trajectory_path: str = None, compact_obs: bool = False,
+                 history_length: int = 1, history_deltas: bool = False, swap_resets: bool = False,
+                 timing: EpisodeTiming = None, **shm_kwargs):
+        if swap_resets and pool is None:
+            raise ValueError("swap_resets needs an InstancePool of spares")
+        self.env_ids = list(env_ids)
+        self.pool = pool
+        self.swap_resets = swap_resets
+        self.timing = timing
+        if isinstance(pool, InstancePool):
+            pool.set_episode_timing(timing)
+        n_envs = len(self.env_ids)
+
+        try:
+            self.shms = launch_instances(
+                self.env_ids, time_scale, nofx,
+                max_concurrent_boots=max_concurrent_boots, stagger=launch_stagger, **shm_kwargs,
+            )
+        except Exception:
+            if pool is not None:
+                pool.close()
+            raise
+        self.boot_times = [shm.boot_time for shm in self.shms]
+
+        action_space = spaces.MultiDiscrete([3, 3, 2, 2, 2, 2, 2, 2])
+        self.encoder = ObservationEncoder(n_envs, compact=compact_obs)
+        # The last `history_length` observations of every env in one ring buffer, oldest first.
+        self.history = self.encoder.history(history_length, history_deltas) if history_length > 1 else None
+        observation_space = spaces.Box(
+            low=-np.inf, high=np.inf, shape=(self.encoder.dim * history_length,), dtype=np.float32,
+        )
+        super().__init__(n_envs, observation_space, action_space)
+
+        self.commands = CommandEncoder(n_envs)
+        # Rewards, termination checks and episode counters of all envs in one NumPy pass.
+        self.rewards = RewardKernel(n_envs, reward_config)
+        # One trajectory store per env slot, named after the instance it started with.
+        self.trajectories = None
+        if trajectory_path:
+            self.trajectories = [TrajectoryWriter(trace_path_for(trajectory_path, env_id)) for env_id in self.env_ids]
+        # One profiler per instance, reported in that env's info["latency"] like SilksongBossEnv.
+        self.profilers = [StepProfiler(profile_every) for _ in range(n_envs)]
+        self.records = np.zeros(n_envs, dtype=GAME_STATE_DTYPE)
+        self.actions = None
+
+        self.buf_rews = np.zeros(n_envs, dtype=np.float32)
+        self.buf_dones = np.zeros(n_envs, dtype=bool)
+        self.timed_out = np.zeros(n_envs, dtype=bool)
+        # Envs whose RESET is in flight, and envs swapped for a spare that is already reset.
+        self.resetting = np.zeros(n_envs, dtype=bool)
+        self.swapped = np.zeros(n_envs, dtype=bool)
+        self._reset_timers = [None] * n_envs
+        self.t_start = time.time()
+
+    def _start_episode(self, i: int):
+        self.rewards.reset(self.records[i], [i])
+        self.commands.reset(i)
+
+    def _restart(self, i: int, cause: str):
+        timer = self.profilers[i].start()
+        if self.pool is not None:
+            self.shms[i] = self.pool.replace(self.shms[i], cause=cause)
+            self.env_ids[i] = self.shms[i].id
+        else:
+            self.shms[i].restart(cause=cause)
+        timer.total("restart")
+
+    def _begin_reset(self, i: int, swap: bool = False):
+        """Start resetting env `i` without waiting for it: swap in a ready spare, or send RESET."""
+        if swap and self.swap_resets:
+            spare = self.pool.take_ready()
+            if spare is not None:
+                self.pool.recycle(self.shms[i])
+                self.shms[i] = spare
+                self.env_ids[i] = spare.id
+                self.swapped[i] = True
+                return
+        self._reset_timers[i] = self.profilers[i].start()
+        self.shms[i].send_reset(self.timing)
+        self.resetting[i] = True
+
+    def _finish_resets(self, indices: Sequence[int]):
+        """Collect the RESET states of envs after `_begin_reset` and start their episodes."""
+        for i in indices:
+            timer = self.profilers[i].start()
+            if self.resetting[i]:
+                try:
+                    self.shms[i].wait_for_state(StateType.RESET)
+                except GameTimeoutError as e:
+                    print(f"[Env] Reset timeout: {e}")
+                    self._restart(i, e.cause)
+                    self.shms[i].reset(self.timing)
+                self._reset_timers[i].total("reset")
+                self._reset_timers[i] = None
+            timer.total("reset_wait")
+            self.resetting[i] = self.swapped[i] = False
+            self.records[i] = self.shms[i].state_view
+            self._start_episode(i)
+            if self.trajectories is not None:
+                self.trajectories[i].append(self.records[i])
+            self.reset_infos[i] = self._get_info(i, GameState.from_record(self.records[i]))
+
+    def reset(self) -> np.ndarray:
+        for i in range(self.num_envs):
+            self._begin_reset(i)
+        self._finish_resets(range(self.num_envs))
+        self._reset_seeds()
+        self._reset_options()
+        observations = self.encoder.encode_batch(self.records)
+        if self.history is not None:
+            observations = self.history.reset(observations)
+        return observations.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.actions = actions
+
+    def step_wait(self):
+        self.timed_out[:] = False
+        timers = [profiler.start_step() for profiler in self.profilers]
+
+        for timer in timers:
+            timer.mark()
+        payloads = self.commands.encode_batch(self.actions)
+        for timer in timers:
+            timer.lap("convert_action")
+
+        for i, shm in enumerate(self.shms):
+            timers[i].mark()
+            shm.write_command(payloads[i])
+            timers[i].lap("send_command")
+
+        for i, shm in enumerate(self.shms):
+            timers[i].mark()
+            try:
+                shm.wait_for_state(StateType.STEP)
+            except GameTimeoutError as e:
+                print(f"[Env] {e}")
+                self._restart(i, e.cause)
+                self.timed_out[i] = True
+            timers[i].lap("wait_for_state")
+            self.records[i] = self.shms[i].state_view
+            # The episode is over: the reset runs while the other envs are waited on and scored.
+            # A restarted instance keeps its slot, so its restart history reaches the info below.
+            if self.timed_out[i]:
+                self._begin_reset(i)
+            elif self.rewards.ends_episode(i, self.records[i]):
+                self._begin_reset(i, swap=True)
+
+        # Encoding is batched, so every sampled env is charged the whole batch.
+        for timer in timers:
+            timer.mark()
+        observations = self.encoder.encode_batch(self.records)
+        if self.history is not None:
+            frames = observations
+            observations = self.history.push(frames)
+            # A restarted game's frame does not follow the frames of the game that failed.
+            timed_out = np.flatnonzero(self.timed_out)
+            if len(timed_out) > 0:
+                observations = self.history.reset(frames[timed_out], timed_out)
+        for timer in timers:
+            timer.lap("observe")
+
+        # Like encoding, the reward pass is batched and charged to every sampled env.
+        for timer in timers:
+            timer.mark()
+        rewards, terminated, truncated = self.rewards.step(self.records, self.timed_out)
+        self.buf_rews[:] = rewards
+        np.logical_or(terminated, truncated, out=self.buf_dones)
+        if self.trajectories is not None:
+            for i, trajectory in enumerate(self.trajectories):
+                if not self.timed_out[i]:
+                    trajectory.append(self.records[i], self.actions[i], rewards[i], terminated[i], truncated[i])
+        for timer in timers:
+            timer.lap("reward")
+        infos: list[dict[str, Any]] = [{} for _ in range(self.num_envs)]
+
+        for i in range(self.num_envs):
+            timers[i].mark()
+            game_state = GameState.from_record(self.records[i])
+            timers[i].lap("read_game_state")
+
+            done = bool(self.buf_dones[i])
+            infos[i] = self._get_info(i, game_state, done)
+
+            if done:
+                infos[i]["terminal_observation"] = observations[i].copy()
+                infos[i]["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+                infos[i]["episode"] = {
+                    "r": round(float(self.rewards.episode_reward[i]), 6),
+                    "l": int(self.rewards.total_steps[i]),
+                    "t": round(time.time() - self.t_start, 6),
+                }
+                if self.timed_out[i]:
+                    infos[i]["timeout_restart"] = True
+                    infos[i]["restart_cause"] = self.shms[i].restart_history[-1]["cause"]
+                    infos[i]["restart_time"] = self.shms[i].restart_history[-1]["recovery_time"]
+
+        for i, profiler in enumerate(self.profilers):
+            profiler.end_step()
+            if profiler.report_due:
+                infos[i]["latency"] = profiler.report()
+                if self.swap_resets:
+                    infos[i]["latency"]["background_reset"] = self.pool.report_resets()
+
+        done_indices = np.flatnonzero(self.buf_dones)
+        if len(done_indices) > 0:
+            for i in done_indices:
+                if not (self.resetting[i] or self.swapped[i]):
+                    self._begin_reset(i)
+            self._finish_resets(done_indices)
+            observations = self.encoder.encode_batch(self.records)
+            if self.history is not None:
+                observations = self.history.reset(observations[done_indices], done_indices)
+
+        return observations.copy(), self.buf_rews.copy(), self.buf_dones.copy(), infos
+
+    def _get_info(self, i: int, game_state: GameState, episode_end: bool = False) -> dict:
+        info = {
+            "player_health": game_state.player_health,
+            "boss_health": game_state.boss_health,
+            "player_silk": game_state.player_silk,
+            "episode_time": game_state.episode_time,
+            "total_steps": int(self.rewards.total_steps[i]),
+            "player_pos": (game_state.player_pos_x, game_state.player_pos_y),
+            "boss_pos": (game_state.boss_pos_x, game_state.boss_pos_y),
+        }
+
+        if episode_end:
+            info["episode_reward"] = float(self.rewards.episode_reward[i])
+            info["lowest_boss_hp"] = int(self.rewards.lowest_boss_hp[i])
+            info["attack_count"] = int(self.rewards.attack_count[i])
+            info["heal_count"] = int(self.rewards.heal_count[i])
+            info["hurt_count"] = int(self.rewards.hurt_count[i])
+
+        return info
+
+    def close(self) -> None:
+        for trajectory in self.trajectories or []:
+            trajectory.close()
+        self.trajectories = None
+        for shm in self.shms:
+            shm.close()
+        self.shms = []
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def _indices(self, indices) -> list[int]:
+        if indices is None:
+            return list(range(self.num_envs))
+        if isinstance(indices, int):
+            return [indices]
+        return list(indices)
+
+    def set_episode_timing(self, timing: EpisodeTiming):
+        """Run the episodes that start from now on with `timing` (None for the plugin defaults)."""
+        self.timing = timing
+        # A pool daemon's instances are reset with this timing once they are leased.
+        if isinstance(self.pool, InstancePool):
+            self.pool.set_episode_timing(timing)
+
+    def _all_envs(self, indices, operation: str) -> list[int]:
+        """`indices`, which must cover every env: attributes and methods belong to the vec env, not to one game."""
+        indices = self._indices(indices)
+        if sorted(indices) != list(range(self.num_envs)):
+            raise ValueError(f"SilksongVecEnv has no per-env objects; {operation} applies to all envs, "
+                             f"not to indices {indices}")
+        return indices
+
+    def get_attr(self, attr_name: str, indices=None) -> list[Any]:
+        value = getattr(self, attr_name)
+        return [value for _ in self._all_envs(indices, f"get_attr({attr_name!r})")]
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        self._all_envs(indices, f"set_attr({attr_name!r})")
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list[Any]:
+        """Call the vec env's `method_name` once; its result stands for every env."""
+        indices = self._all_envs(indices, f"env_method({method_name!r})")
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in indices]
+
+    def env_is_wrapped(self, wrapper_class: type, indices=None) -> list[bool]:
+        # Episode stats are emitted exactly like Monitor does, so evaluation helpers can rely on them.
+        return [wrapper_class is Monitor for _ in self._indices(indices)]
+
+
+class SilksongSubprocVecEnv(SubprocVecEnv):
+    """`SubprocVecEnv` whose workers run `silksong.worker.env_worker` instead of SB3's worker.
+
+    The workers speak the same pipe protocol, so every other method is inherited. They
+    never import Stable-Baselines3 or torch, as long as the env factories do not either
+    (see silksong/worker.py). Envs are expected to be wrapped in `EpisodeMonitor`, which
+    answers for `Monitor` in `env_is_wrapped`.
+    """
+
+    def __init__(self, env_fns: list[Callable[[], gym.Env]], start_method: str = "spawn"):
+        self.waiting = False
+        self.closed = False
+        ctx = mp.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in env_fns])
+        self.processes = []
+        for work_remote, remote, env_fn in zip(self.work_remotes, self.remotes, env_fns):
+            args = (work_remote, remote, cloudpickle.dumps(env_fn))
+            # daemon=True: a crashed trainer must not leave its workers behind.
+            process = ctx.Process(target=env_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        VecEnv.__init__(self, len(env_fns), observation_space, action_space)
+
+    def env_is_wrapped(self, wrapper_class: type, indices=None) -> list[bool]:
+        # Sending Monitor itself would make the workers unpickle, and so import, Stable-Baselines3.
+        if wrapper_class is Monitor:
+            wrapper_class = EpisodeMonitor
+        return super().env_is_wrapped(wrapper_class, indices)
+
+
+class VecLatencyMonitor(VecEnvWrapper):
+    """Times each `VecEnv.step` (workers plus IPC) and the gap between steps (policy inference).
+
+    Wrap it directly around the vec env, inside `VecNormalize`. `LatencyCallback` finds it
+    and logs both histograms under `latency/vec_step_*` and `latency/policy_*`.
+    """
+
+    def __init__(self, venv):
+        super().__init__(venv)
+        self.histograms = {"vec_step": LatencyHistogram(), "policy": LatencyHistogram()}
+        self._step_start = None
+        self._step_end = None
+
+    def reset(self):
+        self._step_end = None
+        return self.venv.reset()
+
+    def step_async(self, actions):
+        self._step_start = time.perf_counter()
+        if self._step_end is not None:
+            self.histograms["policy"].record(self._step_start - self._step_end)
+        self.venv.step_async(actions)
+
+    def step_wait(self):
+        result = self.venv.step_wait()
+        self._step_end = time.perf_counter()
+        self.histograms["vec_step"].record(self._step_end - self._step_start)
+        return result
+
+    def report(self) -> dict[str, LatencyHistogram]:
+        histograms = self.histograms
+        self.histograms = {"vec_step": LatencyHistogram(), "policy": LatencyHistogram()}
+        return histograms
@@ -0,0 +1,109 @@
+"""Subprocess env workers that load only the env layers, without torch or Stable-Baselines3.
+
+Stable-Baselines3's `SubprocVecEnv` runs its own worker function, wraps the env factory in
+its own pickle wrapper, and `train.py` wrapped every env in SB3's `Monitor`. Each of these
+loads the `stable_baselines3` package, and that package imports torch. A spawned worker
+therefore spent seconds and hundreds of MB of memory importing a training stack it never
+used. `SilksongSubprocVecEnv` (silksong/vec_env.py) speaks the same pipe protocol, but it
+starts `env_worker` from this module, and `EpisodeMonitor` replaces `Monitor`.
+`python -m scripts.benchmark_imports` measures the difference.
+"""
+import multiprocessing as mp
+import time
+
+import cloudpickle
+import gymnasium as gym
+
+
+class EpisodeMonitor(gym.Wrapper):
+    """Adds Monitor-style episode statistics (`info["episode"]` with `r`, `l` and `t`) at episode ends.
+
+    The fields and rounding match SB3's `Monitor` without a log file, which is all
+    `ep_info_buffer` and the callbacks read.
+    """
+
+    def __init__(self, env: gym.Env):
+        super().__init__(env)
+        self.t_start = time.time()
+        self.rewards: list[float] = []
+        self.episode_returns: list[float] = []
+        self.episode_lengths: list[int] = []
+        self.total_steps = 0
+
+    def reset(self, **kwargs):
+        self.rewards = []
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.rewards.append(float(reward))
+        if terminated or truncated:
+            episode_return = sum(self.rewards)
+            episode_length = len(self.rewards)
+            info["episode"] = {
+                "r": round(episode_return, 6),
+                "l": episode_length,
+                "t": round(time.time() - self.t_start, 6),
+            }
+            self.episode_returns.append(episode_return)
+            self.episode_lengths.append(episode_length)
+        self.total_steps += 1
+        return observation, reward, terminated, truncated, info
+
+
+def is_wrapped(env: gym.Env, wrapper_class: type) -> bool:
+    while isinstance(env, gym.Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+
+def env_worker(remote: mp.connection.Connection, parent_remote: mp.connection.Connection, env_fn: bytes) -> None:
+    """SB3's `_worker` loop, with the env factory passed as cloudpickle bytes."""
+    parent_remote.close()
+    env = cloudpickle.loads(env_fn)()
+    reset_info = {}
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                if done:
+                    # The terminal observation goes back with the info; the next episode starts here.
+                    info["terminal_observation"] = observation
+                    observation, reset_info = env.reset()
+                remote.send((observation, reward, done, info, reset_info))
+            elif cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                remote.send((observation, reset_info))
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "has_attr":
+                try:
+                    env.get_wrapper_attr(data)
+                    remote.send(True)
+                except AttributeError:
+                    remote.send(False)
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except (EOFError, KeyboardInterrupt):
+            break
@@ -0,0 +1,100 @@
+"""`ObservationEncoder` and `ObservationHistory` against the reference encodings, without a game.
+
+    python -m unittest
+"""
+import unittest
+
+import numpy as np
+import torch
+from gymnasium import spaces
+
+from scripts.benchmark_observation import random_records
+from silksong.constants import COMPACT_CONTINUOUS_DIM, COMPACT_OBSERVATION_DIM, OBSERVATION_DIM
+from silksong.networks import MultiHeadFeatureExtractor, expand_compact_observations
+from silksong.observation import COMPACT_CONTINUOUS_COLUMNS, ObservationEncoder
+from silksong.shared_memory import GameState
+
+
+def _extractor(dim: int) -> MultiHeadFeatureExtractor:
+    return MultiHeadFeatureExtractor(spaces.Box(low=-np.inf, high=np.inf, shape=(dim,), dtype=np.float32))
+
+
+def assert_bit_identical(actual: np.ndarray, expected: np.ndarray, message: str):
+    assert np.array_equal(actual.view(np.uint32), expected.view(np.uint32)), message
+
+
+class ObservationEncoderTest(unittest.TestCase):
+    n = 10_000
+
+    def setUp(self):
+        self.records = random_records(self.n, np.random.default_rng(0))
+
+    def test_full_matches_to_observation(self):
+        expected = np.stack([GameState.from_record(record).to_observation() for record in self.records])
+        assert_bit_identical(ObservationEncoder(n_envs=self.n).encode_batch(self.records), expected,
+                             "batch encoding differs")
+        encoder = ObservationEncoder()
+        for record, row in zip(self.records[:2000], expected):
+            assert_bit_identical(encoder.encode(record), row, "single encoding differs")
+
+    def test_compact_expands_to_full(self):
+        full = ObservationEncoder(n_envs=self.n).encode_batch(self.records)
+        compact = ObservationEncoder(n_envs=self.n, compact=True).encode_batch(self.records)
+        encoder = ObservationEncoder(compact=True)
+        for record, row in zip(self.records[:2000], compact):
+            assert_bit_identical(encoder.encode(record), row, "single compact encoding differs")
+
+        full_extractor, compact_extractor = _extractor(OBSERVATION_DIM), _extractor(COMPACT_OBSERVATION_DIM)
+        compact_extractor.load_state_dict(full_extractor.state_dict())
+        with torch.no_grad():
+            compact_tensor = torch.as_tensor(compact)
+            expanded = expand_compact_observations(
+                compact_tensor, compact_extractor.continuous_columns, compact_extractor.index_offsets,
+            )
+            self.assertTrue(torch.equal(expanded, torch.as_tensor(full)), "expanded compact observations differ")
+            self.assertTrue(torch.equal(compact_extractor(compact_tensor), full_extractor(torch.as_tensor(full))),
+                            "features differ")
+
+
+class ObservationHistoryTest(unittest.TestCase):
+    length = 4
+    n_envs = 8
+    steps = 500
+
+    def test_matches_frame_stack(self):
+        """The ring buffer windows equal a plain frame stack, and deltas sum back to the frames."""
+        rng = np.random.default_rng(0)
+        length, n_envs = self.length, self.n_envs
+        for compact in (False, True):
+            encoder = ObservationEncoder(n_envs=n_envs, compact=compact)
+            history, delta_history = encoder.history(length), encoder.history(length, deltas=True)
+            delta_columns = np.arange(COMPACT_CONTINUOUS_DIM) if compact else COMPACT_CONTINUOUS_COLUMNS
+            other_columns = np.setdiff1d(np.arange(encoder.dim), delta_columns)
+
+            frames = encoder.encode_batch(random_records(n_envs, rng)).copy()
+            stack = np.repeat(frames[:, None], length, axis=1)
+            window, delta_window = history.reset(frames), delta_history.reset(frames)
+            for _ in range(self.steps):
+                frames = encoder.encode_batch(random_records(n_envs, rng)).copy()
+                stack = np.concatenate([stack[:, 1:], frames[:, None]], axis=1)
+                window, delta_window = history.push(frames), delta_history.push(frames)
+                restarted = np.flatnonzero(rng.random(n_envs) < 0.05)
+                if len(restarted):
+                    fresh = encoder.encode_batch(random_records(len(restarted), rng))[:len(restarted)].copy()
+                    stack[restarted] = fresh[:, None]
+                    window = history.reset(fresh, restarted)
+                    delta_window = delta_history.reset(fresh, restarted)
+
+                assert np.array_equal(window, stack.reshape(n_envs, -1)), "history window differs from the frame stack"
+                deltas = delta_window.reshape(n_envs, length, -1)
+                assert np.array_equal(deltas[:, :, other_columns], stack[:, :, other_columns]), "index columns differ"
+                assert np.array_equal(deltas[:, -1], stack[:, -1]), "newest frame differs"
+                # Frame j is the newest one minus the changes of the steps after it.
+                changes = np.cumsum(deltas[:, -2::-1, delta_columns], axis=1)[:, ::-1]
+                rebuilt = deltas[:, -1:, delta_columns] - changes
+                assert np.allclose(rebuilt, stack[:, :-1][:, :, delta_columns], atol=1e-5), "deltas do not sum back"
+            self.assertTrue(np.shares_memory(window, history.frames), "history window is a copy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,30 @@
+import json
 import os
+import shlex
+import sys
+import time
 from functools import partial
 from pathlib import Path
-from typing import Union
 
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).parent / ".env")
 
 import numpy as np
-import torch
-import torch.nn as nn
-from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import CheckpointCallback
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecNormalize
 
-from silksong import SilksongBossEnv, MultiHeadFeatureExtractor, TensorboardCallback
+# Only the env layers are imported here. Spawned env workers re-run this module and unpickle
+# `_make_env`, and they must not load torch or Stable-Baselines3; the training stack is
+# imported inside the functions that use it (see silksong/worker.py).
+from silksong.env import SilksongBossEnv
+from silksong.launcher import DEFAULT_LAUNCH_STAGGER, DEFAULT_MAX_CONCURRENT_BOOTS, provision_instances
+from silksong.pool import InstancePool
+from silksong.pool_server import PoolClient, parse_address
+from silksong.reward import RewardConfig
+from silksong.schedule import TimingSchedule
+from silksong.shared_memory import EpisodeTiming
+from silksong.worker import EpisodeMonitor
+
+VEC_ENV_BACKENDS = ("subproc", "shm")
 
 _next_env_id = 1
 
@@ -25,28 +34,128 @@ def reset_env_id_counter():
     _next_env_id = 1
 
 
-def _make_env(env_id: int, time_scale: float = 1.0, nofx: bool = False):
-    import torch
-    torch.set_num_threads(1)
-
-    env = SilksongBossEnv(env_id, time_scale=time_scale, nofx=nofx)
-    env = Monitor(env)
+def _make_env(env_id: int, time_scale: float = 1.0, nofx: bool = False, spare_ids: list[int] = None,
+              pool_address: str = None, launch_delay: float = 0.0, reward_config: RewardConfig = None,
+              trajectory_path: str = None, compact_obs: bool = False, history_length: int = 1,
+              history_deltas: bool = False, timing: EpisodeTiming = None, shm_kwargs: dict = None,
+              monitor_class: type = EpisodeMonitor):
+    # Only matters in-process (DummyVecEnv); workers do not load torch.
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+
+    # Subprocess workers start together; the delay staggers their game launches.
+    if launch_delay > 0:
+        time.sleep(launch_delay)
+
+    observation_kwargs = dict(compact_obs=compact_obs, history_length=history_length, history_deltas=history_deltas)
+    if pool_address:
+        # Each worker leases its own instance so failover requests come from the lease owner.
+        pool = PoolClient(parse_address(pool_address))
+        env_id = pool.lease(1, time_scale=time_scale, nofx=nofx)[0]
+        env = SilksongBossEnv(env_id, time_scale=time_scale, nofx=nofx, pool=pool, reward_config=reward_config,
+                              trajectory_path=trajectory_path, timing=timing, attach=True, **observation_kwargs)
+    else:
+        shm_kwargs = shm_kwargs or {}
+        pool = InstancePool(spare_ids, time_scale=time_scale, nofx=nofx, timing=timing, **shm_kwargs) \
+            if spare_ids else None
+        env = SilksongBossEnv(env_id, time_scale=time_scale, nofx=nofx, pool=pool, reward_config=reward_config,
+                              trajectory_path=trajectory_path, timing=timing, **observation_kwargs, **shm_kwargs)
+    env = monitor_class(env)
     return env
 
 
-def create_vec_env(n_envs: int = 1, time_scale: float = 1.0, nofx: bool = False):
+def create_vec_env(n_envs: int = 1, time_scale: float = 1.0, nofx: bool = False, backend: str = "subproc",
+                   spare_instances: int = 0, pool_address: str = None,
+                   max_concurrent_boots: int = DEFAULT_MAX_CONCURRENT_BOOTS,
+                   launch_stagger: float = DEFAULT_LAUNCH_STAGGER, simulator: bool = False,
+                   simulator_args: list[str] = None, record_path: str = None, replay_path: str = None,
+                   replay_timing: str = "fast", reward_config: RewardConfig = None, trajectory_path: str = None,
+                   compact_obs: bool = False, history_length: int = 1, history_deltas: bool = False,
+                   swap_resets: bool = False, timing: EpisodeTiming = None):
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import DummyVecEnv
+
+    from silksong.vec_env import SilksongSubprocVecEnv, SilksongVecEnv
+
     global _next_env_id
     if n_envs < 1:
         raise ValueError(f"n_envs must be >= 1, got {n_envs}")
+    if backend not in VEC_ENV_BACKENDS:
+        raise ValueError(f"backend must be one of {VEC_ENV_BACKENDS}, got {backend}")
+    if spare_instances < 0:
+        raise ValueError(f"spare_instances must be >= 0, got {spare_instances}")
+    if spare_instances > 0 and backend == "subproc" and n_envs > 1:
+        raise ValueError("Spare instances are shared in-process; use backend='shm' when n_envs > 1")
+    if spare_instances > 0 and pool_address:
+        raise ValueError("Spare instances and a pool daemon are exclusive; the daemon's idle instances are the spares")
+    if swap_resets and (backend != "shm" or spare_instances < 1 or pool_address):
+        raise ValueError("swap_resets swaps finished games for local spares; use backend='shm' and spare_instances > 0")
+    if record_path and replay_path:
+        raise ValueError("Recording a replay is not supported; record from the game or the simulator")
+    if replay_path and (simulator or pool_address or spare_instances):
+        raise ValueError("A replay needs no game; drop the simulator, pool and spare instance options")
+    if record_path and n_envs + spare_instances > 1 and "{id}" not in record_path:
+        raise ValueError("Several instances need one trace each; put {id} in the record path")
+    if trajectory_path and n_envs > 1 and "{id}" not in trajectory_path:
+        raise ValueError("Several envs need one trajectory store each; put {id} in the trajectory path")
+    if history_length < 1:
+        raise ValueError(f"history_length must be >= 1, got {history_length}")
+    observation_kwargs = dict(compact_obs=compact_obs, history_length=history_length, history_deltas=history_deltas,
+                              timing=timing)
+
+    # The stand-in game (silksong/simulator.py) replaces the executable; see README "Simulator".
+    shm_kwargs = dict(simulator=True, simulator_args=list(simulator_args or [])) if simulator else {}
+    if record_path:
+        shm_kwargs["record_path"] = record_path
+    if replay_path:
+        shm_kwargs.update(replay=replay_path, replay_timing=replay_timing)
+
+    if pool_address:
+        if backend == "shm":
+            pool = PoolClient(parse_address(pool_address))
+            env_ids = pool.lease(n_envs, time_scale=time_scale, nofx=nofx)
+            return SilksongVecEnv(env_ids, time_scale=time_scale, nofx=nofx, pool=pool, reward_config=reward_config,
+                                  trajectory_path=trajectory_path, attach=True, **observation_kwargs)
+
+        env_fns = [
+            partial(_make_env, env_id=None, time_scale=time_scale, nofx=nofx, pool_address=pool_address,
+                    reward_config=reward_config, trajectory_path=trajectory_path, **observation_kwargs)
+            for _ in range(n_envs)
+        ]
+        if n_envs > 1:
+            return SilksongSubprocVecEnv(env_fns, start_method='spawn')
+        return DummyVecEnv([partial(env_fns[0], monitor_class=Monitor)])
 
     start_id = _next_env_id
-    _next_env_id += n_envs
-    env_fns = [partial(_make_env, env_id=start_id+i, time_scale=time_scale, nofx=nofx) for i in range(n_envs)]
+    _next_env_id += n_envs + spare_instances
+    spare_ids = list(range(start_id + n_envs, start_id + n_envs + spare_instances))
+
+    if backend == "shm":
+        pool = InstancePool(spare_ids, time_scale=time_scale, nofx=nofx, timing=timing, **shm_kwargs) \
+            if spare_ids else None
+        return SilksongVecEnv(
+            range(start_id, start_id + n_envs), time_scale=time_scale, nofx=nofx, pool=pool,
+            max_concurrent_boots=max_concurrent_boots, launch_stagger=launch_stagger, reward_config=reward_config,
+            trajectory_path=trajectory_path, swap_resets=swap_resets, **observation_kwargs, **shm_kwargs,
+        )
+
+    if n_envs > 1 and not simulator and not replay_path:
+        provision_instances(range(start_id, start_id + n_envs))
+
+    env_fns = [
+        partial(
+            _make_env, env_id=start_id+i, time_scale=time_scale, nofx=nofx, spare_ids=spare_ids,
+            launch_delay=i * launch_stagger, reward_config=reward_config, trajectory_path=trajectory_path,
+            shm_kwargs=shm_kwargs, **observation_kwargs,
+        )
+        for i in range(n_envs)
+    ]
 
     if n_envs > 1:
-        return SubprocVecEnv(env_fns, start_method='spawn')
+        return SilksongSubprocVecEnv(env_fns, start_method='spawn')
     else:
-        return DummyVecEnv(env_fns)
+        return DummyVecEnv([partial(env_fns[0], monitor_class=Monitor)])
 
 
 def train(
@@ -66,9 +175,41 @@ def train(
     checkpoint_path: str = None,
     n_envs: int = 1,
     time_scale: float = 4.0,
-    device: Union[torch.device, str] = "cuda" if torch.cuda.is_available() else "cpu",
+    device: str = "auto",
     nofx: bool = False,
+    vec_env: str = "subproc",
+    async_collection: bool = False,
+    spare_instances: int = 0,
+    pool_address: str = None,
+    max_concurrent_boots: int = DEFAULT_MAX_CONCURRENT_BOOTS,
+    launch_stagger: float = DEFAULT_LAUNCH_STAGGER,
+    simulator: bool = False,
+    simulator_args: list[str] = None,
+    record_path: str = None,
+    replay_path: str = None,
+    replay_timing: str = "fast",
+    reward_config: RewardConfig = None,
+    trajectory_path: str = None,
+    compact_obs: bool = False,
+    history_length: int = 1,
+    history_deltas: bool = False,
+    swap_resets: bool = False,
+    timing_schedule: TimingSchedule = None,
 ):
+    import torch.nn as nn
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.callbacks import CheckpointCallback
+    from stable_baselines3.common.vec_env import VecNormalize
+
+    from silksong.async_ppo import AsyncPPO
+    from silksong.networks import (
+        EpisodeTimingCallback,
+        LatencyCallback,
+        MultiHeadFeatureExtractor,
+        TensorboardCallback,
+    )
+    from silksong.vec_env import VecLatencyMonitor
+
     resuming = checkpoint_path and os.path.exists(checkpoint_path)
 
     os.makedirs(log_dir, exist_ok=True)
@@ -88,13 +229,38 @@ def train(
     print(f"Learning rate: {learning_rate}")
     print(f"Parallel environments: {n_envs}")
     print(f"Time scale: {time_scale}")
+    timing_schedule = timing_schedule or TimingSchedule()
+    print(f"Episode timing: {timing_schedule}")
     print(f"NoFx: {nofx}")
+    print(f"Vec env: {vec_env}")
+    print(f"Async collection: {async_collection}")
+    print(f"Spare instances: {spare_instances}{' (swapped in for resets)' if swap_resets else ''}")
+    print(f"Pool: {pool_address or 'none'}")
+    print(f"Simulator: {' '.join(simulator_args or []) or 'yes' if simulator else 'no'}")
+    print(f"Compact observations: {compact_obs}")
+    print(f"History: {history_length} frame(s){' (deltas)' if history_deltas and history_length > 1 else ''}")
+    if record_path:
+        print(f"Recording: {record_path}")
+    if replay_path:
+        print(f"Replay: {replay_path} ({replay_timing} timing)")
+    if reward_config:
+        print(f"Reward config: {reward_config}")
+    if trajectory_path:
+        print(f"Trajectories: {trajectory_path}")
     print(f"Log directory: {log_dir}")
     print(f"Save directory: {save_dir}")
     print("=" * 60)
 
     print(f"\nLaunching {n_envs} game instance(s)...")
-    env = create_vec_env(n_envs=n_envs, time_scale=time_scale, nofx=nofx)
+    env = create_vec_env(
+        n_envs=n_envs, time_scale=time_scale, nofx=nofx, backend=vec_env, spare_instances=spare_instances,
+        pool_address=pool_address, max_concurrent_boots=max_concurrent_boots, launch_stagger=launch_stagger,
+        simulator=simulator, simulator_args=simulator_args, record_path=record_path, replay_path=replay_path,
+        replay_timing=replay_timing, reward_config=reward_config, trajectory_path=trajectory_path,
+        compact_obs=compact_obs, history_length=history_length, history_deltas=history_deltas,
+        swap_resets=swap_resets, timing=timing_schedule.initial,
+    )
+    env = VecLatencyMonitor(env)
 
     vecnormalize_path = checkpoint_path.replace(".zip", "_vecnormalize.pkl") if checkpoint_path else None
     if resuming and vecnormalize_path and os.path.exists(vecnormalize_path):
@@ -110,9 +276,11 @@ def train(
         activation_fn=nn.ReLU,
     )
 
+    algorithm = AsyncPPO if async_collection else PPO
+
     if resuming:
         print(f"\nLoading model from checkpoint: {checkpoint_path}")
-        model = PPO.load(
+        model = algorithm.load(
             checkpoint_path,
             env=env,
             learning_rate=learning_rate,
@@ -130,8 +298,8 @@ def train(
             device=device,
         )
     else:
-        print("\nInitializing new PPO model...")
-        model = PPO(
+        print(f"\nInitializing new {algorithm.__name__} model...")
+        model = algorithm(
             policy="MlpPolicy",
             env=env,
             learning_rate=learning_rate,
@@ -161,6 +329,8 @@ def train(
         save_vecnormalize=True,
     )
     tensorboard_callback = TensorboardCallback()
+    latency_callback = LatencyCallback()
+    timing_callback = EpisodeTimingCallback(timing_schedule)
 
     print("\n" + "=" * 60)
     print("Starting training...")
@@ -170,7 +340,7 @@ def train(
     try:
         model.learn(
             total_timesteps=total_timesteps,
-            callback=[checkpoint_callback, tensorboard_callback],
+            callback=[checkpoint_callback, tensorboard_callback, latency_callback, timing_callback],
             progress_bar=True,
         )
 
@@ -194,12 +364,22 @@ def train(
         env.close()
 
 
-def evaluate(model_path: str, n_episodes: int = 10, time_scale: float = 1.0, nofx: bool = False):
+def evaluate(model_path: str, n_episodes: int = 10, time_scale: float = 1.0, nofx: bool = False,
+             pool_address: str = None, compact_obs: bool = False, history_length: int = 1,
+             history_deltas: bool = False, timing: EpisodeTiming = None):
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import DummyVecEnv, VecNormalize
+
     print(f"\nEvaluating model: {model_path}")
     print(f"Time scale: {time_scale}")
+    print(f"Episode timing: {timing or EpisodeTiming()}")
     print(f"NoFx: {nofx}")
 
-    env = DummyVecEnv([partial(_make_env, env_id=1, time_scale=time_scale, nofx=nofx)])
+    env = DummyVecEnv([partial(
+        _make_env, env_id=1, time_scale=time_scale, nofx=nofx, pool_address=pool_address, compact_obs=compact_obs,
+        history_length=history_length, history_deltas=history_deltas, timing=timing, monitor_class=Monitor,
+    )])
 
     vecnormalize_path = model_path.replace(".zip", "_vecnormalize.pkl")
     if os.path.exists(vecnormalize_path):
@@ -249,13 +429,61 @@ if __name__ == "__main__":
     parser.add_argument("--eval", action="store_true")
     parser.add_argument("--checkpoint", type=str)
     parser.add_argument("--n_envs", type=int, default=1)
+    parser.add_argument("--vec_env", type=str, default="subproc", choices=VEC_ENV_BACKENDS)
+    parser.add_argument("--async_collection", action="store_true",
+                        help="Collect the next rollout with a policy snapshot while training on the current one")
+    parser.add_argument("--spare_instances", type=int, default=0,
+                        help="Pre-launched games that replace a crashed or hung instance immediately")
+    parser.add_argument("--swap_resets", action="store_true",
+                        help="Swap a finished game for a spare at an episode start and reset it in the background "
+                             "(needs --vec_env shm and --spare_instances)")
+    parser.add_argument("--pool", type=str, default=None, metavar="HOST:PORT",
+                        help="Lease games from a running `python -m silksong.pool_server` instead of launching them")
+    parser.add_argument("--max_concurrent_boots", type=int, default=DEFAULT_MAX_CONCURRENT_BOOTS,
+                        help="Games allowed to boot at the same time with --vec_env shm (0: no limit)")
+    parser.add_argument("--simulator", action="store_true",
+                        help="Train against the stand-in game process instead of Silksong")
+    parser.add_argument("--simulator_args", type=str, default="",
+                        help="Extra simulator options, e.g. \"--step_latency_ms 5 --crash_probability 1e-5\"")
+    parser.add_argument("--record", type=str, default=None, metavar="PATH",
+                        help="Record raw shared-memory traffic to a trace file ({id} is replaced by the env id)")
+    parser.add_argument("--replay", type=str, default=None, metavar="PATH",
+                        help="Serve a recorded trace instead of running games ({id} is replaced by the env id)")
+    parser.add_argument("--replay_timing", type=str, default="fast", choices=("fast", "original"),
+                        help="Answer replayed steps immediately or with their recorded response times")
+    parser.add_argument("--reward_config", type=str, default=None, metavar="PATH",
+                        help="JSON file overriding reward coefficients (see silksong/reward.py RewardConfig)")
+    parser.add_argument("--trajectories", type=str, default=None, metavar="PATH",
+                        help="Store every state, action and reward for scripts/relabel_rewards.py "
+                             "({id} is replaced by the env id)")
+    parser.add_argument("--compact_obs", action="store_true",
+                        help="Observations with animations and ray hit types as indices (89 instead of 401 floats)")
+    parser.add_argument("--history_length", type=int, default=1,
+                        help="Observe the last n frames, oldest first (default: 1, the current frame only)")
+    parser.add_argument("--history_deltas", action="store_true",
+                        help="Store the continuous features of past frames as per-step changes")
+    parser.add_argument("--launch_stagger", type=float, default=DEFAULT_LAUNCH_STAGGER,
+                        help="Seconds between consecutive game launches")
+    parser.add_argument("--frames_per_step", type=str, default=None, metavar="SCHEDULE",
+                        help="Game frames per agent step, or a schedule by timestep such as \"4,2@2000000\" "
+                             "(default: the plugin's 2)")
+    parser.add_argument("--episode_time_scale", type=str, default=None, metavar="SCHEDULE",
+                        help="Time scale of each episode, or a schedule such as \"8,4@2000000\" "
+                             "(default: the launch time scale)")
 
     args = parser.parse_args()
+    reward_config = RewardConfig.from_dict(json.loads(Path(args.reward_config).read_text())) if args.reward_config else None
+    try:
+        timing_schedule = TimingSchedule.parse(args.frames_per_step, args.episode_time_scale)
+    except ValueError as e:
+        parser.error(str(e))
 
     if args.eval:
         if not args.checkpoint:
             parser.error("--eval requires --checkpoint")
-        evaluate(args.checkpoint, n_episodes=10, time_scale=1.0)
+        evaluate(args.checkpoint, n_episodes=10, time_scale=1.0, pool_address=args.pool,
+                 compact_obs=args.compact_obs, history_length=args.history_length,
+                 history_deltas=args.history_deltas, timing=timing_schedule.final)
     else:
         train(
             total_timesteps=10_000_000,
@@ -274,4 +502,22 @@ if __name__ == "__main__":
             n_envs=args.n_envs,
             time_scale=4.0,
             nofx=True,
+            vec_env=args.vec_env,
+            async_collection=args.async_collection,
+            spare_instances=args.spare_instances,
+            pool_address=args.pool,
+            max_concurrent_boots=args.max_concurrent_boots,
+            launch_stagger=args.launch_stagger,
+            simulator=args.simulator,
+            simulator_args=shlex.split(args.simulator_args),
+            record_path=args.record,
+            replay_path=args.replay,
+            replay_timing=args.replay_timing,
+            reward_config=reward_config,
+            trajectory_path=args.trajectories,
+            compact_obs=args.compact_obs,
+            history_length=args.history_length,
+            history_deltas=args.history_deltas,
+            swap_resets=args.swap_resets,
+            timing_schedule=timing_schedule,
         )
@@ -1,26 +1,21 @@
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict
 
 from dotenv import load_dotenv
 
 load_dotenv(Path(__file__).parent / ".env")
 
-import optuna
-from optuna.pruners import MedianPruner
-from optuna.samplers import TPESampler
-import torch
-import torch.nn as nn
-from stable_baselines3 import PPO
-from stable_baselines3.common.callbacks import EvalCallback
-from stable_baselines3.common.vec_env import VecNormalize
+# Spawned env workers re-run this module, so optuna, torch and Stable-Baselines3 are
+# imported inside the functions that use them (see train.py).
+from train import VEC_ENV_BACKENDS, create_vec_env, reset_env_id_counter
 
-from train import create_vec_env, reset_env_id_counter
-from silksong import MultiHeadFeatureExtractor
+if TYPE_CHECKING:
+    import optuna
 
 
-def get_hyperparameters(trial: optuna.Trial) -> Dict[str, Any]:
+def get_hyperparameters(trial: "optuna.Trial") -> Dict[str, Any]:
     learning_rate = trial.suggest_float("learning_rate", 1e-5, 1e-3, log=True)
     n_steps = trial.suggest_categorical("n_steps", [512, 1024, 2048, 4096, 8192])
     batch_size = trial.suggest_categorical("batch_size", [64, 128, 256, 512])
@@ -52,47 +47,27 @@ def get_hyperparameters(trial: optuna.Trial) -> Dict[str, Any]:
     }
 
 
-class TrialEvalCallback(EvalCallback):
-    def __init__(self, trial: optuna.Trial, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.trial = trial
-        self.eval_idx = 0
-        self.is_pruned = False
-        self.all_mean_rewards = []
-
-    def _on_step(self) -> bool:
-        result = super()._on_step()
-
-        if self.eval_idx > 0 and self.last_mean_reward is not None:
-            self.trial.report(self.last_mean_reward, self.eval_idx)
-
-            if self.trial.should_prune():
-                self.is_pruned = True
-                return False
-
-        return result
-
-    def _on_event(self) -> None:
-        super()._on_event()
-        self.eval_idx += 1
-        if self.last_mean_reward is not None:
-            self.all_mean_rewards.append(self.last_mean_reward)
-
-    def get_average_reward(self) -> float:
-        if not self.all_mean_rewards:
-            return float('-inf')
-        return sum(self.all_mean_rewards) / len(self.all_mean_rewards)
-
-
 def objective(
-    trial: optuna.Trial,
+    trial: "optuna.Trial",
     n_envs: int,
     timesteps_per_trial: int,
     eval_freq: int,
     n_eval_episodes: int,
     time_scale: float,
+    vec_env: str = "subproc",
+    pool_address: str = None,
+    compact_obs: bool = False,
+    history_length: int = 1,
+    history_deltas: bool = False,
 ) -> float:
     """Optuna objective function."""
+    import optuna
+    import torch
+    import torch.nn as nn
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import VecNormalize
+
+    from silksong.networks import MultiHeadFeatureExtractor, TrialEvalCallback
 
     reset_env_id_counter()
     params = get_hyperparameters(trial)
@@ -104,10 +79,13 @@ def objective(
         print(f"  {key}: {value}")
     print(f"{'='*60}\n")
 
-    env = create_vec_env(n_envs=n_envs, time_scale=time_scale, nofx=True)
+    observation_kwargs = dict(compact_obs=compact_obs, history_length=history_length, history_deltas=history_deltas)
+    env = create_vec_env(n_envs=n_envs, time_scale=time_scale, nofx=True, backend=vec_env, pool_address=pool_address,
+                         **observation_kwargs)
     env = VecNormalize(env, norm_obs=False, norm_reward=True)
 
-    eval_env = create_vec_env(n_envs=1, time_scale=time_scale, nofx=True)
+    eval_env = create_vec_env(n_envs=1, time_scale=time_scale, nofx=True, pool_address=pool_address,
+                              **observation_kwargs)
     eval_env = VecNormalize(eval_env, norm_obs=False, norm_reward=False, training=False)
 
     policy_kwargs = dict(
@@ -178,10 +156,19 @@ def tune(
     eval_freq: int = 50_000,
     n_eval_episodes: int = 10,
     time_scale: float = 4.0,
+    vec_env: str = "subproc",
+    pool_address: str = None,
+    compact_obs: bool = False,
+    history_length: int = 1,
+    history_deltas: bool = False,
     study_name: str = "silksong",
     storage: str = None,
     output_dir: str = "./hyperparameters",
 ):
+    import optuna
+    from optuna.pruners import MedianPruner
+    from optuna.samplers import TPESampler
+
     os.makedirs(output_dir, exist_ok=True)
 
     sampler = TPESampler(n_startup_trials=5, seed=42)
@@ -204,6 +191,10 @@ def tune(
     print(f"Timesteps per trial: {timesteps_per_trial:,}")
     print(f"Parallel environments: {n_envs}")
     print(f"Time scale: {time_scale}")
+    print(f"Vec env: {vec_env}")
+    print(f"Pool: {pool_address or 'none'}")
+    print(f"Compact observations: {compact_obs}")
+    print(f"History: {history_length} frame(s){' (deltas)' if history_deltas and history_length > 1 else ''}")
     print(f"{'='*60}\n")
 
     try:
@@ -215,6 +206,11 @@ def tune(
                 eval_freq=eval_freq,
                 n_eval_episodes=n_eval_episodes,
                 time_scale=time_scale,
+                vec_env=vec_env,
+                pool_address=pool_address,
+                compact_obs=compact_obs,
+                history_length=history_length,
+                history_deltas=history_deltas,
             ),
             n_trials=n_trials,
             show_progress_bar=True,
@@ -268,6 +264,15 @@ if __name__ == "__main__":
     parser.add_argument("--eval_freq", type=int, default=20_000, help="Evaluation frequency")
     parser.add_argument("--n_eval_episodes", type=int, default=10, help="Episodes per evaluation")
     parser.add_argument("--time_scale", type=float, default=4.0)
+    parser.add_argument("--vec_env", type=str, default="subproc", choices=VEC_ENV_BACKENDS)
+    parser.add_argument("--pool", type=str, default=None, metavar="HOST:PORT",
+                        help="Lease games from a running pool daemon so trials reuse them instead of relaunching")
+    parser.add_argument("--compact_obs", action="store_true",
+                        help="Observations with animations and ray hit types as indices (89 instead of 401 floats)")
+    parser.add_argument("--history_length", type=int, default=1,
+                        help="Observe the last n frames, oldest first (default: 1, the current frame only)")
+    parser.add_argument("--history_deltas", action="store_true",
+                        help="Store the continuous features of past frames as per-step changes")
     parser.add_argument("--study_name", type=str, default="silksong")
     parser.add_argument("--storage", type=str, default=None, help="Optuna storage URL (e.g., sqlite:///study.db.db)")
     parser.add_argument("--output_dir", type=str, default="./hyperparameters")
@@ -281,6 +286,11 @@ if __name__ == "__main__":
         eval_freq=args.eval_freq,
         n_eval_episodes=args.n_eval_episodes,
         time_scale=args.time_scale,
+        vec_env=args.vec_env,
+        pool_address=args.pool,
+        compact_obs=args.compact_obs,
+        history_length=args.history_length,
+        history_deltas=args.history_deltas,
         study_name=args.study_name,
         storage=args.storage,
         output_dir=args.output_dir,